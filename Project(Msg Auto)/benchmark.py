@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for WhatsApp Message Scheduler
+Drives campaigns through the scheduler daemon's path (job store claim,
+one dispatcher entry per fire time, send-time claims, send engine) against
+the local fake Twilio API and reports throughput, send latency, fire-time
+lag, peak RSS and thread count. Results are compared with saved baselines
+and the run fails if any metric regresses past the tolerance.
+
+Usage:
+    python benchmark.py                      # run and compare with baselines
+    python benchmark.py --sizes 1000 100000  # choose campaign sizes
+    python benchmark.py --save-baseline      # record current results as the baseline
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import config
+from job_store import JobStore
+from rate_limiter import RateLimiter
+from scheduler import Dispatcher, monotonic_deadline
+from scheduler_daemon import SchedulerService
+from send_engine import BackgroundSender
+from structured_logging import LOGGER_PREFIX
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+BENCH_ACCOUNT_SID = 'AC' + '0' * 32
+BENCH_SENDER = '+15005550006'
+
+# metric -> True if higher is better
+METRICS = {
+    'messages_per_sec': True,
+    'send_latency_p50_ms': False,
+    'send_latency_p95_ms': False,
+    'send_latency_p99_ms': False,
+    'fire_lag_p99_ms': False,
+    'peak_rss_mb': False,
+    'peak_threads': False,
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_server(latency_ms, error_rate, throttle_rate, rate_limit):
+    """Start the fake Twilio API in a separate process; returns (base_url, process)"""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_twilio_server.py'),
+        '--port', str(port), '--latency-ms', str(latency_ms),
+        '--error-rate', str(error_rate), '--throttle-rate', str(throttle_rate), '--seed', '1'
+    ]
+    if rate_limit:
+        command += ['--rate-limit', str(rate_limit)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return f"http://127.0.0.1:{port}", process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Fake Twilio server did not start")
+
+
+def run_campaign(size, base_url, concurrency, sender_rate, fire_delay):
+    """Schedule and send one campaign of `size` messages; returns its metrics"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, 'bench.db'))
+        rate = sender_rate or 1e9
+        sender = BackgroundSender(
+            account_sid=BENCH_ACCOUNT_SID,
+            auth_token='bench',
+            from_number=BENCH_SENDER,
+            base_url=base_url,
+            concurrency=concurrency,
+            rate_limiter=RateLimiter(limits={BENCH_SENDER: (rate, max(1, int(rate)))})
+        )
+        dispatcher = Dispatcher()
+
+        fire_time = datetime.now() + timedelta(seconds=fire_delay)
+        deadline = monotonic_deadline(fire_time)
+        jobs = [
+            {
+                'job_id': uuid.uuid4().hex,
+                'recipient_name': f"Bench {i}",
+                'phone_number': f"+1555{i:07d}",
+                'message_body': f"Benchmark message {i}",
+                'scheduled_time': fire_time
+            }
+            for i in range(size)
+        ]
+        store.add_jobs(jobs)
+
+        lock = threading.Lock()
+        fire_lags = []
+        latencies = []
+        outcomes = {'sent': 0, 'failed': 0}
+        finished = threading.Event()
+        finished_at = [None]
+        peak_threads = [threading.active_count()]
+        sampling = threading.Event()
+
+        def sample_threads():
+            while not sampling.wait(0.01):
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+
+        class TimedSender:
+            """The service's sender, timing each message from its fire time to its result"""
+
+            def submit(self, to_number, body, priority=None, campaign=None):
+                started = time.monotonic()
+                fire_lags.append(started - deadline)
+
+                def done(future):
+                    success, _ = future.result()
+                    with lock:
+                        latencies.append(time.monotonic() - started)
+                        outcomes['sent' if success else 'failed'] += 1
+                        if len(latencies) == size:
+                            finished_at[0] = time.monotonic()
+                            finished.set()
+
+                future = sender.submit(to_number, body, priority, campaign)
+                future.add_done_callback(done)
+                return future
+
+        # Claimed and batched as the daemon does: one dispatcher entry per fire time,
+        # each job claimed in the store before it is sent
+        service = SchedulerService(store, sender=TimedSender(), dispatcher=dispatcher)
+        service.poll_once()
+
+        finished.wait(timeout=max(60, size / 50))
+        # Throughput is measured from the first dispatched job to the last completed send
+        first_fire = deadline + min(fire_lags, default=0.0)
+        elapsed = (finished_at[0] or time.monotonic()) - first_fire
+        store.flush(timeout=30)
+
+        sampling.set()
+        sampler.join()
+        dispatcher.shutdown(wait=True)
+        sender.close()
+
+        return {
+            'messages': size,
+            'sent': outcomes['sent'],
+            'failed': outcomes['failed'],
+            'completed': finished.is_set(),
+            'messages_per_sec': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+            'send_latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'send_latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'send_latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'fire_lag_p99_ms': round(percentile(fire_lags, 0.99) * 1000, 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'peak_threads': peak_threads[0],
+        }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a list of human-readable regressions"""
+    regressions = []
+    for size, metrics in results.items():
+        expected = baseline.get(size)
+        if not expected:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in expected:
+                continue
+            current, reference = metrics[metric], expected[metric]
+            # Small absolute slack keeps near-zero metrics (e.g. a 2ms lag) from flapping
+            slack = 1 if metric == 'peak_threads' else 5.0
+            if higher_is_better and current < reference * (1 - tolerance):
+                regressions.append(f"{size} messages: {metric} {current} < baseline {reference}")
+            elif not higher_is_better and current > reference * (1 + tolerance) + slack:
+                regressions.append(f"{size} messages: {metric} {current} > baseline {reference}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send-path throughput benchmark against a local fake Twilio API")
+    parser.add_argument("--sizes", type=int, nargs='+', default=config.BENCHMARK_SIZES, help="Campaign sizes to run")
+    parser.add_argument("--concurrency", type=int, default=config.SEND_CONCURRENCY, help="Simultaneous requests")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fake API response delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sends the fake API rejects")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of sends the fake API throttles")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Fake API per-sender messages/second")
+    parser.add_argument("--sender-rate", type=float, default=None, help="Client-side sender rate limit (default: unlimited)")
+    parser.add_argument("--fire-delay", type=float, default=2.0, help="Seconds between scheduling and fire time")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=config.BENCHMARK_TOLERANCE, help="Allowed regression fraction")
+    parser.add_argument("--log-level", default="WARNING",
+                        help="App log level during runs (INFO logs, and times, every message)")
+    args = parser.parse_args(argv)
+
+    logging.getLogger(LOGGER_PREFIX).setLevel(args.log_level.upper())
+
+    base_url, server = start_fake_server(args.latency_ms, args.error_rate, args.throttle_rate, args.rate_limit)
+    results = {}
+    try:
+        for size in args.sizes:
+            print(f"🚀 Running campaign of {size} messages...")
+            metrics = run_campaign(size, base_url, args.concurrency, args.sender_rate, args.fire_delay)
+            results[str(size)] = metrics
+            print("   " + ", ".join(f"{key}={value}" for key, value in metrics.items()))
+    finally:
+        server.terminate()
+        server.wait()
+
+    incomplete = [size for size, metrics in results.items() if not metrics['completed']]
+    if incomplete:
+        print(f"❌ Campaign(s) did not finish: {', '.join(incomplete)}")
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️  No baseline found; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ Performance regressions:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+
+    print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Bulk recipient import for WhatsApp Message Scheduler
+Reads CSV/XLSX/JSONL contact lists in chunks and validates whole columns at
+once with pandas string operations, splitting each chunk into valid
+recipients and rejected rows with a reason
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import config
+from phone_utils import normalize_phone_numbers
+from timezones import TimezoneError, get_zone
+
+RECIPIENT_COLUMNS = ['name', 'number', 'custom_message']
+
+# Accepted spellings for each recipient column (after lower-casing headers)
+COLUMN_ALIASES = {
+    'phone': 'number',
+    'phone_number': 'number',
+    'whatsapp': 'number',
+    'message': 'custom_message',
+    'tz': 'timezone',
+    'time_zone': 'timezone',
+}
+
+
+def _read_csv_chunks(source, chunksize):
+    """Yield DataFrame chunks from a CSV file or file-like object"""
+    yield from pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def _read_xlsx_chunks(source, chunksize):
+    """Yield DataFrame chunks from the first sheet of an XLSX workbook"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Reading .xlsx files requires openpyxl. Please run: pip install openpyxl")
+
+    # Read-only mode streams rows instead of loading the whole sheet
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell) if cell is not None else '' for cell in next(rows, [])]
+        batch = []
+        start = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header, dtype=object, index=range(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, dtype=object, index=range(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+
+def _read_jsonl_chunks(source, chunksize):
+    """Yield DataFrame chunks from a JSON Lines file or file-like object (one object per line)"""
+    stream = open(source, encoding='utf-8') if isinstance(source, (str, os.PathLike)) else source
+    try:
+        batch = []
+        start = 0
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                batch.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}") from None
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, dtype=object, index=range(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, dtype=object, index=range(start, start + len(batch)))
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def read_chunks(source, filename=None, chunksize=None, file_format=None):
+    """Yield raw DataFrame chunks from a CSV, XLSX or JSONL source
+
+    file_format ('csv', 'xlsx' or 'jsonl') defaults to the file extension.
+    """
+    chunksize = chunksize or config.IMPORT_CHUNK_SIZE
+    filename = filename or getattr(source, 'name', None) or str(source)
+    if file_format is None:
+        extension = os.path.splitext(filename.lower())[1]
+        file_format = {'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'csv')
+    if file_format == 'xlsx':
+        return _read_xlsx_chunks(source, chunksize)
+    if file_format == 'jsonl':
+        return _read_jsonl_chunks(source, chunksize)
+    return _read_csv_chunks(source, chunksize)
+
+
+def normalize_columns(chunk):
+    """Map header spellings onto name/number/custom_message and fill gaps
+
+    Extra columns are kept (as snake_case fields) so message templates can use them.
+    """
+    chunk = chunk.rename(columns=lambda column: '_'.join(str(column).strip().lower().split()))
+    chunk = chunk.rename(columns=COLUMN_ALIASES)
+    missing = [column for column in RECIPIENT_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    extra_columns = [column for column in chunk.columns if column not in RECIPIENT_COLUMNS and column]
+    chunk = chunk[RECIPIENT_COLUMNS + extra_columns]
+    # Excel cells may be numbers or empty; treat everything as text
+    return chunk.fillna('').astype(str).apply(lambda column: column.str.strip())
+
+
+def _unknown_zones(chunk):
+    """Mask of rows whose optional timezone column names no known zone (blank is fine)"""
+    if 'timezone' not in chunk.columns:
+        return np.zeros(len(chunk), dtype=bool)
+    zones = chunk['timezone'].fillna('').astype(str).str.strip()
+    unknown = set()
+    # A list has few distinct zones, so each is looked up once
+    for name in zones.unique():
+        try:
+            if name:
+                get_zone(name)
+        except TimezoneError:
+            unknown.add(name)
+    return zones.isin(unknown).to_numpy()
+
+
+def validate_chunk(chunk, seen=None):
+    """Split a chunk into (valid, rejects) using column-wise checks
+
+    Phones are canonicalized to E.164 in one batch and checked for
+    duplicates against ``seen`` (a set of numbers already accepted).
+    Rejected rows get a 'reason' column.
+    """
+    chunk = normalize_columns(chunk)
+
+    phones = normalize_phone_numbers(chunk['number'], seen, register=False)
+    message_length = chunk['custom_message'].str.len()
+
+    missing_fields = (chunk[RECIPIENT_COLUMNS] == '').any(axis=1)
+    bad_phone = ~phones['valid'] | phones['duplicate']
+    bad_message = ~message_length.between(config.MIN_MESSAGE_LENGTH, config.MAX_MESSAGE_LENGTH)
+    bad_zone = _unknown_zones(chunk)
+
+    reason = np.select(
+        [missing_fields, bad_phone, bad_message, bad_zone],
+        [
+            config.ERROR_MESSAGES['empty_fields'],
+            phones['reason'],
+            f"Message must be between {config.MIN_MESSAGE_LENGTH} and {config.MAX_MESSAGE_LENGTH} characters",
+            config.ERROR_MESSAGES['invalid_timezone']
+        ],
+        default=''
+    )
+    rejected = reason != ''
+
+    valid = chunk.loc[~rejected].assign(number=phones['e164'][~rejected])
+    rejects = chunk.loc[rejected].assign(reason=reason[rejected])
+    # Only accepted rows claim their number, so a rejected row can't block a later good one
+    if seen is not None:
+        seen.update(valid['number'])
+    return valid, rejects
+
+
+def iter_validated_chunks(source, filename=None, chunksize=None, seen=None, file_format=None):
+    """Yield (valid, rejects) DataFrames chunk by chunk
+
+    Duplicates are tracked across chunks; pass ``seen`` to also reject
+    numbers that were already added elsewhere.
+    """
+    seen = set() if seen is None else seen
+    for chunk in read_chunks(source, filename, chunksize, file_format):
+        yield validate_chunk(chunk, seen)
+
+
+def import_recipients(source, filename=None, chunksize=None, seen=None):
+    """Validate a whole file and return (valid recipient dicts, rejects DataFrame)"""
+    recipients = []
+    rejects = []
+    for valid, rejected in iter_validated_chunks(source, filename, chunksize, seen):
+        recipients.extend(valid.to_dict('records'))
+        if not rejected.empty:
+            rejects.append(rejected)
+    rejects = pd.concat(rejects) if rejects else pd.DataFrame(columns=RECIPIENT_COLUMNS + ['reason'])
+    return recipients, rejects
+
+
+def main(argv=None):
+    """Command-line entry point: stream a file into valid and rejects CSVs"""
+    parser = argparse.ArgumentParser(description="Validate a CSV/XLSX/JSONL recipient list in chunks")
+    parser.add_argument("input", help="CSV, XLSX or JSONL file with name, number and custom_message columns")
+    parser.add_argument("-o", "--output", default="recipients_valid.csv", help="Where to write valid recipients")
+    parser.add_argument("-r", "--rejects", default="recipients_rejects.csv", help="Where to write rejected rows")
+    parser.add_argument("--chunksize", type=int, default=config.IMPORT_CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args(argv)
+
+    valid_count = 0
+    reject_count = 0
+    # Write each chunk as it is validated so only one chunk is in memory at a time; with
+    # nothing rejected the rejects file is just its header rather than a stale earlier report
+    for index, (valid, rejects) in enumerate(iter_validated_chunks(args.input, chunksize=args.chunksize)):
+        valid.to_csv(args.output, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+        rejects.to_csv(args.rejects, mode='w' if index == 0 else 'a', header=index == 0, index=False)
+        valid_count += len(valid)
+        reject_count += len(rejects)
+
+    print(f"✅ {valid_count} valid recipient(s) written to {args.output}")
+    if reject_count:
+        print(f"⚠️  {reject_count} rejected row(s) written to {args.rejects}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Circuit breakers for WhatsApp Message Scheduler
+Each Twilio account and each sender number gets a breaker. A fatal error
+(bad credentials, unusable sender) or a run of server errors and timeouts
+opens it, and while it is open messages are not sent: they are parked
+until it closes or failed straight away, instead of each making its own
+doomed request. After a cooldown a few half-open probe requests go through,
+and the first one that reaches Twilio successfully closes the circuit.
+"""
+
+import threading
+import time
+
+import config
+from metrics import CIRCUIT_STATE
+from structured_logging import get_logger
+from twilio_errors import CIRCUIT_EFFECTS
+
+logger = get_logger('circuit_breaker')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# Seconds a parked message waits before checking again whether a probe has closed the circuit
+HALF_OPEN_RECHECK = 0.5
+
+
+class CircuitBreaker:
+    """Closed -> open on a fatal error or a run of failures -> half-open probes -> closed"""
+
+    def __init__(self, scope, name, threshold=None, cooldown=None, fatal_cooldown=None, probes=None):
+        self.scope = scope
+        self.name = name
+        self.threshold = threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.cooldown = config.BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.fatal_cooldown = config.BREAKER_FATAL_COOLDOWN if fatal_cooldown is None else fatal_cooldown
+        self.probes = probes or config.BREAKER_HALF_OPEN_PROBES
+        self.state = CLOSED
+        self.fatal = False
+        self.failures = 0
+        self.last_error = None
+        self._opened_at = 0.0
+        self._probing = 0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], scope=scope, name=name)
+
+    def _transition(self, state):
+        self.state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], scope=self.scope, name=self.name)
+
+    def _open(self, fatal):
+        self._transition(OPEN)
+        self.fatal = fatal
+        self.failures = 0
+        self._probing = 0
+        self._opened_at = time.monotonic()
+        logger.warning("circuit_opened", extra={
+            'scope': self.scope, 'circuit': self.name, 'fatal': fatal, 'error': self.last_error,
+            'cooldown': self.fatal_cooldown if fatal else self.cooldown
+        })
+
+    def allow(self):
+        """Whether a request may go out now; in half-open state this takes a probe slot"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() < self._opened_at + (self.fatal_cooldown if self.fatal else self.cooldown):
+                    return False
+                self._transition(HALF_OPEN)
+                self._probing = 0
+                logger.info("circuit_half_open", extra={'scope': self.scope, 'circuit': self.name})
+            now = time.monotonic()
+            # A probe that never reported back (e.g. it was cancelled) gives up its slot
+            if self._probing >= self.probes and now - self._probe_started > config.SEND_TIMEOUT:
+                self._probing = 0
+            if self._probing < self.probes:
+                self._probing += 1
+                self._probe_started = now
+                return True
+            return False
+
+    def accepting(self):
+        """Whether a request routed here now could go out (closed, or a probe is due); takes no probe slot"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                return now >= self._opened_at + (self.fatal_cooldown if self.fatal else self.cooldown)
+            return self._probing < self.probes or now - self._probe_started > config.SEND_TIMEOUT
+
+    def release(self):
+        """Give back a probe slot taken by allow() for a request that didn't decide anything"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing -= 1
+
+    def retry_in(self):
+        """Seconds until a blocked request is worth trying again"""
+        with self._lock:
+            if self.state == OPEN:
+                cooldown = self.fatal_cooldown if self.fatal else self.cooldown
+                return max(self._opened_at + cooldown - time.monotonic(), 0.01)
+            return HALF_OPEN_RECHECK
+
+    def record_success(self):
+        """A request reached Twilio and was answered normally"""
+        with self._lock:
+            self.failures = 0
+            # Replies to requests sent before the circuit opened don't close it; only probes do
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+                self.fatal = False
+                logger.info("circuit_closed", extra={'scope': self.scope, 'circuit': self.name})
+
+    def record_failure(self, error, fatal=False):
+        """A request failed in a way that implicates this account or sender"""
+        with self._lock:
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                self._open(fatal)
+            elif self.state == CLOSED:
+                self.failures += 1
+                if fatal or self.failures >= self.threshold:
+                    self._open(fatal)
+            elif fatal and not self.fatal:
+                # Already open for an outage, but the fault turns out to need a fix
+                self._open(fatal)
+
+    def describe(self):
+        """Error reported for a message that was not sent because this circuit is open"""
+        return f"{self.last_error} (not sent: {self.scope} circuit open)"
+
+
+class CircuitBreakers:
+    """Circuit breakers keyed by account SID and by sender number"""
+
+    def __init__(self, **breaker_options):
+        self._options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, scope, name):
+        """Return the breaker for an account or sender, creating it on first use"""
+        key = (scope, name)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(scope, name, **self._options)
+        return breaker
+
+    def admit(self, account_sid, sender):
+        """None if a request may go out, else the breaker that blocks it"""
+        account = self.breaker('account', account_sid)
+        if not account.allow():
+            return account
+        sender_breaker = self.breaker('sender', sender)
+        if not sender_breaker.allow():
+            account.release()
+            return sender_breaker
+        return None
+
+    def accepting(self, account_sid, sender):
+        """Whether neither the account's nor the sender's circuit would hold a request back"""
+        return self.blocking(account_sid, sender) is None
+
+    def blocking(self, account_sid, sender):
+        """The breaker that would hold a request back now, or None; takes no probe slot"""
+        for breaker in (self.breaker('account', account_sid), self.breaker('sender', sender)):
+            if not breaker.accepting():
+                return breaker
+        return None
+
+    def record(self, account_sid, sender, failure_class=None, error=None):
+        """Feed the outcome of an admitted request (failure_class None = success) to both breakers"""
+        account = self.breaker('account', account_sid)
+        sender_breaker = self.breaker('sender', sender)
+        scope, fatal = CIRCUIT_EFFECTS.get(failure_class, (None, False))
+        if scope == 'account':
+            account.record_failure(error, fatal)
+            sender_breaker.release()
+        elif scope == 'sender':
+            sender_breaker.record_failure(error, fatal)
+            account.record_success()
+        else:
+            # Twilio answered, even if it refused this one message, so both are healthy
+            account.record_success()
+            sender_breaker.record_success()
@@ -20,19 +20,190 @@ MIN_PHONE_LENGTH = 10
 MAX_PHONE_LENGTH = 15
 MIN_MESSAGE_LENGTH = 1
 MAX_MESSAGE_LENGTH = 1000
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '')  # e.g. '91' to accept national numbers
+PHONE_REJECT_REASONS = {
+    'empty': 'Phone number is empty',
+    'missing_country_code': 'Phone number must start with + and a country code',
+    'invalid_characters': 'Phone number contains misplaced characters',
+    'invalid_country_code': 'Country code cannot start with 0',
+    'too_short': 'Phone number is too short',
+    'too_long': 'Phone number is too long',
+    'duplicate': 'Duplicate phone number in this list',
+    'already_added': 'Phone number has already been added'
+}
 
 # UI Settings
 MAX_RECIPIENTS_DISPLAY = 50
 MESSAGE_PREVIEW_LENGTH = 50
+TEMPLATE_ERRORS_DISPLAY = 5  # recipients listed when template fields are missing
 STATUS_UPDATE_INTERVAL = 5  # seconds
+# Status table filter -> job store statuses it covers (None = all)
+# Delivered and read messages count as sent, and read ones as delivered
+STATUS_FILTERS = {
+    'All': None,
+    'Pending': ('pending', 'scheduled', 'sending'),
+    'Sent': ('sent', 'delivered', 'read'),
+    'Delivered': ('delivered', 'read'),
+    'Read': ('read',),
+    'Failed': ('failed', 'undelivered', 'expired'),
+    'Expired': ('expired',)
+}
+STATUS_LABELS = {
+    'pending': '⏳ Pending',
+    'scheduled': '⏳ Pending',
+    'sending': '⏳ Sending...',
+    'sent': '✅ Sent',
+    'delivered': '📬 Delivered',
+    'read': '👀 Read',
+    'failed': '❌ Failed',
+    'undelivered': '❌ Undelivered',
+    'expired': '⌛ Expired'
+}
+
+# Time Zone Settings
+# Recipients without a 'timezone' field get one from their country calling code.
+# Countries spanning several zones map to their most populous one; set a
+# recipient's timezone explicitly (IANA name, e.g. 'America/Los_Angeles') to override.
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', '')  # for unknown codes; empty = server time
+COUNTRY_TIMEZONES = {
+    '1': 'America/New_York', '1808': 'Pacific/Honolulu', '1907': 'America/Anchorage',
+    '1787': 'America/Puerto_Rico', '1876': 'America/Jamaica',
+    '7': 'Europe/Moscow', '20': 'Africa/Cairo', '27': 'Africa/Johannesburg',
+    '30': 'Europe/Athens', '31': 'Europe/Amsterdam', '32': 'Europe/Brussels', '33': 'Europe/Paris',
+    '34': 'Europe/Madrid', '39': 'Europe/Rome', '41': 'Europe/Zurich', '43': 'Europe/Vienna',
+    '44': 'Europe/London', '45': 'Europe/Copenhagen', '46': 'Europe/Stockholm', '47': 'Europe/Oslo',
+    '48': 'Europe/Warsaw', '49': 'Europe/Berlin', '51': 'America/Lima', '52': 'America/Mexico_City',
+    '54': 'America/Argentina/Buenos_Aires', '55': 'America/Sao_Paulo', '56': 'America/Santiago',
+    '57': 'America/Bogota', '60': 'Asia/Kuala_Lumpur', '61': 'Australia/Sydney', '62': 'Asia/Jakarta',
+    '63': 'Asia/Manila', '64': 'Pacific/Auckland', '65': 'Asia/Singapore', '66': 'Asia/Bangkok',
+    '81': 'Asia/Tokyo', '82': 'Asia/Seoul', '84': 'Asia/Ho_Chi_Minh', '86': 'Asia/Shanghai',
+    '90': 'Europe/Istanbul', '91': 'Asia/Kolkata', '92': 'Asia/Karachi', '94': 'Asia/Colombo',
+    '234': 'Africa/Lagos', '254': 'Africa/Nairobi', '351': 'Europe/Lisbon', '353': 'Europe/Dublin',
+    '880': 'Asia/Dhaka', '966': 'Asia/Riyadh', '971': 'Asia/Dubai', '977': 'Asia/Kathmandu'
+}
+
+# Bulk Import Settings
+IMPORT_CHUNK_SIZE = 10000  # rows validated per chunk
+
+# Scheduler Settings
+SCHEDULER_MAX_WORKERS = int(os.getenv('SCHEDULER_MAX_WORKERS', '8'))
+# 'embedded' sends from the Streamlit process; 'daemon' hands jobs to scheduler_daemon.py
+SCHEDULER_MODE = os.getenv('SCHEDULER_MODE', 'embedded')
+DAEMON_POLL_INTERVAL = 0.5  # seconds between checks for newly submitted jobs
+DAEMON_HEARTBEAT_TIMEOUT = 10  # seconds before the UI reports the daemon as offline
+
+# Recurring Schedule Settings
+# Series are stored once; each occurrence becomes a job only when it is this close to firing
+SERIES_LOOKAHEAD = 60  # seconds
+SERIES_POLL_INTERVAL = 15  # seconds between due-series checks in embedded mode (must be < SERIES_LOOKAHEAD)
+SERIES_CLAIM_BATCH = 1000  # series materialized per check
+MIN_RECURRENCE_INTERVAL = 60  # seconds; shortest 'every ...' interval
+RECURRENCE_CACHE_SIZE = 1024  # parsed rules kept in the LRU cache
+REPEAT_OPTIONS = ['Does not repeat', 'Every day', 'Every weekday', 'Every week', 'Every month', 'Custom']
+
+# Send Engine Settings
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '50'))  # simultaneous requests
+SEND_TIMEOUT = 30  # seconds per request
+SEND_KEEPALIVE_TIMEOUT = 30  # seconds an idle pooled connection stays open
+
+# Rate Limit Settings (per sender number)
+SENDER_RATE_LIMIT = float(os.getenv('SENDER_RATE_LIMIT', '80'))  # messages per second
+SENDER_BURST = int(os.getenv('SENDER_BURST', '20'))  # messages sent back-to-back before pacing
+SENDER_RATE_LIMITS = {}  # optional overrides: {'+14155238886': (rate, burst)}
+RATE_LIMIT_BACKOFF = 0.5  # rate multiplier applied on HTTP 429
+RATE_LIMIT_BACKOFF_WINDOW = 1.0  # seconds in which further 429s don't lower the rate again
+RATE_LIMIT_MIN_RATE = 1.0  # messages per second floor while throttled
+RATE_LIMIT_RECOVERY_INTERVAL = 2  # seconds without a 429 before stepping back up
+RATE_LIMIT_RECOVERY_STEP = 0.1  # fraction of the configured rate regained per step
+SEND_MAX_RETRIES = 3  # retries for a throttled (429) request
+
+# Sender Pool Settings
+# Sends are spread over every sender number below, each with its own rate limit. Each recipient has a
+# fixed preferred number (the same in every process), left only while its circuit is open or it's overloaded
+TWILIO_WHATSAPP_NUMBERS = [
+    number.strip() for number in os.getenv('TWILIO_WHATSAPP_NUMBERS', TWILIO_WHATSAPP_NUMBER).split(',')
+    if number.strip()
+]  # comma-separated in the environment
+TWILIO_EXTRA_ACCOUNTS = {}  # more senders on other accounts: {'AC...': {'auth_token': '...', 'numbers': ['+1...']}}
+SENDER_OVERLOAD_SECONDS = 60  # backlog (at the sender's current rate) beyond which recipients spill to another number
+
+# Priority Settings
+# Messages wait for a send turn in the lane for their priority. When several lanes have messages
+# waiting, each gets this share of sender throughput (high 60%, normal 30%, low 10%); an idle
+# lane's share goes to the others. Within a lane, campaigns take turns message by message.
+PRIORITY_WEIGHTS = {'high': 6, 'normal': 3, 'low': 1}
+DEFAULT_PRIORITY = 'normal'
+
+# Circuit Breaker Settings
+# An account's or sender's circuit opens on an auth/sender error, or after a run of server errors
+# and timeouts; while open, messages wait (up to BREAKER_PARK_TIMEOUT) or fail without a request
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive server errors/timeouts before opening
+BREAKER_COOLDOWN = 30  # seconds open before half-open probes after an outage
+BREAKER_FATAL_COOLDOWN = 300  # seconds open after an auth or sender configuration error
+BREAKER_HALF_OPEN_PROBES = 1  # trial requests let through while half-open
+BREAKER_PARK_TIMEOUT = 60  # seconds a message waits out an outage before failing; 0 fails at once
+
+# Recovery Settings
+# Jobs whose send time passed while no scheduler was running: 'send' sends them all now,
+# 'window' sends those missed by at most CATCH_UP_WINDOW and expires the rest, 'expire' expires them all
+CATCH_UP_POLICY = os.getenv('CATCH_UP_POLICY', 'send')
+CATCH_UP_WINDOW = int(os.getenv('CATCH_UP_WINDOW', '900'))  # seconds
+CATCH_UP_GRACE = 60  # seconds late before a job counts as missed
+CATCH_UP_RATE = SENDER_RATE_LIMIT  # missed messages released per second, so a backlog doesn't arrive at once
+
+# Benchmark Settings (see benchmark.py)
+BENCHMARK_SIZES = [1000, 10000, 100000]  # messages per benchmark campaign
+BENCHMARK_TOLERANCE = 0.25  # allowed regression against the saved baseline
+
+# Job Store Settings
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', 'scheduled_messages.db')
+JOB_STORE_BATCH_SIZE = 500  # status updates per transaction
+JOB_STORE_FLUSH_INTERVAL = 0.2  # seconds to wait for more updates before committing
+JOB_STORE_WRITE_RETRIES = 3  # retries of a status batch when the database is busy or locked
+JOB_STORE_RETRY_DELAY = 0.5  # seconds before the first retry; doubles after each one
+
+# Status Callback Settings
+# Public URL Twilio posts delivery updates to (e.g. a tunnel to WEBHOOK_PORT); empty disables callbacks
+STATUS_CALLBACK_URL = os.getenv('STATUS_CALLBACK_URL', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8788'))
+WEBHOOK_PATH = '/twilio/status'
+WEBHOOK_VALIDATE_SIGNATURE = os.getenv('WEBHOOK_VALIDATE_SIGNATURE', 'true').lower() == 'true'
+DELIVERY_BACKLOG_TTL = 3600  # seconds to hold callbacks that arrive before their message's SID is stored
+
+# Metrics Settings
+# Prometheus endpoint served by the process that sends (the daemon, or Streamlit in embedded mode)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Reconciliation Settings
+RECONCILE_PAGE_SIZE = 1000  # messages per list request (Twilio's maximum)
+RECONCILE_WINDOW_MARGIN = 3600  # seconds searched before the oldest unsettled message
+
+# Logging Settings
+# Send-path events are written as JSON lines by a background thread (see structured_logging.py)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))  # fraction of info/debug events kept
+LOG_FILE = os.getenv('LOG_FILE', '')  # empty writes to stdout
 
 # Message Templates
 DEFAULT_MESSAGE_TEMPLATE = "Hi {name}, {custom_message}"
+TEMPLATE_CACHE_SIZE = 128  # parsed templates kept in the LRU cache
 ERROR_MESSAGES = {
     'invalid_phone': 'Please enter a valid phone number (e.g., +91XXXXXXXXXX)',
     'invalid_datetime': 'Invalid date or time format',
     'past_datetime': 'Scheduled time must be in the future',
     'empty_fields': 'Please fill in all fields',
+    'duplicate_phone': 'This phone number has already been added',
+    'invalid_template': 'Invalid message template: {error}',
+    'daemon_offline': 'Scheduler daemon is not running. Scheduled messages will not be sent until it starts (python scheduler_daemon.py).',
+    'missing_template_fields': '{count} recipient(s) are missing values used by the message template',
+    'invalid_recurrence': 'Invalid repeat rule: {error}',
+    'duplicate_schedule': '{count} message(s) were already scheduled for this time and were skipped',
+    'invalid_timezone': 'Unknown time zone (use an IANA name such as Asia/Kolkata)',
+    'local_time_passed': '{count} recipient(s) are in time zones where the selected time has already passed',
     'no_recipients': 'Add recipients first to schedule messages',
     'twilio_error': 'Failed to send message. Check your Twilio credentials.'
 }
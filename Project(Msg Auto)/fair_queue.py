@@ -0,0 +1,134 @@
+"""
+Priority lanes for WhatsApp Message Scheduler
+Messages waiting to be sent queue in a lane for their priority and, inside
+the lane, behind other messages of the same campaign only. Each time the
+sender has capacity (a rate-limit token and a connection slot) the next
+turn goes to a lane by smooth weighted round robin, so every busy lane gets
+its PRIORITY_WEIGHTS share of throughput and an idle lane's share goes to
+the others. Within a lane, campaigns take turns one message at a time, so a
+large campaign interleaves with smaller ones instead of draining first.
+While the sender is blocked (e.g. its circuit is open) turns are handed out
+without capacity, so messages that can't go out don't wait for, or use up,
+tokens the sender's other messages need.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+import config
+from metrics import LANE_DEPTH, LANE_WAIT_SECONDS
+
+
+class FairQueue:
+    """Hand out send turns across priority lanes and, within a lane, across campaigns"""
+
+    def __init__(self, acquire, release, weights=None, blocked=None):
+        # acquire() waits for sender capacity and release() gives it back unused;
+        # blocked() says whether capacity would be wasted because nothing can be sent
+        self._acquire = acquire
+        self._release = release
+        self._blocked = blocked or (lambda: False)
+        self.weights = dict(weights or config.PRIORITY_WEIGHTS)
+        # lane -> {campaign: deque of (future, enqueued_at)}, campaigns in turn order
+        self._lanes = {lane: OrderedDict() for lane in self.weights}
+        self._current = dict.fromkeys(self.weights, 0)
+        self._ready = None
+        self._task = None
+        for lane in self.weights:
+            LANE_DEPTH.set(0, lane=lane)
+
+    def lane(self, priority):
+        """Lane for a priority name; unknown or missing priorities use DEFAULT_PRIORITY"""
+        return priority if priority in self.weights else config.DEFAULT_PRIORITY
+
+    def start(self):
+        """Start handing out turns on the running event loop"""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.ensure_future(self._grant_turns())
+
+    async def stop(self):
+        """Stop handing out turns"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait_turn(self, priority=None, campaign=None):
+        """Wait for this message's turn
+
+        Returns True if the caller now owns one unit of capacity, or False if
+        the turn came without capacity because the sender was blocked.
+        """
+        lane = self.lane(priority)
+        turn = asyncio.get_running_loop().create_future()
+        self._lanes[lane].setdefault(campaign, deque()).append((turn, time.monotonic()))
+        LANE_DEPTH.inc(lane=lane)
+        if self._ready is not None:
+            self._ready.set()
+        try:
+            return await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled() and turn.result():
+                # Cancelled after being granted: hand the capacity back
+                self._release()
+            raise
+
+    def _next_lane(self):
+        """Smooth weighted round robin over the lanes that have messages waiting"""
+        total, best = 0, None
+        for lane, campaigns in self._lanes.items():
+            if not campaigns:
+                continue
+            self._current[lane] += self.weights[lane]
+            total += self.weights[lane]
+            if best is None or self._current[lane] > self._current[best]:
+                best = lane
+        if best is not None:
+            self._current[best] -= total
+        return best
+
+    def _next_turn(self):
+        """Pop the next live waiter, or None if nobody is waiting"""
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                return None
+            campaigns = self._lanes[lane]
+            campaign, waiters = next(iter(campaigns.items()))
+            turn, enqueued_at = waiters.popleft()
+            if waiters:
+                campaigns.move_to_end(campaign)
+            else:
+                del campaigns[campaign]
+                if not campaigns:
+                    # An idle lane doesn't bank credit for when it next has work
+                    self._current[lane] = 0
+            LANE_DEPTH.dec(lane=lane)
+            if not turn.done():
+                LANE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at, lane=lane)
+                return turn
+
+    async def _grant_turns(self):
+        while True:
+            if not any(self._lanes.values()):
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if self._blocked():
+                # Let waiters find out now rather than pacing them through capacity they can't use
+                turn = self._next_turn()
+                if turn is not None:
+                    turn.set_result(False)
+                continue
+            # Capacity first, then the choice, so a message queued meanwhile is considered
+            await self._acquire()
+            turn = self._next_turn()
+            if turn is None:
+                self._release()
+                continue
+            turn.set_result(True)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Twilio Messages API
+Accepts the same form posts as api.twilio.com and answers with Twilio-shaped
+JSON after a configurable delay, optionally injecting 429s, errors, an
+initial outage and sender numbers that can't send.
+Messages move through sent/delivered/read (or undelivered), with status
+callbacks when they carry a StatusCallback, and can be listed page by page
+like GET /Messages.json.
+Point the app at it with TWILIO_API_BASE_URL=http://127.0.0.1:<port>
+"""
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import aiohttp
+from aiohttp import web
+
+from send_engine import basic_auth_header
+
+MESSAGES_ROUTE = '/2010-04-01/Accounts/{account_sid}/Messages.json'
+
+
+def _error(status, code, message, headers=None):
+    return web.json_response(
+        {'code': code, 'message': message, 'more_info': f'https://www.twilio.com/docs/errors/{code}', 'status': status},
+        status=status,
+        headers=headers
+    )
+
+
+DELIVERED_PATH = ('sent', 'delivered', 'read')
+UNDELIVERED_PATH = ('sent', 'undelivered')
+UNDELIVERED_ERROR_CODE = '63016'
+
+
+def _parse_date_filter(value):
+    """Parse a DateSent> / DateSent< filter (date or ISO 8601 datetime)"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def create_app(latency=0.05, jitter=0.0, error_rate=0.0, throttle_rate=0.0, rate_limit=None,
+               retry_after=1, auth_token=None, seed=None, callback_delay=0.01, undelivered_rate=0.0, outage=0.0,
+               broken_senders=()):
+    """Build the fake API
+
+    latency/jitter are in seconds; error_rate and throttle_rate are the
+    fraction of requests answered with a 400 or 429; rate_limit (messages
+    per second) makes excess traffic get 429 like a real sender limit.
+    Accepted messages advance one status every callback_delay seconds and
+    undelivered_rate of them end up undelivered instead of read. For the
+    first `outage` seconds every message request gets a 503. Messages from
+    a number in broken_senders are refused as if it had no WhatsApp channel.
+    """
+    rng = random.Random(seed)
+    state = {
+        'tokens': float(rate_limit or 0),
+        'updated': time.monotonic(),
+        'counts': {'accepted': 0, 'throttled': 0, 'failed': 0, 'unauthorized': 0, 'unavailable': 0, 'callbacks': 0},
+        'outage_until': time.monotonic() + outage,
+        'tasks': set(),
+        # Accepted messages in creation order: (message JSON, status path, monotonic creation time)
+        'messages': [],
+    }
+
+    def current_status(path, created):
+        """Status a message has reached, derived from its age instead of a timer per message"""
+        steps = int((time.monotonic() - created) / callback_delay) if callback_delay else len(path)
+        return path[min(steps, len(path)) - 1] if steps else 'queued'
+
+    async def post_callbacks(url, message, path):
+        for status in path:
+            await asyncio.sleep(callback_delay)
+            form = {
+                'MessageSid': message['sid'], 'MessageStatus': status,
+                'AccountSid': message['account_sid'], 'To': message['to'], 'From': message['from']
+            }
+            if status == 'undelivered':
+                form['ErrorCode'] = UNDELIVERED_ERROR_CODE
+            try:
+                async with state['session'].post(url, data=form) as response:
+                    await response.read()
+                state['counts']['callbacks'] += 1
+            except aiohttp.ClientError:
+                return
+
+    async def open_session(app):
+        state['session'] = aiohttp.ClientSession()
+
+    async def close_session(app):
+        for task in list(state['tasks']):
+            task.cancel()
+        await state['session'].close()
+
+    def over_rate_limit():
+        if not rate_limit:
+            return False
+        now = time.monotonic()
+        state['tokens'] = min(rate_limit, state['tokens'] + (now - state['updated']) * rate_limit)
+        state['updated'] = now
+        if state['tokens'] < 1:
+            return True
+        state['tokens'] -= 1
+        return False
+
+    def unauthorized(request):
+        account_sid = request.match_info['account_sid']
+        return auth_token is not None and request.headers.get('Authorization') != basic_auth_header(account_sid, auth_token)
+
+    async def create_message(request):
+        account_sid = request.match_info['account_sid']
+        if unauthorized(request):
+            state['counts']['unauthorized'] += 1
+            return _error(401, 20003, 'Authenticate')
+        if time.monotonic() < state['outage_until']:
+            state['counts']['unavailable'] += 1
+            return _error(503, 20503, 'Service Unavailable')
+
+        form = await request.post()
+        delay = latency + (rng.uniform(-jitter, jitter) if jitter else 0)
+        await asyncio.sleep(max(delay, 0))
+
+        if over_rate_limit() or (throttle_rate and rng.random() < throttle_rate):
+            state['counts']['throttled'] += 1
+            return _error(429, 20429, 'Too Many Requests', headers={'Retry-After': str(retry_after)})
+        if not form.get('To') or not form.get('From') or not form.get('Body'):
+            state['counts']['failed'] += 1
+            return _error(400, 21604, "A 'To', 'From' and 'Body' parameter is required.")
+        if form['From'].removeprefix('whatsapp:') in broken_senders:
+            state['counts']['failed'] += 1
+            return _error(400, 63007, f"Could not find a Channel with the specified From address: {form['From']}")
+        if error_rate and rng.random() < error_rate:
+            state['counts']['failed'] += 1
+            return _error(400, 21211, f"The 'To' number {form['To']} is not a valid phone number.")
+
+        state['counts']['accepted'] += 1
+        now = datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S +0000')
+        message = {
+            'sid': f"SM{uuid.uuid4().hex}",
+            'account_sid': account_sid,
+            'from': form['From'],
+            'to': form['To'],
+            'body': form['Body'],
+            'status': 'queued',
+            'date_created': now,
+            'date_updated': now,
+            'date_sent': now,
+        }
+        path = UNDELIVERED_PATH if undelivered_rate and rng.random() < undelivered_rate else DELIVERED_PATH
+        state['messages'].append((message, path, time.monotonic()))
+        if form.get('StatusCallback'):
+            task = asyncio.create_task(post_callbacks(form['StatusCallback'], message, path))
+            state['tasks'].add(task)
+            task.add_done_callback(state['tasks'].discard)
+        return web.json_response(message, status=201)
+
+    async def list_messages(request):
+        """Newest-first pages; PageToken is the creation index to continue below"""
+        if unauthorized(request):
+            return _error(401, 20003, 'Authenticate')
+        query = request.query
+        page_size = min(int(query.get('PageSize', 50)), 1000)
+        sender = query.get('From')
+        after = _parse_date_filter(query['DateSent>']) if 'DateSent>' in query else None
+        before = _parse_date_filter(query['DateSent<']) if 'DateSent<' in query else None
+        position = int(query.get('PageToken', len(state['messages'])))
+
+        page = []
+        while position > 0 and len(page) < page_size:
+            position -= 1
+            message, path, created = state['messages'][position]
+            sent_at = datetime.strptime(message['date_sent'], '%a, %d %b %Y %H:%M:%S +0000').replace(tzinfo=timezone.utc)
+            if (sender and message['from'] != sender) or (after and sent_at < after) or (before and sent_at > before):
+                continue
+            status = current_status(path, created)
+            page.append(dict(message, status=status,
+                             error_code=int(UNDELIVERED_ERROR_CODE) if status == 'undelivered' else None))
+
+        next_page_uri = None
+        if position > 0:
+            params = {key: value for key, value in query.items() if key != 'PageToken'}
+            params.update(PageSize=page_size, PageToken=position)
+            next_page_uri = request.rel_url.with_query(params).path_qs
+        return web.json_response({
+            'messages': page,
+            'page_size': page_size,
+            'uri': request.rel_url.path_qs,
+            'next_page_uri': next_page_uri,
+        })
+
+    async def stats(request):
+        return web.json_response(state['counts'])
+
+    app = web.Application()
+    app.on_startup.append(open_session)
+    app.on_cleanup.append(close_session)
+    app.router.add_post(MESSAGES_ROUTE, create_message)
+    app.router.add_get(MESSAGES_ROUTE, list_messages)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def start_in_thread(host='127.0.0.1', port=0, **options):
+    """Serve the fake API from a background thread; returns (base_url, stop)"""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_app(**options), access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    bound_port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, name="fake-twilio", daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return f"http://{host}:{bound_port}", stop
+
+
+def main(argv=None):
+    """Run the fake API in the foreground"""
+    parser = argparse.ArgumentParser(description="Local fake of the Twilio Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Response delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- spread added to the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests rejected with 400")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests rejected with 429")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Messages/second before answering 429")
+    parser.add_argument("--outage", type=float, default=0.0, help="Seconds after start answering every send with 503")
+    parser.add_argument("--broken-sender", action="append", default=[],
+                        help="Refuse messages from this number (repeatable)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    print(f"🧪 Fake Twilio API on http://{args.host}:{args.port}")
+    print(f"   export TWILIO_API_BASE_URL=http://{args.host}:{args.port}")
+    web.run_app(
+        create_app(
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            rate_limit=args.rate_limit,
+            seed=args.seed,
+            outage=args.outage,
+            broken_senders=args.broken_sender
+        ),
+        host=args.host,
+        port=args.port,
+        print=None,
+        access_log=None
+    )
+
+
+if __name__ == "__main__":
+    main()
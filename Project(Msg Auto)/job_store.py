@@ -0,0 +1,634 @@
+"""
+Durable job store for WhatsApp Message Scheduler
+Scheduled messages live in a WAL-mode SQLite table. Status updates from
+worker threads and delivery callbacks are batched into transactions by a
+single writer thread, and every write bumps a change version so readers can
+fetch only changed rows.
+"""
+
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+from metrics import MESSAGES_DEDUPLICATED
+from recurrence import RecurrenceError, parse_rule
+from structured_logging import get_logger
+from timezones import get_zone, to_server_time, to_zone_time
+
+logger = get_logger('job_store')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    recipient_name TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    message_body TEXT NOT NULL,
+    scheduled_time TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    sid TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    idempotency_key TEXT,
+    priority TEXT,
+    campaign TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, scheduled_time);
+CREATE INDEX IF NOT EXISTS idx_jobs_version ON jobs (version);
+CREATE INDEX IF NOT EXISTS idx_jobs_scheduled ON jobs (scheduled_time);
+CREATE INDEX IF NOT EXISTS idx_jobs_sid ON jobs (sid);
+CREATE TABLE IF NOT EXISTS delivery_backlog (
+    sid TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    error TEXT,
+    received_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series (
+    series_id TEXT PRIMARY KEY,
+    recipient_name TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    message_body TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    anchor TEXT NOT NULL,
+    next_fire TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    occurrences INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    priority TEXT,
+    campaign TEXT,
+    timezone TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_series_due ON series (active, next_fire);
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    name TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+"""
+
+JOB_COLUMNS = (
+    "job_id", "recipient_name", "phone_number", "message_body", "scheduled_time",
+    "status", "sid", "error", "attempts", "created_at", "updated_at", "version", "idempotency_key",
+    "priority", "campaign"
+)
+SERIES_COLUMNS = (
+    "series_id", "recipient_name", "phone_number", "message_body", "rule", "anchor",
+    "next_fire", "active", "occurrences", "created_at", "updated_at", "priority", "campaign", "timezone"
+)
+
+
+# How far along each delivery status is. Callbacks can arrive out of order,
+# so a status never replaces one that is further along.
+DELIVERY_RANK = {'sent': 1, 'delivered': 2, 'read': 3, 'undelivered': 3, 'failed': 3}
+# Error recorded for a job whose send was cut off by a crash or shutdown
+INTERRUPTED_SEND_ERROR = 'Outcome unknown (interrupted while sending); check Twilio before sending it again'
+
+
+def idempotency_key(campaign, phone_number, message_body, scheduled_time):
+    """Stable key for one message of a campaign; the same send always gets the same key"""
+    parts = (str(campaign), phone_number, message_body, scheduled_time.isoformat())
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+def _rank_sql(column):
+    """SQL expression giving DELIVERY_RANK of a status column (0 if unknown)"""
+    cases = " ".join(f"WHEN '{status}' THEN {rank}" for status, rank in DELIVERY_RANK.items())
+    return f"(CASE {column} {cases} ELSE 0 END)"
+
+
+def _filter_clause(statuses=None, search=None):
+    """WHERE clause and parameters for the status table filters"""
+    clauses, params = [], []
+    if statuses:
+        clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if search:
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append("(recipient_name LIKE ? ESCAPE '\\' OR phone_number LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class JobStore:
+    """SQLite-backed table of scheduled messages"""
+
+    def __init__(self, path=None):
+        self.path = path or config.JOB_STORE_PATH
+        self._local = threading.local()
+        self._updates = queue.Queue()
+        self._flushed = threading.Condition()
+        self._pending_updates = 0
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+        self._writer_ready = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True)
+        self._writer.start()
+        # The writer opens its own connection; don't hand out a store it can't write to yet
+        self._writer_ready.wait()
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        """Bring a store created by an older version up to the current schema"""
+        added_columns = {
+            'jobs': ('idempotency_key', 'priority', 'campaign'),
+            'series': ('priority', 'campaign', 'timezone')
+        }
+        for table, names in added_columns.items():
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name in names:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs (idempotency_key)")
+
+    @staticmethod
+    def _next_version(conn):
+        """Bump and return the store-wide change version inside the open transaction"""
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'version'")
+        return conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()[0]
+
+    def add_jobs(self, jobs, status='pending'):
+        """Insert new jobs in a single transaction; returns the jobs that were added
+
+        Each job is a dict with job_id, recipient_name, phone_number,
+        message_body, scheduled_time (datetime) and optionally an
+        idempotency_key, a priority lane and a campaign id. A job whose key is already stored (e.g. the same
+        campaign scheduled twice) is a duplicate and is left out. Jobs
+        inserted as 'pending' are picked up by the scheduler daemon;
+        'scheduled' means the caller queues the returned jobs itself.
+        """
+        now = datetime.now().isoformat()
+        added = []
+        conn = self._connect()
+        with conn:
+            version = self._next_version(conn)
+            for job in jobs:
+                # The unique key index makes the duplicate check part of the insert
+                inserted = conn.execute(
+                    "INSERT INTO jobs (job_id, recipient_name, phone_number, message_body, "
+                    "scheduled_time, status, created_at, updated_at, version, idempotency_key, priority, campaign) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+                    (job['job_id'], job['recipient_name'], job['phone_number'], job['message_body'],
+                     job['scheduled_time'].isoformat(), status, now, now, version, job.get('idempotency_key'),
+                     job.get('priority'), job.get('campaign'))
+                ).rowcount
+                if inserted:
+                    added.append(job)
+        if len(added) < len(jobs):
+            MESSAGES_DEDUPLICATED.inc(len(jobs) - len(added), stage='schedule')
+        return added
+
+    def begin_send(self, job_ids):
+        """Claim jobs for sending; returns the set of job_ids the caller may send
+
+        Each job moves from pending/scheduled to 'sending' in one committed
+        transaction before anything reaches Twilio, so a job queued twice (a
+        repeated click, a recovered job, the app and the daemon both holding
+        it) is sent at most once, across processes and restarts. A job left
+        'sending' by a crash is not sent again; see fail_interrupted_sends.
+        """
+        claimed = set()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = self._next_version(conn)
+            now = datetime.now().isoformat()
+            for job_id in job_ids:
+                if conn.execute(
+                    "UPDATE jobs SET status = 'sending', updated_at = ?, version = ? "
+                    "WHERE job_id = ? AND status IN ('pending', 'scheduled')",
+                    (now, version, job_id)
+                ).rowcount == 1:
+                    claimed.add(job_id)
+        if len(claimed) < len(job_ids):
+            MESSAGES_DEDUPLICATED.inc(len(job_ids) - len(claimed), stage='send')
+        return claimed
+
+    def add_series(self, series):
+        """Insert recurring series in a single transaction; returns first fire times of the added ones
+
+        Each series is a dict with series_id, recipient_name, phone_number,
+        message_body, rule (cron expression, alias or 'every ...' interval)
+        and start_time (datetime, also the anchor for intervals), plus an
+        optional priority and campaign passed on to every occurrence. With a
+        timezone (IANA name), start_time and the rule are wall-clock times in
+        that zone, so the series keeps its local time of day across DST
+        changes. Only the next fire time is stored, in server time;
+        occurrences become jobs as they come due.
+        A series_id that already exists is a duplicate and is skipped.
+        Raises RecurrenceError for an invalid rule before anything is written.
+        """
+        rows = []
+        now = datetime.now().isoformat()
+        for item in series:
+            zone_name = item.get('timezone')
+            local_first = parse_rule(item['rule'], item['start_time']).first_fire(item['start_time'])
+            first_fire = to_server_time(local_first, get_zone(zone_name) if zone_name else None)
+            rows.append((first_fire, (item['series_id'], item['recipient_name'], item['phone_number'],
+                                      item['message_body'], item['rule'], item['start_time'].isoformat(),
+                                      first_fire.isoformat(), now, now, item.get('priority'), item.get('campaign'),
+                                      zone_name)))
+        first_fires = []
+        conn = self._connect()
+        with conn:
+            for first_fire, row in rows:
+                if conn.execute(
+                    "INSERT OR IGNORE INTO series (series_id, recipient_name, phone_number, message_body, rule, "
+                    "anchor, next_fire, created_at, updated_at, priority, campaign, timezone) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                ).rowcount:
+                    first_fires.append(first_fire)
+        if len(first_fires) < len(rows):
+            MESSAGES_DEDUPLICATED.inc(len(rows) - len(first_fires), stage='schedule')
+        return first_fires
+
+    def claim_due_series(self, until=None, limit=None):
+        """Turn series firing before `until` into scheduled jobs and advance them
+
+        Each claimed series gets one job for its next occurrence (job_id
+        '<series_id>@<fire time>') and its next fire time moves to the
+        following occurrence. Occurrences missed while nothing was claiming
+        are skipped apart from the earliest one. A series with a timezone
+        works out its next occurrence on that zone's clock. Returns the new jobs.
+        """
+        now = datetime.now()
+        until = until or now + timedelta(seconds=config.SERIES_LOOKAHEAD)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            due = conn.execute(
+                "SELECT series_id, recipient_name, phone_number, message_body, rule, anchor, next_fire, "
+                "priority, campaign, timezone FROM series WHERE active = 1 AND next_fire <= ? ORDER BY next_fire LIMIT ?",
+                (until.isoformat(), limit or config.SERIES_CLAIM_BATCH)
+            ).fetchall()
+            if not due:
+                return []
+            version = self._next_version(conn)
+            stamp = now.isoformat()
+            jobs, advances = [], []
+            for row in due:
+                fire = datetime.fromisoformat(row['next_fire'])
+                zone = get_zone(row['timezone']) if row['timezone'] else None
+                try:
+                    rule = parse_rule(row['rule'], datetime.fromisoformat(row['anchor']))
+                    following = to_server_time(rule.next_after(to_zone_time(max(fire, now), zone)), zone)
+                except RecurrenceError:
+                    following = None
+                advances.append((following and following.isoformat(), following is not None, stamp, row['series_id']))
+                jobs.append({
+                    'job_id': f"{row['series_id']}@{fire.isoformat()}", 'recipient_name': row['recipient_name'],
+                    'phone_number': row['phone_number'], 'message_body': row['message_body'],
+                    'scheduled_time': fire.isoformat(), 'status': 'scheduled', 'sid': None, 'error': None,
+                    'attempts': 0, 'created_at': stamp, 'updated_at': stamp, 'version': version,
+                    'idempotency_key': idempotency_key(row['series_id'], row['phone_number'],
+                                                       row['message_body'], fire),
+                    'priority': row['priority'], 'campaign': row['campaign']
+                })
+            conn.executemany(
+                "UPDATE series SET next_fire = ?, active = ?, occurrences = occurrences + 1, updated_at = ? "
+                "WHERE series_id = ?",
+                advances
+            )
+            insert = (f"INSERT OR IGNORE INTO jobs ({', '.join(JOB_COLUMNS)}) "
+                      f"VALUES ({', '.join('?' * len(JOB_COLUMNS))})")
+            jobs = [job for job in jobs
+                    if conn.execute(insert, tuple(job[column] for column in JOB_COLUMNS)).rowcount]
+        return jobs
+
+    def count_series(self, active_only=True):
+        """Number of recurring series"""
+        where = " WHERE active = 1" if active_only else ""
+        return self._connect().execute(f"SELECT COUNT(*) FROM series{where}").fetchone()[0]
+
+    def page_series(self, limit=50, offset=0, active_only=True):
+        """One page of recurring series, soonest next fire first"""
+        where = " WHERE active = 1" if active_only else ""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(SERIES_COLUMNS)} FROM series{where} "
+            "ORDER BY next_fire, series_id LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def cancel_series(self, series_ids):
+        """Stop recurring series; occurrences already turned into jobs still send"""
+        conn = self._connect()
+        with conn:
+            return conn.executemany(
+                "UPDATE series SET active = 0, next_fire = NULL, updated_at = ? WHERE series_id = ? AND active = 1",
+                [(datetime.now().isoformat(), series_id) for series_id in series_ids]
+            ).rowcount
+
+    def record_result(self, job_id, status, sid=None, error=None):
+        """Queue a status update; the writer thread commits it with others"""
+        with self._flushed:
+            self._pending_updates += 1
+        self._updates.put(('result', (status, sid, error, datetime.now().isoformat(), job_id)))
+
+    def record_delivery(self, sid, status, error=None):
+        """Queue a delivery status reported by a Twilio status callback
+
+        Updates are matched by message SID. Callbacks that arrive before the
+        send result carrying that SID is stored are held back and applied
+        once it is.
+        """
+        with self._flushed:
+            self._pending_updates += 1
+        self._updates.put(('delivery', (sid, status, error, datetime.now().isoformat())))
+
+    def flush(self, timeout=None):
+        """Block until every queued status update has been committed"""
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending_updates == 0, timeout)
+
+    def _write_loop(self):
+        """Drain queued status updates and commit them in batches"""
+        try:
+            conn = self._connect()
+        finally:
+            self._writer_ready.set()
+        while True:
+            batch = [self._updates.get()]
+            try:
+                while len(batch) < config.JOB_STORE_BATCH_SIZE:
+                    batch.append(self._updates.get(timeout=config.JOB_STORE_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+
+            results = [params for kind, params in batch if kind == 'result']
+            deliveries = [params for kind, params in batch if kind == 'delivery']
+            try:
+                self._commit_with_retry(conn, results, deliveries)
+            except sqlite3.Error as e:
+                # Don't let one bad update take the rest of the batch with it
+                logger.warning("status_batch_failed", extra={'updates': len(batch), 'error': str(e)})
+                self._commit_each(conn, results, deliveries)
+
+            with self._flushed:
+                self._pending_updates -= len(batch)
+                self._flushed.notify_all()
+
+    def _commit(self, conn, results, deliveries):
+        """Write send results and delivery statuses in one transaction"""
+        with conn:
+            version = self._next_version(conn)
+            if results:
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, sid = ?, error = ?, attempts = attempts + 1, "
+                    "updated_at = ?, version = ? WHERE job_id = ?",
+                    [update[:4] + (version,) + update[4:] for update in results]
+                )
+            if deliveries:
+                self._apply_deliveries(conn, deliveries, version)
+            if conn.execute("SELECT 1 FROM delivery_backlog LIMIT 1").fetchone():
+                self._apply_backlog(conn, version)
+
+    def _commit_with_retry(self, conn, results, deliveries):
+        """Commit a batch, backing off and retrying while the database is busy or locked"""
+        delay = config.JOB_STORE_RETRY_DELAY
+        for attempt in range(1, config.JOB_STORE_WRITE_RETRIES + 1):
+            try:
+                self._commit(conn, results, deliveries)
+                return
+            except sqlite3.OperationalError as e:
+                logger.warning("status_write_retry", extra={'attempt': attempt, 'delay': delay, 'error': str(e)})
+                time.sleep(delay)
+                delay *= 2
+        self._commit(conn, results, deliveries)
+
+    def _commit_each(self, conn, results, deliveries):
+        """Commit updates one at a time so only the ones that can't be written are lost"""
+        for update in results:
+            try:
+                self._commit(conn, [update], [])
+            except sqlite3.Error as e:
+                logger.error("status_write_failed", extra={'job_id': update[4], 'status': update[0], 'error': str(e)})
+        for delivery in deliveries:
+            try:
+                self._commit(conn, [], [delivery])
+            except sqlite3.Error as e:
+                logger.error("status_write_failed", extra={'sid': delivery[0], 'status': delivery[1], 'error': str(e)})
+
+    @staticmethod
+    def _apply_deliveries(conn, deliveries, version):
+        """Write callback statuses by SID; park the ones whose SID isn't stored yet"""
+        # Several callbacks for one message can land in the same batch; keep the furthest one
+        latest = {}
+        for sid, status, error, updated_at in deliveries:
+            if sid not in latest or DELIVERY_RANK[status] >= DELIVERY_RANK[latest[sid][0]]:
+                latest[sid] = (status, error, updated_at)
+
+        conn.executemany(
+            "UPDATE jobs SET status = ?, error = COALESCE(?, error), updated_at = ?, version = ? "
+            f"WHERE sid = ? AND {_rank_sql('status')} < ?",
+            [(status, error, updated_at, version, sid, DELIVERY_RANK[status])
+             for sid, (status, error, updated_at) in latest.items()]
+        )
+
+        sids = list(latest)
+        known = set()
+        for start in range(0, len(sids), 500):
+            chunk = sids[start:start + 500]
+            known.update(row[0] for row in conn.execute(
+                f"SELECT sid FROM jobs WHERE sid IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        received_at = time.time()
+        conn.executemany(
+            "INSERT INTO delivery_backlog (sid, status, error, received_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(sid) DO UPDATE SET status = excluded.status, error = excluded.error "
+            f"WHERE {_rank_sql('excluded.status')} >= {_rank_sql('delivery_backlog.status')}",
+            [(sid, status, error, received_at)
+             for sid, (status, error, _) in latest.items() if sid not in known]
+        )
+
+    @staticmethod
+    def _apply_backlog(conn, version):
+        """Apply parked callbacks whose message SID has been stored since"""
+        backlog = "SELECT {} FROM delivery_backlog AS b WHERE b.sid = jobs.sid"
+        conn.execute(
+            f"UPDATE jobs SET status = ({backlog.format('b.status')}), "
+            f"error = COALESCE(({backlog.format('b.error')}), error), updated_at = ?, version = ? "
+            f"WHERE sid IN (SELECT sid FROM delivery_backlog) "
+            f"AND {_rank_sql('status')} < ({backlog.format(_rank_sql('b.status'))})",
+            (datetime.now().isoformat(), version)
+        )
+        # Callbacks for messages this store never sent are dropped after a while
+        conn.execute(
+            "DELETE FROM delivery_backlog WHERE sid IN (SELECT sid FROM jobs WHERE sid IS NOT NULL) "
+            "OR received_at < ?",
+            (time.time() - config.DELIVERY_BACKLOG_TTL,)
+        )
+
+    def current_version(self):
+        """Latest change version committed to the store"""
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+        return row[0]
+
+    def changes_since(self, version):
+        """Return (rows changed after version, newest version seen)"""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE version > ? ORDER BY version",
+            (version,)
+        ).fetchall()
+        rows = [dict(row) for row in rows]
+        if rows:
+            version = rows[-1]['version']
+        return rows, version
+
+    def claim_pending_jobs(self):
+        """Atomically mark submitted jobs as scheduled and return them"""
+        conn = self._connect()
+        with conn:
+            # IMMEDIATE takes the write lock up front so two schedulers can't claim the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = 'pending'"
+            ).fetchall()
+            if rows:
+                version = self._next_version(conn)
+                conn.execute(
+                    "UPDATE jobs SET status = 'scheduled', updated_at = ?, version = ? WHERE status = 'pending'",
+                    (datetime.now().isoformat(), version)
+                )
+        return [dict(row) for row in rows]
+
+    def expire_jobs(self, job_ids, reason='Send time passed while the scheduler was not running'):
+        """Mark unsent jobs as expired instead of sending them late"""
+        conn = self._connect()
+        with conn:
+            version = self._next_version(conn)
+            conn.executemany(
+                "UPDATE jobs SET status = 'expired', error = ?, updated_at = ?, version = ? "
+                "WHERE job_id = ? AND status IN ('pending', 'scheduled')",
+                [(reason, datetime.now().isoformat(), version, job_id) for job_id in job_ids]
+            )
+
+    def fail_interrupted_sends(self, reason=INTERRUPTED_SEND_ERROR):
+        """Mark jobs left 'sending' by a previous run as failed; returns how many
+
+        They may or may not have reached Twilio, so they are not sent again.
+        If the send did finish after all, its result overwrites this one.
+        """
+        conn = self._connect()
+        with conn:
+            version = self._next_version(conn)
+            return conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, version = ? WHERE status = 'sending'",
+                (reason, datetime.now().isoformat(), version)
+            ).rowcount
+
+    def unfinished_jobs(self):
+        """All jobs that have not been sent or failed yet"""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status IN ('pending', 'scheduled', 'sending') "
+            "ORDER BY scheduled_time"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def scheduled_jobs(self):
+        """Jobs already claimed by a scheduler but not finished"""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = 'scheduled' ORDER BY scheduled_time"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def unsettled_jobs(self):
+        """Sent jobs that may still change status (sent or delivered, with a SID)"""
+        rows = self._connect().execute(
+            "SELECT job_id, sid, status, scheduled_time FROM jobs "
+            "WHERE status IN ('sent', 'delivered') AND sid IS NOT NULL"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_cursor(self, name, cursor):
+        """Remember where a resumable job got to; None clears it"""
+        conn = self._connect()
+        with conn:
+            if cursor is None:
+                conn.execute("DELETE FROM sync_cursors WHERE name = ?", (name,))
+            else:
+                conn.execute(
+                    "INSERT INTO sync_cursors (name, cursor, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET cursor = excluded.cursor, updated_at = excluded.updated_at",
+                    (name, cursor, datetime.now().isoformat())
+                )
+
+    def load_cursor(self, name):
+        """Cursor saved with save_cursor, or None"""
+        row = self._connect().execute("SELECT cursor FROM sync_cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def count_jobs(self, statuses=None, search=None):
+        """Number of jobs matching the status/recipient filters"""
+        where, params = _filter_clause(statuses, search)
+        return self._connect().execute(f"SELECT COUNT(*) FROM jobs{where}", params).fetchone()[0]
+
+    def page_jobs(self, statuses=None, search=None, limit=50, offset=0):
+        """One page of matching jobs, latest scheduled time first
+
+        statuses limits the page to those status values; search matches
+        part of the recipient name or phone number.
+        """
+        where, params = _filter_clause(statuses, search)
+        rows = self._connect().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs{where} "
+            "ORDER BY scheduled_time DESC, job_id LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def status_counts(self):
+        """Return {status: number of jobs}"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def clear_finished(self):
+        """Delete jobs that are no longer pending; returns how many were removed"""
+        conn = self._connect()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('pending', 'scheduled', 'sending')"
+            ).rowcount
+            if removed:
+                # Deleted rows can't show up in changes_since, but readers still need to see a new version
+                self._next_version(conn)
+        return removed
+
+    def set_meta(self, key, value):
+        """Store an integer value (e.g. a heartbeat timestamp) under key"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, int(value))
+            )
+
+    def get_meta(self, key, default=None):
+        """Read an integer value stored with set_meta"""
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
@@ -1,58 +1,209 @@
-from twilio.rest import Client
-from datetime import datetime
+#!/usr/bin/env python3
+"""
+Command-line campaigns for WhatsApp Message Scheduler
+Streams recipients from a CSV or JSONL file (or stdin) in chunks, waits for
+the scheduled time and sends through the same concurrent, rate-limited send
+engine and sender number pool as the app. Each message's result is written as a JSON line as soon
+as it is known, so the output can feed another program while the campaign
+is still running.
+
+Usage:
+    python main.py recipients.csv --at "2025-01-31 09:00"
+    python main.py recipients.jsonl --in 30m --template "Hi {name}, {custom_message}"
+    cat recipients.jsonl | python main.py - --format jsonl -o results.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
 import time
+from datetime import datetime, timedelta
+
+import config
+from bulk_import import iter_validated_chunks
+from message_templates import TemplateError, compile_template
+from structured_logging import configure_logging, shutdown_logging
+
+DELAY_PATTERN = re.compile(r'^(?P<count>\d+)\s*(?P<unit>[smhd])$')
+DELAY_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_send_time(value):
+    """--at value: 'YYYY-MM-DD HH:MM' or any ISO datetime"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date/time {value!r} (expected YYYY-MM-DD HH:MM)") from None
+
+
+def parse_delay(value):
+    """--in value: a delay such as 90s, 30m, 2h or 1d"""
+    match = DELAY_PATTERN.match(value.strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid delay {value!r} (expected e.g. 30m, 2h)")
+    return timedelta(**{DELAY_UNITS[match.group('unit')]: int(match.group('count'))})
+
+
+def wait_until(send_time):
+    """Sleep until send_time in short steps so clock changes and Ctrl-C are noticed"""
+    while True:
+        remaining = (send_time - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 30))
+
+
+class ResultWriter:
+    """Write one JSON object per line from any thread, flushing each line"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.counts = {'sent': 0, 'failed': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def write(self, row, recipient, status, sid=None, error=None):
+        line = json.dumps({
+            'row': row,
+            'name': recipient.get('name'),
+            'number': recipient.get('number'),
+            'status': status,
+            'sid': sid,
+            'error': error,
+            'ts': datetime.now().isoformat(timespec='seconds')
+        }, ensure_ascii=False)
+        with self._lock:
+            self.counts[status] += 1
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+def open_campaign(source, file_format=None, chunksize=None):
+    """Start reading recipients; returns an iterator of validated (valid, rejects) chunks
+
+    The first chunk is read straight away, so a missing file (OSError) or a
+    bad format or header (ValueError) is raised here rather than mid-campaign.
+    """
+    chunks = iter_validated_chunks(source, filename=getattr(source, 'name', None),
+                                   chunksize=chunksize, file_format=file_format)
+    first = next(chunks, None)
+    return chunks if first is None else itertools.chain([first], chunks)
 
-# Twilio credentials
-account_sid = 'AC6409ddcce319e4cc67a972c635f0e05d'
-auth_token = '98ba1dde966881a50417891a71f22d5a'
-client = Client(account_sid, auth_token)
-
-# Step 1: Collect multiple recipients from user
-recipients = []
-
-print("Enter recipient details. Type 'done' as the name when finished.\n")
-
-while True:
-    name = input("Enter recipient name: ")
-    if name.lower() == "done":
-        break
-    number = input("Enter recipient WhatsApp number (e.g., +91...): ")
-    custom_msg = input("Enter custom message: ")
-    recipients.append({
-        "name": name,
-        "number": number,
-        "custom_msg": custom_msg
-    })
-    print("Recipient added.\n")
-
-if not recipients:
-    print("No recipients entered. Exiting.")
-    exit()
-
-# Step 2: Get scheduled date and time
-date_str = input("Enter the date to send the message (YYYY-MM-DD): ")
-time_str = input("Enter the time to send the message (HH:MM in 24-hour format): ")
-
-schedule_datetime = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
-current_datetime = datetime.now()
-delay_sec = (schedule_datetime - current_datetime).total_seconds()
-
-if delay_sec <= 0:
-    print("The specified time is in the past. Please enter a future time.")
-    exit()
-
-print(f"\nMessages will be sent at {schedule_datetime}...\n")
-time.sleep(delay_sec)
-
-# Step 3: Send messages
-for recipient in recipients:
+
+def run_campaign(chunks, writer, template, sender, max_in_flight=None):
+    """Render and submit validated recipient chunks; returns when every result is written
+
+    At most max_in_flight messages are submitted but unfinished, so reading
+    never runs far ahead of sending and memory stays bounded.
+    """
+    compiled = compile_template(template)
+    slots = threading.BoundedSemaphore(max_in_flight or config.SEND_CONCURRENCY * 2)
+    in_flight = threading.Condition()
+    outstanding = [0]
+
+    def submit(row, recipient, body):
+        slots.acquire()
+        with in_flight:
+            outstanding[0] += 1
+
+        def record_result(future):
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, str(e)
+            if success:
+                writer.write(row, recipient, 'sent', sid=result)
+            else:
+                writer.write(row, recipient, 'failed', error=result)
+            slots.release()
+            with in_flight:
+                outstanding[0] -= 1
+                in_flight.notify_all()
+
+        sender.submit(recipient['number'], body).add_done_callback(record_result)
+
+    try:
+        for valid, rejects in chunks:
+            for row, recipient in rejects.iterrows():
+                writer.write(row + 1, recipient.to_dict(), 'rejected', error=recipient['reason'])
+            for row, recipient in valid.iterrows():
+                recipient = recipient.to_dict()
+                missing = compiled.missing_fields(recipient)
+                if missing:
+                    writer.write(row + 1, recipient, 'rejected',
+                                 error=f"Missing template field(s): {', '.join(missing)}")
+                    continue
+                submit(row + 1, recipient, compiled.render(recipient))
+    finally:
+        # Messages already submitted still get their result lines if reading fails part way
+        with in_flight:
+            in_flight.wait_for(lambda: outstanding[0] == 0)
+    return writer.counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send a WhatsApp campaign from a CSV or JSONL recipient list")
+    parser.add_argument("input", help="CSV or JSONL file with name, number and custom_message columns; '-' for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="Input format (default: from the file extension, csv for stdin)")
+    when = parser.add_mutually_exclusive_group()
+    when.add_argument("--at", type=parse_send_time, help="Send time, e.g. '2025-01-31 09:00' (default: now)")
+    when.add_argument("--in", dest="delay", type=parse_delay, help="Send after a delay, e.g. 30m or 2h")
+    parser.add_argument("--template", default=config.DEFAULT_MESSAGE_TEMPLATE,
+                        help="Message template; {field} inserts any input column")
+    parser.add_argument("-o", "--output", default="-", help="Where to write JSONL results (default: stdout)")
+    parser.add_argument("--from", dest="from_number", default=None,
+                        help="Send from this WhatsApp number only (default: spread over the sender pool)")
+    parser.add_argument("--chunksize", type=int, default=config.IMPORT_CHUNK_SIZE, help="Rows read per chunk")
+    args = parser.parse_args(argv)
+
+    try:
+        compile_template(args.template)
+    except TemplateError as e:
+        parser.error(config.ERROR_MESSAGES['invalid_template'].format(error=e))
+    send_time = args.at or (datetime.now() + args.delay if args.delay else None)
+    if send_time and send_time < datetime.now() - timedelta(minutes=1):
+        parser.error(config.ERROR_MESSAGES['past_datetime'])
+
+    # Check the input before waiting, so a bad file isn't found out only at send time
+    source = sys.stdin if args.input == "-" else args.input
     try:
-        body = f"Hi {recipient['name']}, {recipient['custom_msg']}"
-        message = client.messages.create(
-            from_='whatsapp:+14155238886',
-            body=body,
-            to=f"whatsapp:{recipient['number']}"
-        )
-        print(f"✅ Message sent to {recipient['name']} (SID: {message.sid})")
-    except Exception as e:
-        print(f"❌ Failed to send to {recipient['name']}: {e}")
+        chunks = open_campaign(source, file_format=args.format, chunksize=args.chunksize)
+        output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    # Results own stdout, so status lines and logs go to stderr
+    shutdown_logging()
+    configure_logging(stream=sys.stderr)
+    if send_time:
+        print(f"⏰ Waiting until {send_time:%Y-%m-%d %H:%M:%S} to send...", file=sys.stderr)
+        try:
+            wait_until(send_time)
+        except KeyboardInterrupt:
+            print("\n👋 Cancelled before sending", file=sys.stderr)
+            if output is not sys.stdout:
+                output.close()
+            return 130
+
+    from send_engine import BackgroundSender
+    sender = BackgroundSender(from_number=args.from_number)
+    try:
+        counts = run_campaign(chunks, ResultWriter(output), args.template, sender)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    finally:
+        sender.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"✅ {counts['sent']} sent, ❌ {counts['failed']} failed, ⚠️  {counts['rejected']} rejected", file=sys.stderr)
+    return 0 if counts['failed'] == 0 and counts['rejected'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Message templates for WhatsApp Message Scheduler
+Templates are parsed once into a render plan that is cached by template
+text, then rendered for whole batches of recipients.
+
+Syntax:
+    {field}                   value of a recipient field (required)
+    {field|fallback}          value, or fallback text when the field is empty
+    {#if field}...{/if}       section shown only when the field is not empty
+    {#if field}...{#else}...{/if}
+    {{ and }}                 literal braces
+"""
+
+import re
+from functools import lru_cache
+
+import config
+
+TOKEN_PATTERN = re.compile(
+    r'\{\{|\}\}'
+    r'|\{#if\s+(?P<condition>\w+)\s*\}'
+    r'|\{#else\}'
+    r'|\{/if\}'
+    r'|\{(?P<field>\w+)(?:\|(?P<default>[^{}]*))?\}'
+)
+
+
+class TemplateError(ValueError):
+    """Raised when a template cannot be parsed or rendered"""
+
+
+def _has_value(value):
+    return value is not None and str(value) != ''
+
+
+class MessageTemplate:
+    """A parsed template: a tree of text, field and conditional nodes"""
+
+    def __init__(self, text):
+        self.text = text
+        self.plan = self._parse(text)
+        self.fields = frozenset(self._collect_fields(self.plan))
+
+    @staticmethod
+    def _parse(text):
+        """Turn template text into nested node lists"""
+        root = []
+        # Each stack entry: (node list being filled, open 'if' node or None)
+        stack = [(root, None)]
+        position = 0
+
+        def add_text(chunk):
+            if '{' in chunk or '}' in chunk:
+                raise TemplateError(f"Unexpected brace in template near: {chunk.strip()[:30]!r}")
+            if chunk:
+                stack[-1][0].append(chunk)
+
+        for match in TOKEN_PATTERN.finditer(text):
+            add_text(text[position:match.start()])
+            position = match.end()
+            token = match.group(0)
+            nodes, open_if = stack[-1]
+
+            if token in ('{{', '}}'):
+                nodes.append(token[0])
+            elif match.group('condition'):
+                node = ('if', match.group('condition'), [], [])
+                nodes.append(node)
+                stack.append((node[2], node))
+            elif token == '{#else}':
+                if open_if is None or nodes is open_if[3]:
+                    raise TemplateError("{#else} without a matching {#if ...}")
+                stack[-1] = (open_if[3], open_if)
+            elif token == '{/if}':
+                if open_if is None:
+                    raise TemplateError("{/if} without a matching {#if ...}")
+                stack.pop()
+            else:
+                nodes.append(('field', match.group('field'), match.group('default')))
+
+        add_text(text[position:])
+        if len(stack) > 1:
+            raise TemplateError(f"Unclosed {{#if {stack[-1][1][1]}}} block")
+        return root
+
+    @classmethod
+    def _collect_fields(cls, nodes):
+        for node in nodes:
+            if isinstance(node, tuple):
+                yield node[1]
+                if node[0] == 'if':
+                    yield from cls._collect_fields(node[2])
+                    yield from cls._collect_fields(node[3])
+
+    def _render(self, nodes, values, parts):
+        for node in nodes:
+            if isinstance(node, str):
+                parts.append(node)
+            elif node[0] == 'field':
+                value = values.get(node[1])
+                if _has_value(value):
+                    parts.append(str(value))
+                elif node[2] is not None:
+                    parts.append(node[2])
+                else:
+                    raise TemplateError(f"Missing value for '{node[1]}'")
+            else:
+                branch = node[2] if _has_value(values.get(node[1])) else node[3]
+                self._render(branch, values, parts)
+
+    def render(self, values):
+        """Render the template for one recipient's fields"""
+        parts = []
+        self._render(self.plan, values, parts)
+        return ''.join(parts)
+
+    def _missing(self, nodes, values, missing):
+        for node in nodes:
+            if isinstance(node, str):
+                continue
+            if node[0] == 'field':
+                if node[2] is None and not _has_value(values.get(node[1])):
+                    missing.append(node[1])
+            else:
+                branch = node[2] if _has_value(values.get(node[1])) else node[3]
+                self._missing(branch, values, missing)
+
+    def missing_fields(self, values):
+        """Required fields that would be empty when rendering for these values"""
+        missing = []
+        self._missing(self.plan, values, missing)
+        return missing
+
+
+@lru_cache(maxsize=config.TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    """Parse template text once; repeated calls reuse the cached plan"""
+    return MessageTemplate(text)
+
+
+def find_missing_fields(text, recipients):
+    """Return {recipient position: [missing fields]} for recipients that can't be rendered"""
+    template = compile_template(text)
+    problems = {}
+    for position, recipient in enumerate(recipients):
+        missing = template.missing_fields(recipient)
+        if missing:
+            problems[position] = missing
+    return problems
+
+
+def render_batch(text, recipients):
+    """Render one template for a batch of recipients in a single call"""
+    render = compile_template(text).render
+    return [render(recipient) for recipient in recipients]
@@ -0,0 +1,281 @@
+"""
+Metrics registry for WhatsApp Message Scheduler
+In-process counters, gauges and histograms for the scheduling and send
+paths. Recording is one lock and a dict update, so it is cheap enough to
+call per message. The registry renders in the Prometheus text format and
+can be served from a small local HTTP endpoint.
+"""
+
+import bisect
+import math
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SAMPLE_PATTERN = re.compile(r'^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>.*)\})?\s+(?P<value>\S+)$')
+LABEL_PATTERN = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _unescape(match):
+    return '\n' if match.group(1) == 'n' else match.group(1)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        if not self.labelnames and self.kind != 'histogram':
+            # Unlabelled counters and gauges report 0 before their first update
+            self._values[()] = 0
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    """Named collection of metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, labelnames=(), **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **options)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def samples(self):
+        """Every current sample as (name, labels, value)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [sample for metric in metrics for sample in metric.samples()]
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Scheduling
+MESSAGES_SCHEDULED = REGISTRY.counter('whatsapp_messages_scheduled_total', 'Messages queued on the dispatcher')
+PENDING_JOBS = REGISTRY.gauge('whatsapp_scheduler_pending_jobs', 'Messages waiting on the dispatcher for their fire time')
+FIRE_LAG_SECONDS = REGISTRY.histogram(
+    'whatsapp_fire_lag_seconds', 'Delay between a job\'s fire time and its dispatch',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+)
+WORKERS = REGISTRY.gauge('whatsapp_scheduler_workers', 'Dispatcher worker threads')
+WORKERS_BUSY = REGISTRY.gauge('whatsapp_scheduler_workers_busy', 'Dispatcher worker threads running a job')
+MISSED_JOBS = REGISTRY.counter(
+    'whatsapp_missed_jobs_total', 'Jobs found past their fire time after a restart, by catch-up action', ('action',)
+)
+
+# Sending
+MESSAGES_SENT = REGISTRY.counter('whatsapp_messages_sent_total', 'Messages accepted by Twilio')
+MESSAGES_FAILED = REGISTRY.counter(
+    'whatsapp_messages_failed_total', 'Messages that could not be sent', ('error_class',)
+)
+TWILIO_REQUEST_SECONDS = REGISTRY.histogram('whatsapp_twilio_request_seconds', 'Twilio Messages API call latency')
+SEND_SLOTS = REGISTRY.gauge('whatsapp_send_concurrency', 'Concurrent Twilio requests allowed')
+SENDS_IN_FLIGHT = REGISTRY.gauge('whatsapp_send_requests_in_flight', 'Twilio requests currently open')
+MESSAGES_DEDUPLICATED = REGISTRY.counter(
+    'whatsapp_messages_deduplicated_total', 'Duplicate messages dropped by idempotency key', ('stage',)
+)
+LANE_DEPTH = REGISTRY.gauge('whatsapp_lane_depth', 'Messages waiting for a send turn, by priority lane', ('lane',))
+LANE_WAIT_SECONDS = REGISTRY.histogram(
+    'whatsapp_lane_wait_seconds', 'Time a message waited in its priority lane for a send turn', ('lane',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+)
+SENDER_MESSAGES = REGISTRY.counter(
+    'whatsapp_sender_messages_total', 'Messages routed to each sender number by the sender pool', ('sender',)
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    'whatsapp_circuit_state', 'Circuit breaker state per account and sender (0 closed, 1 half-open, 2 open)',
+    ('scope', 'name')
+)
+
+# Delivery
+STATUS_CALLBACKS = REGISTRY.counter(
+    'whatsapp_status_callbacks_total', 'Delivery status callbacks received', ('status',)
+)
+
+
+def parse_prometheus(text):
+    """Parse Prometheus text format into (name, labels, value) samples"""
+    samples = []
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = SAMPLE_PATTERN.match(line.strip())
+        if not match:
+            continue
+        labels = {name: ESCAPE_PATTERN.sub(_unescape, value)
+                  for name, value in LABEL_PATTERN.findall(match.group('labels') or '')}
+        samples.append((match.group('name'), labels, float(match.group('value'))))
+    return samples
+
+
+def histogram_quantile(samples, name, quantile, **match):
+    """Estimate a quantile from a histogram's cumulative buckets (upper bucket bound)
+
+    Keyword arguments pick one labelled series, e.g. lane='high'.
+    """
+    buckets = sorted(
+        (float(labels['le']), value) for sample_name, labels, value in samples
+        if sample_name == f"{name}_bucket" and all(labels.get(key) == wanted for key, wanted in match.items())
+    )
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    target = quantile * buckets[-1][1]
+    for bound, cumulative in buckets:
+        if cumulative >= target:
+            return bound
+    return math.inf
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host=None, port=None):
+    """Serve /metrics from a background thread; returns the server (call shutdown() to stop)"""
+    server = ThreadingHTTPServer(
+        (host or config.METRICS_HOST, config.METRICS_PORT if port is None else port),
+        _MetricsHandler
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,121 @@
+"""
+Metrics dashboard for WhatsApp Message Scheduler
+Compact view of the scheduling and send metrics. In daemon mode the numbers
+are read from the scheduler daemon's Prometheus endpoint, otherwise from
+this process's registry.
+"""
+
+import math
+import urllib.request
+
+import streamlit as st
+
+import config
+from metrics import REGISTRY, histogram_quantile, parse_prometheus
+
+st.set_page_config(
+    page_title=f"Metrics - {config.APP_TITLE}",
+    page_icon="📈",
+    layout=config.PAGE_LAYOUT
+)
+
+
+def load_samples():
+    """Current metric samples as (name, labels, value)"""
+    if config.SCHEDULER_MODE == 'daemon':
+        url = f"http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics"
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return parse_prometheus(response.read().decode())
+    return REGISTRY.samples()
+
+
+def total(samples, name):
+    """Sum of a metric across all its label values"""
+    return sum(value for sample_name, _, value in samples if sample_name == name)
+
+
+def by_label(samples, name, label):
+    """{label value: metric value}, largest first"""
+    values = {labels[label]: value for sample_name, labels, value in samples if sample_name == name}
+    return dict(sorted(values.items(), key=lambda item: -item[1]))
+
+
+def format_seconds(value):
+    if value is None:
+        return "—"
+    if value == math.inf:
+        return "> 60 s"
+    return f"{value * 1000:.0f} ms" if value < 1 else f"{value:.1f} s"
+
+
+@st.fragment(run_every=config.STATUS_UPDATE_INTERVAL)
+def dashboard():
+    try:
+        samples = load_samples()
+    except OSError as e:
+        st.warning(f"⚠️ Scheduler daemon metrics are unavailable: {e}")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Scheduled", int(total(samples, 'whatsapp_messages_scheduled_total')))
+    col2.metric("Sent", int(total(samples, 'whatsapp_messages_sent_total')))
+    col3.metric("Failed", int(total(samples, 'whatsapp_messages_failed_total')))
+    col4.metric("Pending Jobs", int(total(samples, 'whatsapp_scheduler_pending_jobs')))
+
+    # Histogram quantiles are bucket upper bounds, so they read as "at most"
+    col1, col2, col3, col4 = st.columns(4)
+    latency = 'whatsapp_twilio_request_seconds'
+    col1.metric("Twilio p50", format_seconds(histogram_quantile(samples, latency, 0.50)))
+    col2.metric("Twilio p99", format_seconds(histogram_quantile(samples, latency, 0.99)))
+    col3.metric("Fire Lag p99", format_seconds(histogram_quantile(samples, 'whatsapp_fire_lag_seconds', 0.99)))
+    workers = total(samples, 'whatsapp_scheduler_workers')
+    busy = total(samples, 'whatsapp_scheduler_workers_busy')
+    col4.metric("Worker Utilization", f"{busy / workers:.0%}" if workers else "—")
+
+    in_flight = int(total(samples, 'whatsapp_send_requests_in_flight'))
+    slots = int(total(samples, 'whatsapp_send_concurrency'))
+    st.caption(f"Twilio requests in flight: {in_flight} of {slots}")
+    # Gauge value 1 is half-open, 2 is open
+    circuits = [(labels['scope'], labels['name'], value) for name, labels, value in samples
+                if name == 'whatsapp_circuit_state' and value]
+    for scope, name, value in circuits:
+        state = "open" if value == 2 else "half-open (probing)"
+        st.warning(f"⚡ {scope.capitalize()} circuit {name} is {state}: messages are being held back")
+
+    senders = by_label(samples, 'whatsapp_sender_messages_total', 'sender')
+    if len(senders) > 1:
+        st.caption("Messages by sender: " + ", ".join(f"{sender} {int(value)}" for sender, value in senders.items()))
+
+    st.subheader("Priority Lanes")
+    depths = {labels['lane']: value for name, labels, value in samples if name == 'whatsapp_lane_depth'}
+    wait = 'whatsapp_lane_wait_seconds'
+    st.dataframe({
+        "Lane": [lane.capitalize() for lane in depths],
+        "Waiting": [int(value) for value in depths.values()],
+        "Wait p50": [format_seconds(histogram_quantile(samples, wait, 0.50, lane=lane)) for lane in depths],
+        "Wait p99": [format_seconds(histogram_quantile(samples, wait, 0.99, lane=lane)) for lane in depths],
+    }, hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Failures by Error Class")
+        failures = by_label(samples, 'whatsapp_messages_failed_total', 'error_class')
+        if failures:
+            st.dataframe({"Error Class": list(failures), "Messages": [int(v) for v in failures.values()]},
+                         hide_index=True, use_container_width=True)
+        else:
+            st.info("No failed sends")
+    with col2:
+        st.subheader("Delivery Callbacks")
+        callbacks = by_label(samples, 'whatsapp_status_callbacks_total', 'status')
+        if callbacks:
+            st.dataframe({"Status": list(callbacks), "Callbacks": [int(v) for v in callbacks.values()]},
+                         hide_index=True, use_container_width=True)
+        else:
+            st.info("No status callbacks received")
+
+    st.caption(f"Prometheus endpoint: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+
+
+st.title("📈 Metrics")
+dashboard()
@@ -0,0 +1,115 @@
+"""
+Phone number normalization for WhatsApp Message Scheduler
+Canonicalizes numbers to E.164 one at a time or in vectorized batches and
+flags duplicates through a hash set of numbers already seen
+"""
+
+import importlib.util
+import re
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Everything except digits and '+' is formatting (spaces, dashes, brackets...)
+PHONE_CLEAN_PATTERN = re.compile(r'[^\d+]')
+INTERNATIONAL_PREFIX_PATTERN = re.compile(r'^00')
+WELL_FORMED_PATTERN = r'\+\d+'
+
+# Arrow-backed strings run the batch string ops in native code when pyarrow is available
+BATCH_STRING_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'string'
+
+
+def _apply_default_country(cleaned):
+    """Prefix national numbers with DEFAULT_COUNTRY_CODE when one is configured"""
+    if not config.DEFAULT_COUNTRY_CODE or cleaned.startswith('+') or not cleaned:
+        return cleaned
+    return f"+{config.DEFAULT_COUNTRY_CODE}{cleaned.lstrip('0')}"
+
+
+def phone_reject_reason(e164):
+    """Return why a cleaned number is not valid E.164, or '' if it is"""
+    digits = e164[1:]
+    if not e164:
+        return config.PHONE_REJECT_REASONS['empty']
+    if not e164.startswith('+'):
+        return config.PHONE_REJECT_REASONS['missing_country_code']
+    if not digits.isdigit():
+        return config.PHONE_REJECT_REASONS['invalid_characters']
+    if digits.startswith('0'):
+        return config.PHONE_REJECT_REASONS['invalid_country_code']
+    if len(digits) < config.MIN_PHONE_LENGTH:
+        return config.PHONE_REJECT_REASONS['too_short']
+    if len(digits) > config.MAX_PHONE_LENGTH:
+        return config.PHONE_REJECT_REASONS['too_long']
+    return ''
+
+
+def normalize_phone_number(phone):
+    """Canonicalize one number; returns (is_valid, E.164 number or reason)"""
+    cleaned = PHONE_CLEAN_PATTERN.sub('', phone or '')
+    cleaned = _apply_default_country(INTERNATIONAL_PREFIX_PATTERN.sub('+', cleaned))
+    reason = phone_reject_reason(cleaned)
+    if reason:
+        return False, reason
+    return True, cleaned
+
+
+def normalize_phone_numbers(numbers, seen=None, register=True):
+    """Canonicalize a batch of raw numbers with column-wise string operations
+
+    Returns a DataFrame (same index as the input) with columns:
+    e164 (canonical number or None), valid, duplicate and reason.
+    Duplicates are detected within the batch and, if ``seen`` (a set of
+    E.164 numbers) is given, against it as well; unless ``register`` is
+    False, new valid numbers are added to ``seen`` so later batches are
+    checked against them.
+    """
+    raw = numbers if isinstance(numbers, pd.Series) else pd.Series(list(numbers), dtype=object)
+    cleaned = raw.astype(BATCH_STRING_DTYPE).fillna('').str.replace(PHONE_CLEAN_PATTERN.pattern, '', regex=True)
+    cleaned = cleaned.str.replace(INTERNATIONAL_PREFIX_PATTERN.pattern, '+', regex=True)
+    if config.DEFAULT_COUNTRY_CODE:
+        national = (cleaned != '') & ~cleaned.str.startswith('+')
+        cleaned = cleaned.where(~national, '+' + config.DEFAULT_COUNTRY_CODE + cleaned.str.lstrip('0'))
+
+    digit_count = cleaned.str.len() - 1
+    reasons = config.PHONE_REJECT_REASONS
+    reason = np.select(
+        [
+            (cleaned == '').to_numpy(dtype=bool),
+            (~cleaned.str.startswith('+')).to_numpy(dtype=bool),
+            (~cleaned.str.fullmatch(WELL_FORMED_PATTERN)).to_numpy(dtype=bool),
+            cleaned.str.startswith('+0').to_numpy(dtype=bool),
+            (digit_count < config.MIN_PHONE_LENGTH).to_numpy(dtype=bool),
+            (digit_count > config.MAX_PHONE_LENGTH).to_numpy(dtype=bool),
+        ],
+        [
+            reasons['empty'],
+            reasons['missing_country_code'],
+            reasons['invalid_characters'],
+            reasons['invalid_country_code'],
+            reasons['too_short'],
+            reasons['too_long'],
+        ],
+        default=''
+    )
+    valid = pd.Series(reason == '', index=raw.index)
+    e164 = cleaned.astype(object).where(valid, None)
+
+    # Hash-based duplicate detection: within the batch, then against numbers seen before
+    in_batch = valid & e164.duplicated(keep='first')
+    already_seen = pd.Series(False, index=raw.index)
+    if seen is not None:
+        candidates = valid & ~in_batch
+        already_seen[candidates] = [number in seen for number in e164[candidates]]
+        if register:
+            seen.update(e164[candidates & ~already_seen])
+    reason = np.where(in_batch, reasons['duplicate'], np.where(already_seen, reasons['already_added'], reason))
+
+    return pd.DataFrame({
+        'e164': e164,
+        'valid': valid,
+        'duplicate': in_batch | already_seen,
+        'reason': reason
+    }, index=raw.index)
@@ -0,0 +1,110 @@
+"""
+Per-sender rate limiting for WhatsApp Message Scheduler
+Each sender number gets a token bucket. The bucket halves its rate when
+Twilio answers 429 / Retry-After and climbs back to the configured rate
+once throttling stops.
+"""
+
+import asyncio
+import threading
+import time
+
+import config
+
+
+class TokenBucket:
+    """Token bucket with adaptive (AIMD) refill rate"""
+
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_throttle = float('-inf')
+        self._last_increase = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self):
+        """Take a token if one is available; otherwise return seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait (without blocking the event loop) until a send is allowed"""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def refund(self):
+        """Give back a token taken for a send that didn't go out"""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def on_throttled(self, retry_after=None):
+        """Back off after a 429: halve the rate and honour Retry-After"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Requests already in flight tend to be throttled together; back off
+            # once per burst of 429s rather than once per rejected request
+            if now - self._last_throttle >= config.RATE_LIMIT_BACKOFF_WINDOW:
+                self.rate = max(config.RATE_LIMIT_MIN_RATE, self.rate * config.RATE_LIMIT_BACKOFF)
+                self._last_throttle = now
+            self.tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def on_success(self):
+        """Step the rate back up once throttling has been quiet for a while"""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            interval = config.RATE_LIMIT_RECOVERY_INTERVAL
+            if now - self._last_throttle >= interval and now - self._last_increase >= interval:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.max_rate * config.RATE_LIMIT_RECOVERY_STEP)
+                self._last_increase = now
+
+
+class RateLimiter:
+    """Token buckets keyed by sender number"""
+
+    def __init__(self, limits=None):
+        self._limits = config.SENDER_RATE_LIMITS if limits is None else limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, sender):
+        """Return the bucket for a sender number, creating it on first use"""
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(sender)
+                if bucket is None:
+                    rate, burst = self._limits.get(sender, (config.SENDER_RATE_LIMIT, config.SENDER_BURST))
+                    bucket = self._buckets[sender] = TokenBucket(rate, burst)
+        return bucket
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds form only)"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
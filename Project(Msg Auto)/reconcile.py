@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Delivery status reconciliation for WhatsApp Message Scheduler
+Catches up on statuses whose callbacks were missed (e.g. while the webhook
+was down). Instead of fetching each SID, it lists the sender's messages in
+large pages over the date window of the unsettled jobs, matches them
+against an in-memory SID index and queues the changes on the job store,
+which commits them in batches. The next-page cursor is saved after every
+page so an interrupted run picks up where it stopped. With several sender
+numbers the whole account is listed, and each extra account in the sender
+pool is reconciled in turn with its own cursor.
+
+Usage:
+    python reconcile.py            # resume or start a reconciliation run
+    python reconcile.py --restart  # ignore any saved cursor
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+import config
+from job_store import DELIVERY_RANK, JobStore
+
+CURSOR_NAME = 'reconcile'
+
+
+def create_twilio_client(account_sid=None, auth_token=None):
+    """Twilio REST client for the configured (or given) account, honoring TWILIO_API_BASE_URL"""
+    from twilio.rest import Client
+
+    client = Client(account_sid or config.TWILIO_ACCOUNT_SID, auth_token or config.TWILIO_AUTH_TOKEN)
+    client.api.base_url = config.TWILIO_API_BASE_URL
+    return client
+
+
+class Reconciler:
+    """Bring sent/delivered jobs up to date from Twilio's message list"""
+
+    def __init__(self, client, store, from_number=None, page_size=None, cursor_name=CURSOR_NAME):
+        self.client = client
+        self.store = store
+        # A single sender narrows the listing to its messages; a pool lists every sender on the account
+        if from_number is None and len(config.TWILIO_WHATSAPP_NUMBERS) == 1:
+            from_number = config.TWILIO_WHATSAPP_NUMBERS[0]
+        self.from_number = from_number
+        self.page_size = page_size or config.RECONCILE_PAGE_SIZE
+        self.cursor_name = cursor_name
+
+    def _first_page(self, unsettled_jobs, since, until):
+        if since is None:
+            oldest = min(datetime.fromisoformat(job['scheduled_time']) for job in unsettled_jobs)
+            # Scheduled times are local; Twilio filters on UTC send dates
+            since = oldest.astimezone(timezone.utc) - timedelta(seconds=config.RECONCILE_WINDOW_MARGIN)
+        options = {'date_sent_after': since, 'page_size': self.page_size}
+        if self.from_number:
+            options['from_'] = f'whatsapp:{self.from_number}'
+        if until is not None:
+            options['date_sent_before'] = until
+        return self.client.messages.page(**options)
+
+    def run(self, since=None, until=None, resume=True, max_pages=None):
+        """Reconcile unsettled jobs; returns counts of pages, messages scanned and jobs updated
+
+        since/until bound the send dates searched (default: from shortly
+        before the oldest unsettled job until now). With resume, a cursor
+        left by an interrupted run is continued instead.
+        """
+        unsettled_jobs = self.store.unsettled_jobs()
+        summary = {'unsettled': len(unsettled_jobs), 'pages': 0, 'scanned': 0, 'updated': 0}
+        if not unsettled_jobs:
+            self.store.save_cursor(self.cursor_name, None)
+            return summary
+
+        # SID -> stored status; each listed message is a single dict lookup
+        index = {job['sid']: job['status'] for job in unsettled_jobs}
+        cursor = self.store.load_cursor(self.cursor_name) if resume else None
+        page = self.client.messages.get_page(cursor) if cursor else self._first_page(unsettled_jobs, since, until)
+
+        while page is not None:
+            for message in page:
+                summary['scanned'] += 1
+                stored = index.pop(message.sid, None)
+                if stored is None or message.status not in DELIVERY_RANK:
+                    continue
+                if DELIVERY_RANK[message.status] > DELIVERY_RANK[stored]:
+                    error = f"Twilio error: {message.error_code}" if message.error_code else None
+                    self.store.record_delivery(message.sid, message.status, error=error)
+                    summary['updated'] += 1
+            summary['pages'] += 1
+
+            next_url = page.next_page_url
+            # Every unsettled SID has been seen, so later pages can't change anything
+            if not index:
+                next_url = None
+            self.store.save_cursor(self.cursor_name, next_url)
+            if next_url is None or (max_pages and summary['pages'] >= max_pages):
+                break
+            page = self.client.messages.get_page(next_url)
+
+        self.store.flush()
+        return summary
+
+
+def reconcile_accounts(store, since=None, resume=True):
+    """Reconcile the main account, then each of TWILIO_EXTRA_ACCOUNTS; returns the combined counts"""
+    accounts = [(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN, CURSOR_NAME)]
+    accounts += [(account_sid, account['auth_token'], f"{CURSOR_NAME}:{account_sid}")
+                 for account_sid, account in config.TWILIO_EXTRA_ACCOUNTS.items()]
+    total = {}
+    for account_sid, auth_token, cursor_name in accounts:
+        reconciler = Reconciler(create_twilio_client(account_sid, auth_token), store, cursor_name=cursor_name)
+        summary = reconciler.run(since=since, resume=resume)
+        # Jobs stay unsettled until their own account is listed, so count them once
+        total['unsettled'] = total.get('unsettled', summary['unsettled'])
+        for key in ('pages', 'scanned', 'updated'):
+            total[key] = total.get(key, 0) + summary[key]
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catch up on message statuses from Twilio's message list")
+    parser.add_argument("--restart", action="store_true", help="Ignore a saved cursor and start over")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Earliest send date to search (ISO format, UTC)")
+    args = parser.parse_args(argv)
+
+    since = args.since.replace(tzinfo=timezone.utc) if args.since and args.since.tzinfo is None else args.since
+    try:
+        summary = reconcile_accounts(JobStore(), since=since, resume=not args.restart)
+    except Exception as e:
+        print(f"❌ Reconciliation stopped: {e}")
+        print("   Run again to resume from the last completed page")
+        return 1
+
+    print(f"✅ Reconciled {summary['unsettled']} unsettled message(s): "
+          f"{summary['updated']} updated from {summary['scanned']} listed over {summary['pages']} page(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
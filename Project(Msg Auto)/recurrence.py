@@ -0,0 +1,164 @@
+"""
+Recurrence rules for WhatsApp Message Scheduler
+A recurring series is stored once with its rule; only the next fire time is
+ever computed. Cron rules jump straight to the next matching month, day,
+hour and minute instead of stepping through every minute, and interval
+rules are a single division from their anchor time.
+
+Syntax:
+    m h dom mon dow           5-field cron (*, a-b, a,b, */n, a-b/n, jan, mon)
+    @hourly @daily @weekly @monthly @yearly
+    every 30m | every 2h | every 1d | every 1w
+"""
+
+import bisect
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import config
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *'
+}
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+DAY_NAMES = {name: i for i, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+INTERVAL_PATTERN = re.compile(
+    r'^every\s+(?P<count>\d+)\s*(?P<unit>m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?)$'
+)
+UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+# A rule that never matches (e.g. Feb 30) gives up after this many years
+SEARCH_YEARS = 8
+
+
+class RecurrenceError(ValueError):
+    """Raised when a recurrence rule cannot be parsed"""
+
+
+def _parse_field(text, low, high, names=None):
+    """Expand one cron field into a sorted tuple of allowed values"""
+    values = set()
+    for part in text.lower().split(','):
+        part, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if part == '*':
+                start, end = low, high
+            else:
+                first, _, last = part.partition('-')
+                start = names[first] if names and first in names else int(first)
+                end = (names[last] if names and last in names else int(last)) if last else (high if step > 1 else start)
+        except (KeyError, ValueError):
+            raise RecurrenceError(f"Invalid cron field: {text!r}") from None
+        if step < 1 or not low <= start <= end <= high:
+            raise RecurrenceError(f"Cron field {text!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return tuple(sorted(values))
+
+
+class CronRule:
+    """Standard 5-field cron expression evaluated in local time"""
+
+    def __init__(self, text):
+        self.text = text
+        fields = ALIASES.get(text, text).split()
+        if len(fields) != 5:
+            raise RecurrenceError(f"Cron expressions need 5 fields, got {len(fields)}: {text!r}")
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = frozenset(_parse_field(fields[2], 1, 31))
+        self.months = _parse_field(fields[3], 1, 12, MONTH_NAMES)
+        # Cron counts Sunday as 0 or 7; stored as Python weekdays (Monday = 0)
+        self.weekdays = frozenset((day - 1) % 7 for day in _parse_field(fields[4], 0, 7, DAY_NAMES))
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        # Like cron: with both day fields restricted, either one matching is enough
+        return day_ok or weekday_ok
+
+    def next_after(self, after):
+        """First matching minute strictly after `after`"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = moment.year + SEARCH_YEARS
+        while moment.year <= last_year:
+            if moment.month not in self.months:
+                i = bisect.bisect_right(self.months, moment.month)
+                year = moment.year + (i == len(self.months))
+                moment = datetime(year, self.months[i % len(self.months)], 1)
+                continue
+            if not self._day_matches(moment):
+                moment = datetime(moment.year, moment.month, moment.day) + timedelta(days=1)
+                continue
+            if moment.hour not in self.hours:
+                i = bisect.bisect_right(self.hours, moment.hour)
+                if i == len(self.hours):
+                    moment = datetime(moment.year, moment.month, moment.day) + timedelta(days=1)
+                else:
+                    moment = moment.replace(hour=self.hours[i], minute=0)
+                continue
+            if moment.minute not in self.minutes:
+                i = bisect.bisect_right(self.minutes, moment.minute)
+                if i == len(self.minutes):
+                    moment = moment.replace(minute=0) + timedelta(hours=1)
+                else:
+                    moment = moment.replace(minute=self.minutes[i])
+                continue
+            return moment
+        raise RecurrenceError(f"Cron expression never matches: {self.text!r}")
+
+    def first_fire(self, start):
+        """First matching minute at or after start"""
+        return self.next_after(start - timedelta(minutes=1))
+
+
+class IntervalRule:
+    """Fixed interval counted from an anchor time"""
+
+    def __init__(self, text, anchor):
+        match = INTERVAL_PATTERN.match(text)
+        if not match:
+            raise RecurrenceError(f"Invalid interval: {text!r}")
+        self.text = text
+        self.anchor = anchor
+        self.interval = timedelta(seconds=int(match.group('count')) * UNIT_SECONDS[match.group('unit')[0]])
+        if self.interval.total_seconds() < config.MIN_RECURRENCE_INTERVAL:
+            raise RecurrenceError(f"Intervals must be at least {config.MIN_RECURRENCE_INTERVAL} seconds")
+
+    def next_after(self, after):
+        """First anchor + k * interval strictly after `after`"""
+        if after < self.anchor:
+            return self.anchor
+        return self.anchor + ((after - self.anchor) // self.interval + 1) * self.interval
+
+    def first_fire(self, start):
+        return self.anchor if start <= self.anchor else self.next_after(start - timedelta(microseconds=1))
+
+
+@lru_cache(maxsize=config.RECURRENCE_CACHE_SIZE)
+def _cron_rule(text):
+    return CronRule(text)
+
+
+def parse_rule(text, anchor=None):
+    """Parse a cron expression, alias or interval; anchor is where intervals count from
+
+    Cron rules are cached by text, so series sharing a rule share one object.
+    """
+    text = ' '.join(text.strip().lower().split())
+    if text.startswith('every'):
+        if anchor is None:
+            raise RecurrenceError("Interval rules need a start time")
+        return IntervalRule(text, anchor)
+    return _cron_rule(text)
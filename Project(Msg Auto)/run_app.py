@@ -1,25 +1,66 @@
 #!/usr/bin/env python3
 """
 Quick launcher for WhatsApp Message Scheduler
+
+Usage:
+    python run_app.py                   # start the scheduler and the Streamlit app
+    python run_app.py --import-report   # show which imports slow down startup
 """
 
+import importlib.util
 import subprocess
 import sys
 import os
 
+REQUIRED_MODULES = ['streamlit', 'pandas', 'twilio', 'aiohttp']
+
 def check_dependencies():
-    """Check if all required dependencies are installed"""
-    try:
-        import streamlit
-        import pandas
-        import twilio
-        import dateutil
-        print("✅ All dependencies are available")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+    """Check if all required dependencies are installed
+    
+    Uses find_spec so nothing is imported here; the app process imports
+    them itself, so importing them in the launcher would be wasted time.
+    """
+    missing = [name for name in REQUIRED_MODULES if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
         print("Please run: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are available")
+    return True
+
+def import_time_report(module, top=15):
+    """Print how long importing `module` takes, using python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    
+    startup_us = total_us = 0
+    direct = children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Each nesting level is indented by two more spaces after the separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name, cumulative = name.strip(), int(cumulative)
+        # A package's nested imports are listed before the package itself
+        if depth == 0:
+            if name == module:
+                total_us, direct = cumulative, children
+            else:
+                startup_us += cumulative
+            children = []
+        elif depth == 1:
+            children.append((cumulative, name))
+    
+    if not total_us:
+        print(f"❌ Could not import {module}: {result.stderr.strip().splitlines()[-1:]}")
+        return
+    
+    print(f"\n⏱️  import {module}: {total_us / 1000:.1f} ms (interpreter startup: {startup_us / 1000:.1f} ms)")
+    for cumulative, name in sorted(direct, reverse=True)[:top]:
+        print(f"   {cumulative / 1000:8.1f} ms  {name}")
 
 def run_streamlit_app():
     """Run the Streamlit app"""
@@ -31,13 +72,24 @@ def run_streamlit_app():
     print("⏹️  Press Ctrl+C to stop the app")
     print("-" * 50)
     
+    # The scheduler runs in its own process so sends don't depend on the UI staying up
+    env = dict(os.environ, SCHEDULER_MODE="daemon")
+    scheduler = subprocess.Popen([sys.executable, "scheduler_daemon.py"], env=env)
+    
     try:
         # Run the Streamlit app
-        subprocess.run([sys.executable, "-m", "streamlit", "run", "streamlit_app.py"])
+        subprocess.run([sys.executable, "-m", "streamlit", "run", "streamlit_app.py"], env=env)
     except KeyboardInterrupt:
         print("\n👋 App stopped by user")
     except Exception as e:
         print(f"❌ Error running app: {e}")
+    finally:
+        scheduler.terminate()
+        scheduler.wait()
 
 if __name__ == "__main__":
-    run_streamlit_app() 
\ No newline at end of file
+    if "--import-report" in sys.argv:
+        for module in sys.argv[sys.argv.index("--import-report") + 1:] or ["run_app", "streamlit_app"]:
+            import_time_report(module)
+    else:
+        run_streamlit_app() 
\ No newline at end of file
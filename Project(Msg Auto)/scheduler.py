@@ -0,0 +1,144 @@
+"""
+Message dispatcher for WhatsApp Message Scheduler
+A single timer thread keeps pending jobs in a min-heap ordered by fire time
+and hands due jobs to a bounded worker pool
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import config
+from metrics import FIRE_LAG_SECONDS, MESSAGES_SCHEDULED, MISSED_JOBS, PENDING_JOBS, WORKERS, WORKERS_BUSY
+
+CATCH_UP_POLICIES = ('send', 'window', 'expire')
+
+
+def monotonic_deadline(scheduled_time):
+    """Convert a wall-clock datetime into a monotonic-clock deadline"""
+    delay = (scheduled_time - datetime.now()).total_seconds()
+    # Past-due jobs fire immediately instead of failing on a negative wait
+    return time.monotonic() + max(delay, 0.0)
+
+
+def plan_catch_up(jobs, now=None, policy=None, window=None, rate=None):
+    """Decide when to fire reloaded jobs; returns ([(fire_time, job)], [jobs to expire])
+
+    Jobs that are due in the future, or late by less than CATCH_UP_GRACE,
+    keep their time. Missed jobs are sent or expired according to policy
+    ('send', 'window' or 'expire'), and the ones still sent are released
+    `rate` per second from now, oldest first, so a large backlog is fed to
+    the rate-limited send engine gradually instead of all at once.
+    """
+    now = now or datetime.now()
+    policy = policy or config.CATCH_UP_POLICY
+    if policy not in CATCH_UP_POLICIES:
+        raise ValueError(f"Unknown catch-up policy {policy!r}; expected one of {', '.join(CATCH_UP_POLICIES)}")
+    window = timedelta(seconds=config.CATCH_UP_WINDOW if window is None else window)
+    rate = rate or config.CATCH_UP_RATE
+    missed_before = now - timedelta(seconds=config.CATCH_UP_GRACE)
+
+    planned, missed, expired = [], [], []
+    for job in jobs:
+        scheduled_time = job['scheduled_time']
+        if isinstance(scheduled_time, str):
+            scheduled_time = datetime.fromisoformat(scheduled_time)
+        if scheduled_time >= missed_before:
+            planned.append((scheduled_time, job))
+        elif policy == 'send' or (policy == 'window' and now - scheduled_time <= window):
+            missed.append((scheduled_time, job))
+        else:
+            expired.append(job)
+
+    missed.sort(key=lambda item: item[0])
+    planned.extend((now + timedelta(seconds=i / rate), job) for i, (_, job) in enumerate(missed))
+    if missed:
+        MISSED_JOBS.inc(len(missed), action='sent')
+    if expired:
+        MISSED_JOBS.inc(len(expired), action='expired')
+    return planned, expired
+
+
+class Dispatcher:
+    """Fire scheduled jobs from one timer thread and a fixed-size worker pool"""
+
+    def __init__(self, max_workers=None):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        self._max_workers = max_workers or config.SCHEDULER_MAX_WORKERS
+        self._pool = ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="dispatch-worker"
+        )
+        WORKERS.inc(self._max_workers)
+        self._thread = threading.Thread(target=self._run, name="dispatcher", daemon=True)
+        self._thread.start()
+
+    def schedule(self, scheduled_time, func, *args, messages=1):
+        """Queue func(*args) to run at scheduled_time (a naive local datetime)
+
+        messages is how many messages the entry sends (a batch sends many, a
+        housekeeping timer none); the scheduled and pending metrics count those.
+        """
+        entry = (monotonic_deadline(scheduled_time), next(self._sequence), func, args, messages)
+        MESSAGES_SCHEDULED.inc(messages)
+        PENDING_JOBS.inc(messages)
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            # Only wake the timer thread if the new job is now the earliest one
+            if self._heap[0] is entry:
+                self._condition.notify()
+
+    def pending_count(self):
+        """Number of jobs waiting for their fire time"""
+        with self._condition:
+            return len(self._heap)
+
+    def shutdown(self, wait=True):
+        """Stop the timer thread and the worker pool"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+            PENDING_JOBS.dec(sum(entry[4] for entry in self._heap))
+        self._thread.join()
+        self._pool.shutdown(wait=wait)
+        WORKERS.dec(self._max_workers)
+
+    @staticmethod
+    def _work(deadline, func, args):
+        """Run one job, recording how late it started and how many workers are busy"""
+        FIRE_LAG_SECONDS.observe(time.monotonic() - deadline)
+        WORKERS_BUSY.inc()
+        try:
+            func(*args)
+        finally:
+            WORKERS_BUSY.dec()
+
+    def _run(self):
+        """Timer loop: sleep until the next fire time, then dispatch due jobs"""
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap))
+
+            PENDING_JOBS.dec(sum(entry[4] for entry in due))
+            for deadline, _, func, args, _ in due:
+                self._pool.submit(self._work, deadline, func, args)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Standalone scheduler for WhatsApp Message Scheduler
+Runs outside the Streamlit process: claims jobs that the UI submits to the
+job store, fires them from its own dispatcher and writes results back, so
+sends survive UI restarts and don't compete with UI reruns for the GIL.
+
+Usage:
+    python scheduler_daemon.py
+"""
+
+import signal
+import sys
+import threading
+import time
+
+import config
+from job_store import JobStore
+from metrics import start_metrics_server
+from scheduler import Dispatcher, plan_catch_up
+from structured_logging import get_logger
+
+logger = get_logger('daemon')
+
+
+class SchedulerService:
+    """Poll the job store for submitted jobs and send them on time"""
+
+    def __init__(self, store=None, sender=None, dispatcher=None):
+        if sender is None:
+            # Imported here so the UI can use daemon_is_alive without loading aiohttp
+            from send_engine import BackgroundSender
+            sender = BackgroundSender()
+        self.store = store or JobStore()
+        self.sender = sender
+        self.dispatcher = dispatcher or Dispatcher()
+        self._stopped = threading.Event()
+
+    def _schedule(self, jobs):
+        """Queue job rows on the dispatcher, applying the catch-up policy to missed ones"""
+        planned, expired = plan_catch_up(jobs)
+        if expired:
+            self.store.expire_jobs([job['job_id'] for job in expired])
+            logger.warning("jobs_expired", extra={'count': len(expired), 'policy': config.CATCH_UP_POLICY})
+        # Jobs due at the same moment (e.g. one time-zone bucket) fire as one dispatcher entry
+        batches = {}
+        for fire_time, job in planned:
+            batches.setdefault(fire_time, []).append(job)
+        for fire_time, batch in batches.items():
+            self.dispatcher.schedule(fire_time, self._fire_batch, batch, messages=len(batch))
+
+    def _fire_batch(self, jobs):
+        """Fire every job in a batch that came due together, once each
+
+        Jobs are claimed in the store first; one another scheduler (or an
+        earlier run) already claimed is skipped.
+        """
+        claimed = self.store.begin_send([job['job_id'] for job in jobs])
+        for job in jobs:
+            if job['job_id'] in claimed:
+                self._fire(job)
+            else:
+                logger.warning("duplicate_send_skipped", extra={'job_id': job['job_id']})
+
+    def _fire(self, job):
+        """Hand a due job to the send engine and record the outcome"""
+        def record_result(future):
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, str(e)
+            if success:
+                logger.info("message_sent", extra={'job_id': job['job_id'], 'sid': result})
+                self.store.record_result(job['job_id'], 'sent', sid=result)
+            else:
+                logger.error("send_failed", extra={
+                    'job_id': job['job_id'], 'recipient': job['recipient_name'], 'error': result
+                })
+                self.store.record_result(job['job_id'], 'failed', error=result)
+
+        future = self.sender.submit(job['phone_number'], job['message_body'], job.get('priority'), job.get('campaign'))
+        future.add_done_callback(record_result)
+
+    def recover(self):
+        """Resolve every job left unfinished when this scheduler last stopped
+
+        Claimed jobs are re-queued, and those whose send time passed while
+        it was down follow CATCH_UP_POLICY. Jobs it was in the middle of
+        sending are marked failed with an unknown outcome rather than sent
+        again. Returns how many jobs were re-queued.
+        """
+        interrupted = self.store.fail_interrupted_sends()
+        if interrupted:
+            logger.warning("interrupted_sends_failed", extra={'count': interrupted})
+        jobs = self.store.scheduled_jobs()
+        self._schedule(jobs)
+        return len(jobs)
+
+    def poll_once(self):
+        """Claim newly submitted jobs and queue them; returns how many were claimed"""
+        # Recurring series only become jobs once their next occurrence is close
+        jobs = self.store.claim_pending_jobs() + self.store.claim_due_series()
+        if jobs:
+            self._schedule(jobs)
+        self.store.set_meta('daemon_heartbeat', time.time())
+        return len(jobs)
+
+    def run_forever(self):
+        """Poll until stop() is called"""
+        recovered = self.recover()
+        if recovered:
+            print(f"♻️  Re-queued {recovered} unfinished message(s)")
+        print(f"⏰ Scheduler running (job store: {self.store.path})")
+        while not self._stopped.is_set():
+            claimed = self.poll_once()
+            if claimed:
+                print(f"📥 Queued {claimed} new message(s)")
+            self._stopped.wait(config.DAEMON_POLL_INTERVAL)
+
+    def stop(self):
+        """Stop polling; pending results are flushed before returning"""
+        self._stopped.set()
+        self.dispatcher.shutdown(wait=False)
+        self.store.flush(timeout=10)
+
+
+def reconcile_missed_statuses(store):
+    """Catch up on delivery statuses reported while no webhook was listening"""
+    from reconcile import Reconciler, create_twilio_client
+    try:
+        summary = Reconciler(create_twilio_client(), store).run()
+    except Exception as e:
+        print(f"⚠️  Status reconciliation stopped: {e}")
+        return
+    if summary['updated']:
+        print(f"🔁 Reconciled {summary['updated']} message status(es)")
+
+
+def daemon_is_alive(store):
+    """True if a scheduler daemon has reported a heartbeat recently"""
+    heartbeat = store.get_meta('daemon_heartbeat')
+    return heartbeat is not None and time.time() - heartbeat < config.DAEMON_HEARTBEAT_TIMEOUT
+
+
+def main():
+    service = SchedulerService()
+    if config.METRICS_ENABLED:
+        start_metrics_server()
+        print(f"📈 Metrics on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+    stop_webhook = None
+    if config.STATUS_CALLBACK_URL:
+        # Delivery callbacks land in the same job store, batched by its writer thread
+        from webhook_server import start_in_thread
+        webhook_url, stop_webhook = start_in_thread(service.store)
+        print(f"📬 Status webhook listening on {webhook_url}{config.WEBHOOK_PATH}")
+        threading.Thread(target=reconcile_missed_statuses, args=(service.store,), daemon=True).start()
+
+    def handle_signal(signum, frame):
+        print("\n👋 Scheduler stopping...")
+        service.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    service.run_forever()
+    if stop_webhook is not None:
+        stop_webhook()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
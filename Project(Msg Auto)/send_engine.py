@@ -0,0 +1,235 @@
+"""
+Asynchronous send engine for WhatsApp Message Scheduler
+Posts messages to the Twilio Messages API concurrently over a pooled,
+keep-alive aiohttp session instead of one blocking request at a time.
+Messages take turns through priority lanes (see fair_queue.py), and
+requests go through the account's and sender's circuit breakers, so an
+auth failure or outage stops the traffic instead of failing every message
+with its own request. One engine sends from one number; send_messages and
+BackgroundSender spread messages over the sender pool (see sender_pool.py).
+"""
+
+import asyncio
+import base64
+import threading
+import time
+
+import aiohttp
+from twilio.base.exceptions import TwilioRestException
+
+import config
+from circuit_breaker import CircuitBreakers
+from fair_queue import FairQueue
+from metrics import MESSAGES_FAILED, MESSAGES_SENT, SEND_SLOTS, SENDS_IN_FLIGHT, TWILIO_REQUEST_SECONDS
+from rate_limiter import RateLimiter, parse_retry_after
+from structured_logging import get_logger, redact_phone
+from twilio_errors import describe_twilio_error, error_class
+
+logger = get_logger('send_engine')
+
+
+class SenderBlocked(Exception):
+    """Raised by SendEngine.send(reroute=True) when a circuit holds the message back"""
+
+    def __init__(self, breaker):
+        super().__init__(breaker.describe())
+        self.breaker = breaker
+
+
+def basic_auth_header(username, password):
+    """HTTP Basic Authorization header value"""
+    credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return f"Basic {credentials}"
+
+
+class SendEngine:
+    """Concurrent Messages API client with a bounded connection pool"""
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None,
+                 concurrency=None, base_url=None, rate_limiter=None, status_callback=None, breakers=None,
+                 priority_weights=None):
+        self.account_sid = account_sid or config.TWILIO_ACCOUNT_SID
+        self.auth_token = auth_token or config.TWILIO_AUTH_TOKEN
+        self.from_number = from_number or config.TWILIO_WHATSAPP_NUMBER
+        self.concurrency = concurrency or config.SEND_CONCURRENCY
+        base_url = (base_url or config.TWILIO_API_BASE_URL).rstrip('/')
+        self.messages_url = f"{base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.breakers = breakers or CircuitBreakers()
+        self.lanes = FairQueue(self._take_capacity, self._give_back_capacity, priority_weights,
+                               blocked=lambda: not self.breakers.accepting(self.account_sid, self.from_number))
+        # Twilio posts delivered/read/undelivered updates here (see webhook_server.py)
+        self.status_callback = status_callback or config.STATUS_CALLBACK_URL
+        self._session = None
+        self._semaphore = None
+
+    async def start(self):
+        """Open the pooled HTTP session"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                keepalive_timeout=config.SEND_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Authorization': basic_auth_header(self.account_sid, self.auth_token)},
+                timeout=aiohttp.ClientTimeout(total=config.SEND_TIMEOUT)
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self.lanes.start()
+            SEND_SLOTS.inc(self.concurrency)
+
+    async def close(self):
+        """Close the HTTP session and its pooled connections"""
+        if self._session is not None:
+            await self.lanes.stop()
+            await self._session.close()
+            self._session = None
+            SEND_SLOTS.dec(self.concurrency)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _take_capacity(self):
+        """Wait for a rate-limit token and a connection slot"""
+        # Pace against the sender's limit before taking a connection slot; the
+        # semaphore keeps waiting requests from burning their timeout behind the pool
+        await self.rate_limiter.bucket(self.from_number).acquire()
+        await self._semaphore.acquire()
+
+    def _give_back_capacity(self):
+        self._semaphore.release()
+
+    async def send(self, to_number, body, priority=None, campaign=None, reroute=False):
+        """Send one message; returns (success, SID or error description)
+
+        The message waits in its priority lane, taking turns with other
+        campaigns, before it goes out. With reroute, a message an open
+        circuit holds back raises SenderBlocked so it can go from another
+        number, instead of waiting or failing here.
+        """
+        form = {
+            'From': f'whatsapp:{self.from_number}',
+            'To': f'whatsapp:{to_number}',
+            'Body': body
+        }
+        if self.status_callback:
+            form['StatusCallback'] = self.status_callback
+        bucket = self.rate_limiter.bucket(self.from_number)
+        park_until = time.monotonic() + config.BREAKER_PARK_TIMEOUT
+        attempt = 0
+        admitted = False
+        try:
+            while True:
+                # A turn comes with a rate-limit token and a connection slot, unless a circuit is holding messages back
+                if await self.lanes.wait_turn(priority, campaign):
+                    try:
+                        # Checked once it's this message's turn, so messages queued before a circuit opened don't go out
+                        blocked = self.breakers.admit(self.account_sid, self.from_number)
+                        if blocked is None:
+                            admitted = True
+                            SENDS_IN_FLIGHT.inc()
+                            started = time.perf_counter()
+                            try:
+                                async with self._session.post(self.messages_url, data=form) as response:
+                                    payload = await response.json(content_type=None)
+                                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                                    status = response.status
+                            finally:
+                                TWILIO_REQUEST_SECONDS.observe(time.perf_counter() - started)
+                                SENDS_IN_FLIGHT.dec()
+                        else:
+                            # Nothing went out, so the next message gets the token
+                            bucket.refund()
+                    finally:
+                        self._give_back_capacity()
+                else:
+                    blocked = self.breakers.blocking(self.account_sid, self.from_number)
+                    if blocked is None:
+                        # The circuit let traffic through again while the turn was handed out
+                        continue
+
+                if blocked is not None:
+                    if reroute:
+                        raise SenderBlocked(blocked)
+                    # Configuration errors won't clear by themselves; an outage is waited out for a while
+                    wait = blocked.retry_in()
+                    if blocked.fatal or time.monotonic() + wait > park_until:
+                        MESSAGES_FAILED.inc(error_class='circuit_open')
+                        return False, blocked.describe()
+                    await asyncio.sleep(wait)
+                    continue
+                if status == 429 and attempt < config.SEND_MAX_RETRIES:
+                    # Throttled: slow this sender down and try again once paced
+                    attempt += 1
+                    logger.warning("send_throttled", extra={
+                        'to': redact_phone(to_number), 'attempt': attempt, 'retry_after': retry_after
+                    })
+                    bucket.on_throttled(retry_after)
+                    self.breakers.record(self.account_sid, self.from_number)
+                    admitted = False
+                    continue
+                if status >= 400:
+                    if status == 429:
+                        bucket.on_throttled(retry_after)
+                    raise TwilioRestException(
+                        status,
+                        self.messages_url,
+                        msg=f"Unable to create record: {payload.get('message', 'HTTP error')}",
+                        code=payload.get('code'),
+                        method='POST'
+                    )
+                bucket.on_success()
+                self.breakers.record(self.account_sid, self.from_number)
+                MESSAGES_SENT.inc()
+                return True, payload['sid']
+        except SenderBlocked:
+            raise
+        except Exception as e:
+            failure_class = error_class(e)
+            description = describe_twilio_error(e)
+            if admitted:
+                self.breakers.record(self.account_sid, self.from_number, failure_class, description)
+            MESSAGES_FAILED.inc(error_class=failure_class)
+            return False, description
+
+    async def send_many(self, messages, priority=None, campaign=None):
+        """Send (to_number, body) pairs concurrently; results keep input order"""
+        return await asyncio.gather(*(self.send(to_number, body, priority, campaign) for to_number, body in messages))
+
+
+def send_messages(messages, **pool_options):
+    """Synchronously send a batch of (to_number, body) pairs over the sender pool and return their results"""
+    from sender_pool import SenderPool
+
+    async def run():
+        async with SenderPool(**pool_options) as pool:
+            return await pool.send_many(messages)
+    return asyncio.run(run())
+
+
+class BackgroundSender:
+    """Run the sender pool on a dedicated event loop thread for synchronous callers"""
+
+    def __init__(self, **pool_options):
+        from sender_pool import SenderPool
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="send-engine", daemon=True)
+        self._thread.start()
+        self.engine = SenderPool(**pool_options)
+        asyncio.run_coroutine_threadsafe(self.engine.start(), self._loop).result()
+
+    def submit(self, to_number, body, priority=None, campaign=None):
+        """Start sending a message; returns a concurrent.futures.Future of (success, result)"""
+        return asyncio.run_coroutine_threadsafe(self.engine.send(to_number, body, priority, campaign), self._loop)
+
+    def close(self):
+        """Close the engine and stop the event loop thread"""
+        asyncio.run_coroutine_threadsafe(self.engine.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,150 @@
+"""
+Sender number pool for WhatsApp Message Scheduler
+Spreads sends over several WhatsApp sender numbers, optionally on more than
+one Twilio account, each with its own SendEngine and rate-limit bucket, so
+throughput grows with the number of senders. Each recipient's sender is
+picked by weighted rendezvous hashing of the recipient against the
+configured numbers, so every process (app, daemon, CLI) and every restart
+picks the same number and the conversation stays on it, while recipients
+spread over the numbers in proportion to their rate limits. A recipient
+only moves when their number's circuit (or its account's circuit) is open,
+or when its backlog is over SENDER_OVERLOAD_SECONDS; messages an open
+circuit holds back are sent from another number instead of waiting for it.
+"""
+
+import asyncio
+import hashlib
+import math
+
+import config
+from circuit_breaker import CircuitBreakers
+from metrics import SENDER_MESSAGES
+from rate_limiter import RateLimiter
+from send_engine import SendEngine, SenderBlocked
+
+
+def configured_senders(account_sid=None, auth_token=None, from_number=None):
+    """(account SID, auth token, number) for each sender to use
+
+    An explicit from_number pins a single sender. Otherwise every number in
+    TWILIO_WHATSAPP_NUMBERS is used on the given (or configured) account,
+    plus the numbers of TWILIO_EXTRA_ACCOUNTS unless an account was given.
+    """
+    account_sid = account_sid or config.TWILIO_ACCOUNT_SID
+    auth_token = auth_token or config.TWILIO_AUTH_TOKEN
+    if from_number:
+        return [(account_sid, auth_token, from_number)]
+    senders = [(account_sid, auth_token, number) for number in config.TWILIO_WHATSAPP_NUMBERS]
+    if account_sid == config.TWILIO_ACCOUNT_SID:
+        for extra_sid, account in config.TWILIO_EXTRA_ACCOUNTS.items():
+            senders += [(extra_sid, account['auth_token'], number) for number in account['numbers']]
+    return senders
+
+
+def affinity(to_number, sender, weight=1.0):
+    """Weighted rendezvous score of a recipient for a sender; the highest-scoring sender is preferred
+
+    The score depends only on the two numbers and the weight, so it is the
+    same in every process, and a sender gets a share of recipients
+    proportional to its weight.
+    """
+    digest = hashlib.blake2b(f"{to_number}|{sender}".encode(), digest_size=8).digest()
+    # Uniform in (0, 1) from the hash, turned into an exponential draw scaled by the weight
+    uniform = (int.from_bytes(digest, 'big') + 0.5) / 2 ** 64
+    return weight / -math.log(uniform)
+
+
+class SenderPool:
+    """Route each message to one of several sender numbers"""
+
+    def __init__(self, senders=None, account_sid=None, auth_token=None, from_number=None,
+                 rate_limiter=None, breakers=None, overload_seconds=None, **engine_options):
+        senders = senders or configured_senders(account_sid, auth_token, from_number)
+        if not senders:
+            raise ValueError("No WhatsApp sender numbers configured")
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.breakers = breakers or CircuitBreakers()
+        # Engines share the rate limiter and breakers, so a number or account is tracked once
+        self.engines = {}
+        for sid, token, number in senders:
+            if number not in self.engines:
+                self.engines[number] = SendEngine(account_sid=sid, auth_token=token, from_number=number,
+                                                  rate_limiter=self.rate_limiter, breakers=self.breakers,
+                                                  **engine_options)
+        self.overload_seconds = config.SENDER_OVERLOAD_SECONDS if overload_seconds is None else overload_seconds
+        # Configured (not current adaptive) rates, so every process ranks senders the same way
+        self._weights = {number: self.rate_limiter.bucket(number).max_rate for number in self.engines}
+        # Messages queued or in flight on each sender
+        self._outstanding = dict.fromkeys(self.engines, 0)
+
+    @property
+    def numbers(self):
+        """Sender numbers in the pool"""
+        return list(self.engines)
+
+    async def start(self):
+        """Open every sender's HTTP session"""
+        for engine in self.engines.values():
+            await engine.start()
+
+    async def close(self):
+        """Close every sender's HTTP session"""
+        for engine in self.engines.values():
+            await engine.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _accepting(self, number):
+        return self.breakers.accepting(self.engines[number].account_sid, number)
+
+    def _load(self, number):
+        """Seconds to clear this sender's backlog plus one more message at its current (adaptive) rate"""
+        return (self._outstanding[number] + 1) / self.rate_limiter.bucket(number).rate
+
+    def choose(self, to_number, exclude=()):
+        """Sender number for a message to to_number, skipping the numbers in exclude
+
+        The recipient's highest-ranked sender, unless its circuit is open or
+        it is overloaded; then the next one down the recipient's ranking.
+        When nothing is healthy the top-ranked sender is kept, since moving
+        won't help. If every healthy sender is overloaded, the least loaded
+        one is used. Returns None when every sender is excluded.
+        """
+        ranked = sorted((number for number in self.engines if number not in exclude),
+                        key=lambda number: -affinity(to_number, number, self._weights[number]))
+        if not ranked:
+            return None
+        healthy = [number for number in ranked if self._accepting(number)]
+        if not healthy:
+            return ranked[0]
+        for number in healthy:
+            if self._load(number) <= self.overload_seconds:
+                return number
+        return min(healthy, key=self._load)
+
+    async def send(self, to_number, body, priority=None, campaign=None):
+        """Send one message from the recipient's sender; returns (success, SID or error description)"""
+        tried = set()
+        while True:
+            number = self.choose(to_number, exclude=tried)
+            tried.add(number)
+            self._outstanding[number] += 1
+            try:
+                # The last untried sender waits out or fails a held-back message as a lone engine would
+                result = await self.engines[number].send(to_number, body, priority, campaign,
+                                                         reroute=len(tried) < len(self.engines))
+            except SenderBlocked:
+                continue
+            finally:
+                self._outstanding[number] -= 1
+            SENDER_MESSAGES.inc(sender=number)
+            return result
+
+    async def send_many(self, messages, priority=None, campaign=None):
+        """Send (to_number, body) pairs concurrently; results keep input order"""
+        return await asyncio.gather(*(self.send(to_number, body, priority, campaign) for to_number, body in messages))
@@ -49,66 +49,8 @@ TWILIO_WHATSAPP_NUMBER={whatsapp_number}
             f.write(env_content)
         print("✅ Created .env file with your credentials")
         
-        # Update config.py to use environment variables
-        config_content = '''import os
-from datetime import datetime
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Twilio Configuration
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')
-
-# App Configuration
-APP_TITLE = "WhatsApp Message Scheduler"
-APP_ICON = "📱"
-PAGE_LAYOUT = "wide"
-
-# Validation Settings
-MIN_PHONE_LENGTH = 10
-MAX_PHONE_LENGTH = 15
-MIN_MESSAGE_LENGTH = 1
-MAX_MESSAGE_LENGTH = 1000
-
-# UI Settings
-MAX_RECIPIENTS_DISPLAY = 50
-MESSAGE_PREVIEW_LENGTH = 50
-STATUS_UPDATE_INTERVAL = 5  # seconds
-
-# Message Templates
-DEFAULT_MESSAGE_TEMPLATE = "Hi {name}, {custom_message}"
-ERROR_MESSAGES = {
-    'invalid_phone': 'Please enter a valid phone number (e.g., +91XXXXXXXXXX)',
-    'invalid_datetime': 'Invalid date or time format',
-    'past_datetime': 'Scheduled time must be in the future',
-    'empty_fields': 'Please fill in all fields',
-    'no_recipients': 'Add recipients first to schedule messages',
-    'twilio_error': 'Failed to send message. Check your Twilio credentials.'
-}
-
-# Status Messages
-STATUS_MESSAGES = {
-    'pending': 'Pending',
-    'sent': 'Sent',
-    'failed': 'Failed'
-}
-
-# CSS Classes
-CSS_CLASSES = {
-    'main_header': 'main-header',
-    'status_success': 'status-success',
-    'status_error': 'status-error',
-    'status_pending': 'status-pending',
-    'recipient_card': 'recipient-card'
-}
-'''
-        
-        with open('config.py', 'w', encoding='utf-8') as f:
-            f.write(config_content)
-        print("✅ Updated config.py to use environment variables")
+        # config.py already reads these values from the environment via
+        # load_dotenv(), so it no longer needs to be rewritten here
         
         print("\n📝 Next Steps:")
         print("1. Run: python test_twilio_credentials.py")
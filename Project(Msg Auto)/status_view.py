@@ -0,0 +1,113 @@
+"""
+Incremental status view for WhatsApp Message Scheduler
+Keeps one page of the status table in memory and refreshes it from the job
+store's change version: an unchanged version costs a single lookup, and a
+changed one re-fetches only the rows written since the last refresh unless
+the page itself has to be re-queried.
+"""
+
+import queue
+
+import config
+
+
+def drain_results(results_queue):
+    """Yield every (job_id, status, result) posted to results_queue so far, without waiting"""
+    while True:
+        try:
+            yield results_queue.get_nowait()
+        except queue.Empty:
+            return
+
+
+def apply_results(message_index, results):
+    """Apply (job_id, status, result) tuples to the session's messages by job ID
+
+    Results for job IDs not in message_index (another session's messages,
+    or ones cleared since) are ignored. Returns the number applied.
+    """
+    applied = 0
+    for job_id, status, result in results:
+        msg = message_index.get(job_id)
+        if msg is not None:
+            msg['status'] = status
+            msg['result'] = result
+            applied += 1
+    return applied
+
+
+def apply_store_changes(message_index, rows):
+    """Apply finished job store rows to the session's messages by job ID; returns the number applied"""
+    return apply_results(message_index, (
+        (row['job_id'], row['status'],
+         row['error'] if row['status'] in config.STATUS_FILTERS['Failed'] else row['sid'])
+        for row in rows if row['status'] not in config.STATUS_FILTERS['Pending']
+    ))
+
+
+def _matches(row, statuses, search):
+    """Python mirror of the job store's status/recipient filter"""
+    if statuses and row['status'] not in statuses:
+        return False
+    if search:
+        needle = search.lower()
+        return needle in row['recipient_name'].lower() or needle in row['phone_number'].lower()
+    return True
+
+
+class StatusView:
+    """One cached page of the status table plus its counters"""
+
+    def __init__(self, store, page_size=None):
+        self.store = store
+        self.page_size = page_size or config.MAX_RECIPIENTS_DISPLAY
+        self.key = None
+        self.version = None
+        self.rows = []
+        self.matching = 0
+        self.counts = {}
+
+    def _reload(self, statuses, search, page):
+        self.counts = self.store.status_counts()
+        self.matching = self.store.count_jobs(statuses, search)
+        self.rows = self.store.page_jobs(statuses, search, limit=self.page_size,
+                                         offset=(page - 1) * self.page_size)
+
+    def refresh(self, statuses=None, search=None, page=1):
+        """Bring the cached page up to date; returns True if anything changed"""
+        key = (statuses, search, page)
+        version = self.store.current_version()
+        if key == self.key and version == self.version:
+            return False
+
+        if key != self.key or self.version is None:
+            self._reload(statuses, search, page)
+        else:
+            changed, _ = self.store.changes_since(self.version)
+            total = sum(self.counts.values())
+            self.counts = self.store.status_counts()
+            matching = self.store.count_jobs(statuses, search)
+            on_page = {row['job_id']: i for i, row in enumerate(self.rows)}
+
+            # Rows only move between pages when jobs are added, removed or (with a
+            # status filter) change status; anything else is patched in place
+            refetch = matching != self.matching or sum(self.counts.values()) < total
+            for row in changed:
+                if refetch:
+                    break
+                if row['job_id'] in on_page:
+                    refetch = not _matches(row, statuses, search)
+                elif _matches(row, statuses, search):
+                    refetch = bool(statuses) or row['created_at'] == row['updated_at']
+
+            if refetch:
+                self._reload(statuses, search, page)
+            else:
+                for row in changed:
+                    if row['job_id'] in on_page:
+                        self.rows[on_page[row['job_id']]] = row
+            self.matching = matching
+
+        self.key = key
+        self.version = version
+        return True
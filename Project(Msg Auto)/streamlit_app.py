@@ -1,12 +1,19 @@
 import streamlit as st
-import pandas as pd
-from twilio.rest import Client
 from datetime import datetime, timedelta
-import time
-import threading
-from dateutil import parser
-import re
+import uuid
+import queue
 import config
+from scheduler import Dispatcher, plan_catch_up
+from job_store import JOB_COLUMNS, JobStore, idempotency_key
+from scheduler_daemon import daemon_is_alive
+from metrics import start_metrics_server
+from status_view import StatusView, apply_results, apply_store_changes, drain_results
+from structured_logging import get_logger
+from message_templates import TemplateError, compile_template, find_missing_fields, render_batch
+from recurrence import RecurrenceError
+from timezones import TimezoneError, bucket_send_times, describe_offset, get_zone, recipient_zone
+
+logger = get_logger('app')
 
 # Page configuration
 st.set_page_config(
@@ -59,20 +66,96 @@ if 'show_success' not in st.session_state:
     st.session_state.show_success = False
 if 'success_message' not in st.session_state:
     st.session_state.success_message = ""
+if 'recipient_numbers' not in st.session_state:
+    # Hash index of added numbers for O(1) duplicate checks
+    st.session_state.recipient_numbers = set()
+if 'message_index' not in st.session_state:
+    st.session_state.message_index = {}
+if 'results_queue' not in st.session_state:
+    st.session_state.results_queue = queue.Queue()
+
+# pandas, Twilio, aiohttp and pyarrow are imported on first use so the first page renders without them
+@st.cache_resource
+def get_job_store():
+    """Shared SQLite job store for scheduled messages"""
+    return JobStore()
+
+@st.cache_resource
+def get_sender():
+    """Shared asyncio send engine over the sender pool, with pooled keep-alive connections"""
+    from send_engine import BackgroundSender
+    return BackgroundSender()
+
+@st.cache_resource
+def start_status_webhook():
+    """Receive delivery status callbacks in this process (daemon mode runs its own)"""
+    from webhook_server import start_in_thread
+    return start_in_thread(get_job_store())
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve this process's send metrics for Prometheus (daemon mode serves them from the daemon)"""
+    try:
+        return start_metrics_server()
+    except OSError as e:
+        logger.warning("metrics_endpoint_failed", extra={'port': config.METRICS_PORT, 'error': str(e)})
+        return None
+
+@st.cache_resource
+def get_dispatcher():
+    """Shared dispatcher that fires scheduled messages for every session"""
+    return Dispatcher()
+
+def queue_stored_jobs(jobs):
+    """Queue job store rows on the dispatcher; missed ones follow CATCH_UP_POLICY"""
+    planned, expired = plan_catch_up(jobs)
+    if expired:
+        get_job_store().expire_jobs([job['job_id'] for job in expired])
+        logger.warning("jobs_expired", extra={'count': len(expired), 'policy': config.CATCH_UP_POLICY})
+    # Jobs of one campaign due at the same moment share one dispatcher entry
+    batches = {}
+    for fire_time, job in planned:
+        recipient = {"name": job['recipient_name'], "number": job['phone_number']}
+        batches.setdefault((fire_time, job.get('priority'), job.get('campaign')), []).append(
+            (job['job_id'], recipient, job['message_body'])
+        )
+    for (fire_time, priority, campaign), messages in batches.items():
+        schedule_batch(fire_time, messages, None, priority, campaign)
+    return len(planned)
 
-# Twilio configuration
 @st.cache_resource
-def get_twilio_client():
-    """Initialize Twilio client with credentials"""
-    return Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+def recover_jobs():
+    """Resolve jobs left unfinished by a previous run of this process (daemon mode recovers its own)
+
+    Jobs cut off mid-send are marked failed; the rest are re-queued.
+    """
+    interrupted = get_job_store().fail_interrupted_sends()
+    if interrupted:
+        logger.warning("interrupted_sends_failed", extra={'count': interrupted})
+    recovered = queue_stored_jobs(get_job_store().scheduled_jobs())
+    if recovered:
+        logger.info("jobs_recovered", extra={'count': recovered})
+    return recovered
+
+@st.cache_resource
+def start_series_pump():
+    """Turn due recurring series into jobs on this process's dispatcher (daemon mode does this itself)"""
+    def pump():
+        queue_stored_jobs(get_job_store().claim_due_series())
+        # One timer for all series; the next check is queued like any other job
+        get_dispatcher().schedule(datetime.now() + timedelta(seconds=config.SERIES_POLL_INTERVAL), pump, messages=0)
+    
+    pump()
+    return True
 
 def validate_phone_number(phone):
     """Validate phone number format"""
-    # Remove all non-digit characters except +
-    cleaned = re.sub(r'[^\d+]', '', phone)
-    # Check if it starts with + and has valid length
-    if cleaned.startswith('+') and config.MIN_PHONE_LENGTH <= len(cleaned) - 1 <= config.MAX_PHONE_LENGTH:
-        return True, cleaned
+    from phone_utils import normalize_phone_number
+    
+    # Canonicalize to E.164 (strips formatting, checks country code and length)
+    is_valid, result = normalize_phone_number(phone)
+    if is_valid:
+        return True, result
     return False, phone
 
 def validate_datetime(date_str, time_str):
@@ -92,122 +175,257 @@ def validate_datetime(date_str, time_str):
     except ValueError:
         return False, config.ERROR_MESSAGES['invalid_datetime']
 
-def send_whatsapp_message(recipient, message_body):
-    """Send WhatsApp message using Twilio"""
+def validate_local_times(recipients, local_time):
+    """Bucket recipients by when local_time happens for them; every bucket must still be in the future"""
     try:
-        print(f"🔍 Attempting to send message to {recipient['name']} at {recipient['number']}")
-        print(f"📝 Message: {message_body}")
-        print(f"📱 Using WhatsApp number: {config.TWILIO_WHATSAPP_NUMBER}")
-        
-        client = get_twilio_client()
-        message = client.messages.create(
-            from_=f'whatsapp:{config.TWILIO_WHATSAPP_NUMBER}',
-            body=message_body,
-            to=f"whatsapp:{recipient['number']}"
-        )
-        
-        print(f"✅ Message sent successfully! SID: {message.sid}")
-        return True, message.sid
-        
-    except Exception as e:
-        error_msg = str(e)
-        print(f"❌ Error sending message: {error_msg}")
-        
-        if "Authenticate" in error_msg or "20003" in error_msg:
-            return False, "Twilio authentication failed. Please check your Account SID and Auth Token."
-        elif "not found" in error_msg.lower():
-            return False, "Twilio WhatsApp number not found. Please verify your WhatsApp number configuration."
-        elif "not authorized" in error_msg.lower():
-            return False, "Not authorized to send WhatsApp messages. Check your Twilio account permissions."
-        else:
-            return False, f"Twilio error: {error_msg}"
+        buckets = bucket_send_times(recipients, local_time)
+    except TimezoneError as e:
+        return False, str(e)
+    buffer_time = datetime.now() + timedelta(minutes=1)
+    passed = sum(len(positions) for fire_time, positions in buckets.items() if fire_time <= buffer_time)
+    if passed:
+        return False, config.ERROR_MESSAGES['local_time_passed'].format(count=passed)
+    return True, buckets
+
+def valid_timezone(name):
+    """Whether name is a time zone in the tz database"""
+    try:
+        get_zone(name)
+        return True
+    except TimezoneError:
+        return False
 
 def check_message_results():
-    """Check for message results from background threads"""
-    import json
-    import os
-    import glob
+    """Apply results posted by worker threads since the last rerun"""
+    if config.SCHEDULER_MODE == 'daemon':
+        # The scheduler daemon reports through the job store; fetch only rows changed since the last rerun
+        rows, st.session_state.store_version = get_job_store().changes_since(st.session_state.store_version)
+        apply_store_changes(st.session_state.message_index, rows)
+        return
     
-    # Check for result files
-    result_files = glob.glob('message_result_*.json')
-    error_files = glob.glob('message_error_*.json')
+    # Drain everything queued so far in one pass; cost depends only on new results
+    apply_results(st.session_state.message_index, drain_results(st.session_state.results_queue))
+
+def build_status_table(rows):
+    """Display table for one page of job store rows"""
+    import pandas as pd
     
-    for file_path in result_files + error_files:
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            
-            # Update session state if we find a matching message
-            for msg in st.session_state.scheduled_messages:
-                if (msg['recipient']['name'] == data['recipient_name'] and 
-                    msg['scheduled_time'].isoformat() == data['scheduled_time']):
-                    msg['status'] = data['status']
-                    msg['result'] = data['result']
-                    break
-            
-            # Remove the file after processing
-            os.remove(file_path)
-            
-        except Exception as e:
-            # If there's an error reading the file, just continue
-            continue
+    jobs = pd.DataFrame(rows, columns=JOB_COLUMNS)
+    scheduled = pd.to_datetime(jobs['scheduled_time'])
+    remaining = (scheduled - datetime.now()).dt.total_seconds()
+    waiting = jobs['status'].isin(config.STATUS_FILTERS['Pending'])
+    
+    status = jobs['status'].map(config.STATUS_LABELS).fillna(jobs['status'])
+    overdue = waiting & (remaining <= 0)
+    status = status.mask(overdue, '⏳ Sending...')
+    
+    remaining = remaining.clip(lower=0)
+    countdown = ('⏰ ' + (remaining // 3600).astype(int).astype(str) + 'h '
+                 + ((remaining % 3600) // 60).astype(int).astype(str) + 'm remaining')
+    failed = jobs['status'].isin(config.STATUS_FILTERS['Failed'])
+    details = jobs['sid'].where(~failed, 'Error: ' + jobs['error'].fillna(''))
+    details = details.mask(waiting, countdown).mask(overdue, '')
+    
+    return pd.DataFrame({
+        'Recipient': jobs['recipient_name'],
+        'Phone': jobs['phone_number'],
+        'Scheduled': scheduled.dt.strftime('%Y-%m-%d %H:%M'),
+        'Status': status,
+        'Details': details,
+        'Message': jobs['message_body'].str.slice(0, config.MESSAGE_PREVIEW_LENGTH)
+    })
 
-def schedule_message(recipient, scheduled_time, custom_message):
-    """Schedule a message to be sent at the specified time"""
-    def send_scheduled_message():
-        try:
-            print(f"⏰ Scheduling message for {recipient['name']} at {scheduled_time}")
-            
-            # Wait until scheduled time
-            wait_time = (scheduled_time - datetime.now()).total_seconds()
-            print(f"⏳ Waiting {wait_time} seconds...")
-            time.sleep(wait_time)
-            
-            print(f"🚀 Time to send message to {recipient['name']}!")
-            
-            # Send the message
-            message_body = config.DEFAULT_MESSAGE_TEMPLATE.format(
-                name=recipient['name'], 
-                custom_message=custom_message
-            )
-            success, result = send_whatsapp_message(recipient, message_body)
-            
-            # Store result in a file since we can't access session state from thread
-            result_data = {
-                'recipient_name': recipient['name'],
-                'scheduled_time': scheduled_time.isoformat(),
-                'status': 'sent' if success else 'failed',
-                'result': result,
-                'timestamp': datetime.now().isoformat()
-            }
+def build_repeat_rule(option, start, custom_rule=''):
+    """Recurrence rule for a repeat option, firing at start's time of day"""
+    at = f"{start.minute} {start.hour}"
+    rules = {
+        'Every day': f"{at} * * *",
+        'Every weekday': f"{at} * * 1-5",
+        'Every week': f"{at} * * {(start.weekday() + 1) % 7}",
+        'Every month': f"{at} {start.day} * *",
+        'Custom': custom_rule.strip()
+    }
+    return rules.get(option)
+
+def schedule_batch(scheduled_time, messages, results_queue, priority=None, campaign=None):
+    """Schedule messages that share a send time as one dispatcher entry
+    
+    messages is a list of (job_id, recipient, message_body). When the
+    batch fires, each message is handed to the send engine, where it waits in
+    the lane for priority taking turns with other campaigns; the worker records
+    the outcome in the job store and posts (job_id, status, result) to
+    results_queue for the session that scheduled it (None for recurring
+    occurrences, which only report through the store). A job that was
+    already claimed for sending (see JobStore.begin_send) is skipped.
+    """
+    def record_result(job_id, recipient):
+        def record(future):
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, str(e)
             
-            # Save to a temporary file
-            import json
-            with open(f'message_result_{recipient["name"]}_{scheduled_time.strftime("%Y%m%d_%H%M")}.json', 'w') as f:
-                json.dump(result_data, f)
-                
-        except Exception as e:
-            # Log error
-            error_data = {
-                'recipient_name': recipient['name'],
-                'scheduled_time': scheduled_time.isoformat(),
-                'status': 'failed',
-                'result': str(e),
-                'timestamp': datetime.now().isoformat()
-            }
-            import json
-            with open(f'message_error_{recipient["name"]}_{scheduled_time.strftime("%Y%m%d_%H%M")}.json', 'w') as f:
-                json.dump(error_data, f)
+            # Record the result in the job store since we can't access session state from thread
+            store = get_job_store()
+            if success:
+                logger.info("message_sent", extra={'job_id': job_id, 'recipient': recipient['name'], 'sid': result})
+                store.record_result(job_id, 'sent', sid=result)
+            else:
+                logger.error("send_failed", extra={'job_id': job_id, 'recipient': recipient['name'], 'error': result})
+                store.record_result(job_id, 'failed', error=result)
+            if results_queue is not None:
+                results_queue.put((job_id, 'sent' if success else 'failed', result))
+        return record
+    
+    def send_batch():
+        logger.debug("batch_fired", extra={'count': len(messages)})
+        sender = get_sender()
+        # Claimed in the store first, so a job the daemon or an earlier run already took isn't sent twice
+        claimed = get_job_store().begin_send([job_id for job_id, _, _ in messages])
+        for job_id, recipient, message_body in messages:
+            if job_id not in claimed:
+                logger.warning("duplicate_send_skipped", extra={'job_id': job_id, 'recipient': recipient['name']})
+                continue
+            # Hand the send to the async engine so the worker is free for the next due job
+            future = sender.submit(recipient['number'], message_body, priority, campaign)
+            future.add_done_callback(record_result(job_id, recipient))
+    
+    # Hand the batch to the dispatcher instead of parking a thread per message
+    logger.info("batch_scheduled", extra={
+        'count': len(messages), 'scheduled_time': scheduled_time.isoformat(), 'priority': priority, 'campaign': campaign
+    })
+    get_dispatcher().schedule(scheduled_time, send_batch, messages=len(messages))
+
+@st.fragment(run_every=config.STATUS_UPDATE_INTERVAL)
+def status_panel():
+    """Message status section; reruns on its own timer without rerunning the whole app"""
+    check_message_results()
+    
+    if 'status_view' not in st.session_state:
+        st.session_state.status_view = StatusView(get_job_store())
+    view = st.session_state.status_view
+    
+    statuses = config.STATUS_FILTERS[st.session_state.get('status_filter', 'All')]
+    search = st.session_state.get('status_search', '')
+    page = st.session_state.get('status_page', 1)
+    # An unchanged store version makes this a single lookup; otherwise only changed rows are fetched
+    changed = view.refresh(statuses, search, page)
+    if not view.counts:
+        return
+    
+    pages = max(1, -(-view.matching // view.page_size))
+    if page > pages:
+        page = st.session_state.status_page = pages
+        changed = view.refresh(statuses, search, page) or changed
+    
+    st.header("📊 Message Status")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Refresh Status", key="refresh_status"):
+            check_message_results()
+    with col2:
+        reconcile = st.button("🔁 Reconcile with Twilio", key="reconcile_status",
+                              help="Fetch final statuses for messages whose delivery callbacks were missed")
+    if reconcile:
+        from reconcile import reconcile_accounts
+        with st.spinner("Fetching message statuses from Twilio..."):
+            try:
+                summary = reconcile_accounts(get_job_store())
+            except Exception as e:
+                from twilio_errors import describe_twilio_error
+                st.error(f"❌ Reconciliation stopped: {describe_twilio_error(e)}. Run it again to resume.")
+            else:
+                st.success(f"✅ Updated {summary['updated']} of {summary['unsettled']} unsettled message(s)")
+                changed = view.refresh(statuses, search, page) or changed
+    
+    counts = view.counts
+    # One counter per status filter; 'All' is the total
+    for column, (label, filter_statuses) in zip(st.columns(len(config.STATUS_FILTERS)), config.STATUS_FILTERS.items()):
+        if filter_statuses is None:
+            column.metric("Total", sum(counts.values()))
+        else:
+            column.metric(label, sum(counts.get(s, 0) for s in filter_statuses))
     
-    # Start the scheduling thread
-    thread = threading.Thread(target=send_scheduled_message)
-    thread.daemon = True
-    thread.start()
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.selectbox("Status", list(config.STATUS_FILTERS), key="status_filter")
+    with col2:
+        st.text_input("Recipient", placeholder="Filter by name or number", key="status_search")
+    
+    # Filtering and paging happen in SQL; only one page of rows reaches the browser
+    if view.matching:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="status_page")
+        # Rebuilt only when the page changed, or once a minute for the countdowns
+        minute = datetime.now().replace(second=0, microsecond=0)
+        cached = st.session_state.get('status_table')
+        if changed or cached is None or cached[0] != minute:
+            cached = st.session_state.status_table = (minute, build_status_table(view.rows))
+        st.dataframe(cached[1], hide_index=True, use_container_width=True)
+        st.caption(f"Showing {len(view.rows)} of {view.matching} message(s)")
+    else:
+        st.info("No messages match these filters")
+    
+    # Clear completed messages
+    if st.button("🗑️ Clear Completed Messages"):
+        get_job_store().clear_finished()
+        st.session_state.scheduled_messages = [
+            msg for msg in st.session_state.scheduled_messages 
+            if msg['status'] == 'pending'
+        ]
+        st.session_state.message_index = {
+            msg['job_id']: msg for msg in st.session_state.scheduled_messages
+        }
+        st.rerun()
+
+def series_panel():
+    """Active recurring series, soonest next send first"""
+    store = get_job_store()
+    active = store.count_series()
+    if not active:
+        return
+    
+    st.header("🔁 Recurring Messages")
+    series = store.page_series(limit=config.MAX_RECIPIENTS_DISPLAY)
+    st.dataframe([
+        {
+            'Recipient': item['recipient_name'],
+            'Phone': item['phone_number'],
+            'Repeats': f"{item['rule']} ({item['timezone']})" if item['timezone'] else item['rule'],
+            'Next Send': datetime.fromisoformat(item['next_fire']).strftime('%Y-%m-%d %H:%M'),
+            'Sent So Far': item['occurrences'],
+            'Message': item['message_body'][:config.MESSAGE_PREVIEW_LENGTH]
+        }
+        for item in series
+    ], hide_index=True, use_container_width=True)
+    st.caption(f"Showing {len(series)} of {active} active series")
+    
+    labels = {
+        f"{item['recipient_name']} ({item['phone_number']}) · {item['rule']} · #{item['series_id'][:6]}": item['series_id']
+        for item in series
+    }
+    selected = st.multiselect("Select series to stop:", list(labels), key="stop_series_select")
+    if st.button("⏹️ Stop Selected Series", disabled=not selected):
+        store.cancel_series([labels[label] for label in selected])
+        st.rerun()
 
 # Main app
 def main():
     st.markdown('<h1 class="main-header">📱 WhatsApp Message Scheduler</h1>', unsafe_allow_html=True)
     
+    if 'store_version' not in st.session_state:
+        # Start from the current version so a new session doesn't replay old history
+        st.session_state.store_version = get_job_store().current_version()
+    if config.SCHEDULER_MODE == 'daemon' and not daemon_is_alive(get_job_store()):
+        st.warning(config.ERROR_MESSAGES['daemon_offline'])
+    elif config.SCHEDULER_MODE != 'daemon' and config.STATUS_CALLBACK_URL:
+        start_status_webhook()
+    if config.SCHEDULER_MODE != 'daemon' and config.METRICS_ENABLED:
+        start_metrics_endpoint()
+    if config.SCHEDULER_MODE != 'daemon':
+        recover_jobs()
+        start_series_pump()
+    
     # Check for message results from background threads
     check_message_results()
     
@@ -219,6 +437,11 @@ def main():
         with st.form("recipient_form"):
             name = st.text_input("Name", placeholder="Enter recipient name")
             phone = st.text_input("Phone Number", placeholder="+91XXXXXXXXXX")
+            timezone_name = st.text_input(
+                "Time Zone (optional)",
+                placeholder="e.g. Asia/Kolkata",
+                help="Used for local-time delivery. Left blank, it is worked out from the country code."
+            )
             custom_message = st.text_area("Custom Message", placeholder="Enter your message here...")
             
             submitted = st.form_submit_button("Add Recipient")
@@ -233,21 +456,58 @@ def main():
                     is_valid, cleaned_phone = validate_phone_number(phone)
                     if not is_valid:
                         st.error(config.ERROR_MESSAGES['invalid_phone'])
+                    elif cleaned_phone in st.session_state.recipient_numbers:
+                        st.error(config.ERROR_MESSAGES['duplicate_phone'])
+                    elif timezone_name.strip() and not valid_timezone(timezone_name.strip()):
+                        st.error(config.ERROR_MESSAGES['invalid_timezone'])
                     else:
                         recipient = {
                             "name": name,
                             "number": cleaned_phone,
                             "custom_message": custom_message
                         }
+                        if timezone_name.strip():
+                            recipient["timezone"] = timezone_name.strip()
                         st.session_state.recipients.append(recipient)
+                        st.session_state.recipient_numbers.add(cleaned_phone)
                         st.success(f"✅ Added {name}")
         
+        # Bulk import from a contact list
+        st.header("📂 Bulk Import")
+        uploaded_file = st.file_uploader(
+            "CSV or Excel file",
+            type=["csv", "xlsx"],
+            help="Columns: name, number, custom_message (optional: timezone)"
+        )
+        if uploaded_file is not None and st.button("Import Recipients"):
+            from bulk_import import import_recipients
+            try:
+                imported, rejects = import_recipients(
+                    uploaded_file,
+                    filename=uploaded_file.name,
+                    seen=st.session_state.recipient_numbers
+                )
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.session_state.recipients.extend(imported)
+                st.success(f"✅ Imported {len(imported)} recipient(s)")
+                if not rejects.empty:
+                    st.warning(f"⚠️ {len(rejects)} row(s) rejected")
+                    st.download_button(
+                        "Download Rejects Report",
+                        rejects.to_csv(index=False),
+                        file_name="recipients_rejects.csv",
+                        mime="text/csv"
+                    )
+        
         # Display current recipients count
         st.metric("Total Recipients", len(st.session_state.recipients))
         
         # Clear all recipients button
         if st.button("🗑️ Clear All Recipients"):
             st.session_state.recipients = []
+            st.session_state.recipient_numbers = set()
             st.success("✅ All recipients cleared!")
     
     # Main content area
@@ -262,6 +522,7 @@ def main():
                 st.info("No recipients added yet. Use the sidebar to add recipients.")
             else:
                 # Display recipients in a table
+                import pandas as pd
                 recipients_df = pd.DataFrame(st.session_state.recipients)
                 st.dataframe(
                     recipients_df,
@@ -287,6 +548,7 @@ def main():
                         if f"{recipient['name']} ({recipient['number']})" == selected_recipient:
                             removed_name = recipient['name']
                             st.session_state.recipients.pop(i)
+                            st.session_state.recipient_numbers.discard(recipient['number'])
                             st.success(f"✅ Removed {removed_name}")
                             break
     
@@ -348,93 +610,208 @@ def main():
                     future_time = datetime.now() + timedelta(hours=2)
                     st.session_state.selected_time = future_time.time()
             
+            # Time-critical messages (codes, alerts) go ahead of large campaigns due at the same time
+            lanes = list(config.PRIORITY_WEIGHTS)
+            priority = st.selectbox(
+                "Priority",
+                lanes,
+                index=lanes.index(config.DEFAULT_PRIORITY),
+                format_func=str.capitalize,
+                key="priority",
+                help="When several campaigns are sending at once, higher priorities get a larger share "
+                     "of the sending rate."
+            )
+            
+            # Recurring schedules repeat from the selected time
+            repeat = st.selectbox("Repeat", config.REPEAT_OPTIONS, key="repeat_option")
+            custom_rule = ''
+            if repeat == 'Custom':
+                custom_rule = st.text_input(
+                    "Repeat rule",
+                    placeholder="0 9 * * 1-5  or  every 2h",
+                    key="custom_rule",
+                    help="Cron expression (minute hour day month weekday), @daily/@weekly/@monthly, "
+                         "or an interval such as 'every 30m', 'every 2h', 'every 1d'."
+                )
+            
+            # Recipients that share a UTC offset at the selected time are sent as one batch
+            local_delivery = st.checkbox(
+                "🌍 Send at each recipient's local time",
+                key="local_time_delivery",
+                help="Each recipient gets the message at the selected time in their own time zone "
+                     "(their Time Zone, or the one for their country code)."
+            )
+            if local_delivery:
+                try:
+                    buckets = bucket_send_times(st.session_state.recipients, selected_datetime)
+                    st.caption("Send groups: " + ", ".join(
+                        f"{describe_offset(fire_time, selected_datetime)} → {fire_time.strftime('%m-%d %H:%M')} "
+                        f"({len(positions)})"
+                        for fire_time, positions in buckets.items()
+                    ))
+                except TimezoneError as e:
+                    st.caption(f"⚠️ {e}")
+            
             if selected_datetime > current_datetime:
                 st.success(f"✅ This is a future time - messages can be scheduled!")
             else:
                 st.warning(f"⚠️ This time is in the past - please select a future time")
                 st.info("💡 Tip: Use the time picker above or quick options to select a future time")
             
+            # Message template shared by every recipient in the campaign
+            message_template = st.text_area(
+                "Message Template",
+                value=config.DEFAULT_MESSAGE_TEMPLATE,
+                key="message_template",
+                help="Use {field} for any recipient column, {field|fallback} for a default, "
+                     "and {#if field}...{#else}...{/if} for optional sections."
+            )
+            try:
+                preview = compile_template(message_template).render(st.session_state.recipients[0])
+                st.caption(f"Preview: {preview[:config.MESSAGE_PREVIEW_LENGTH * 2]}")
+            except TemplateError as e:
+                st.caption(f"⚠️ {e}")
+            
             # Schedule button
             if st.button("🚀 Schedule Messages", type="primary", use_container_width=True):
+                # Groups this click's messages so the sender can take turns between campaigns
+                campaign = uuid.uuid4().hex[:12]
+                
                 # Validate scheduled time
-                is_valid, result = validate_datetime(
-                    scheduled_date.strftime("%Y-%m-%d"),
-                    scheduled_time.strftime("%H:%M")
-                )
+                send_times = None
+                if local_delivery:
+                    # The selected time is local to each recipient, so only their own send times must be ahead
+                    result = datetime.combine(scheduled_date, scheduled_time).replace(second=0, microsecond=0)
+                    is_valid, buckets = validate_local_times(st.session_state.recipients, result)
+                    if is_valid:
+                        send_times = [result] * len(st.session_state.recipients)
+                        for fire_time, positions in buckets.items():
+                            for position in positions:
+                                send_times[position] = fire_time
+                    else:
+                        result = buckets
+                else:
+                    is_valid, result = validate_datetime(
+                        scheduled_date.strftime("%Y-%m-%d"),
+                        scheduled_time.strftime("%H:%M")
+                    )
+                
+                # Validate the template against every recipient before anything is scheduled
+                missing = {}
+                if is_valid:
+                    try:
+                        missing = find_missing_fields(message_template, st.session_state.recipients)
+                    except TemplateError as e:
+                        is_valid, result = False, config.ERROR_MESSAGES['invalid_template'].format(error=e)
                 
                 if not is_valid:
                     st.error(result)
+                elif missing:
+                    st.error(config.ERROR_MESSAGES['missing_template_fields'].format(count=len(missing)))
+                    for position, fields in list(missing.items())[:config.TEMPLATE_ERRORS_DISPLAY]:
+                        st.caption(f"{st.session_state.recipients[position]['name']}: {', '.join(fields)}")
+                elif repeat != 'Does not repeat':
+                    message_bodies = render_batch(message_template, st.session_state.recipients)
+                    rule = build_repeat_rule(repeat, result, custom_rule)
+                    try:
+                        # One row per recipient's series; occurrences are created as they come due.
+                        # With local-time delivery the rule runs on each recipient's own clock (stored with
+                        # the series), so it keeps their local time of day across DST changes
+                        series = []
+                        for recipient, message_body in zip(st.session_state.recipients, message_bodies):
+                            zone = recipient_zone(recipient) if local_delivery else None
+                            series.append({
+                                # Derived from the series itself so a repeated click doesn't add it twice
+                                "series_id": idempotency_key(rule, recipient["number"], message_body, result)[:32],
+                                "recipient_name": recipient["name"],
+                                "phone_number": recipient["number"],
+                                "message_body": message_body,
+                                "rule": rule,
+                                "start_time": result,
+                                "priority": priority,
+                                "campaign": campaign,
+                                "timezone": zone.key if zone else None
+                            })
+                        first_fires = get_job_store().add_series(series)
+                    except RecurrenceError as e:
+                        st.error(config.ERROR_MESSAGES['invalid_recurrence'].format(error=e))
+                    else:
+                        if first_fires:
+                            st.success(f"🔁 {len(first_fires)} recurring message(s) created ({rule}); "
+                                       f"first send at {first_fires[0].strftime('%Y-%m-%d %H:%M')}")
+                        else:
+                            st.info("🔁 These recurring messages already exist")
                 else:
                     scheduled_datetime = result
+                    message_bodies = render_batch(message_template, st.session_state.recipients)
+                    send_times = send_times or [scheduled_datetime] * len(st.session_state.recipients)
                     
                     # Schedule messages for all recipients
-                    for recipient in st.session_state.recipients:
+                    new_messages = []
+                    for recipient, message_body, send_time in zip(st.session_state.recipients, message_bodies, send_times):
                         scheduled_msg = {
+                            "job_id": uuid.uuid4().hex,
+                            # Same campaign, recipient, body and time -> same key, so repeats are dropped
+                            "idempotency_key": idempotency_key(
+                                message_template, recipient["number"], message_body, send_time
+                            ),
                             "recipient": recipient,
-                            "scheduled_time": scheduled_datetime,
+                            "scheduled_time": send_time,
                             "custom_message": recipient["custom_message"],
+                            "message_body": message_body,
                             "status": "pending",
                             "result": None
                         }
-                        st.session_state.scheduled_messages.append(scheduled_msg)
-                        
-                        # Start scheduling thread
-                        schedule_message(recipient, scheduled_datetime, recipient["custom_message"])
+                        new_messages.append(scheduled_msg)
                     
-                    st.success(f"✅ Messages scheduled for {scheduled_datetime.strftime('%Y-%m-%d %H:%M')}")
-                    st.balloons()
-                    st.info(f"📱 {len(st.session_state.recipients)} message(s) will be sent automatically at the scheduled time!")
-    
-    # Display scheduled messages status
-    if st.session_state.scheduled_messages:
-        st.header("📊 Message Status")
-        
-        # Auto-refresh status every 5 seconds
-        if st.button("🔄 Refresh Status", key="refresh_status"):
-            check_message_results()
-        
-        for i, msg in enumerate(st.session_state.scheduled_messages):
-            with st.container():
-                col1, col2, col3 = st.columns([2, 2, 1])
-                
-                with col1:
-                    st.markdown(f"**{msg['recipient']['name']}**")
-                    st.caption(f"To: {msg['recipient']['number']}")
-                
-                with col2:
-                    st.markdown(f"**Scheduled:** {msg['scheduled_time'].strftime('%Y-%m-%d %H:%M')}")
-                    st.caption(f"Message: {msg['custom_message'][:config.MESSAGE_PREVIEW_LENGTH]}...")
-                
-                with col3:
-                    if msg['status'] == 'pending':
-                        # Calculate time remaining
-                        time_remaining = msg['scheduled_time'] - datetime.now()
-                        if time_remaining.total_seconds() > 0:
-                            hours = int(time_remaining.total_seconds() // 3600)
-                            minutes = int((time_remaining.total_seconds() % 3600) // 60)
-                            st.markdown(f'<span class="status-pending">⏳ Pending</span>', unsafe_allow_html=True)
-                            st.caption(f"⏰ {hours}h {minutes}m remaining")
+                    # Persist the whole batch in one transaction. With a scheduler daemon the
+                    # store is the hand-off; otherwise this process queues the jobs itself.
+                    use_daemon = config.SCHEDULER_MODE == 'daemon'
+                    added = get_job_store().add_jobs([
+                        {
+                            "job_id": msg["job_id"],
+                            "recipient_name": msg["recipient"]["name"],
+                            "phone_number": msg["recipient"]["number"],
+                            "message_body": msg["message_body"],
+                            "scheduled_time": msg["scheduled_time"],
+                            "idempotency_key": msg["idempotency_key"],
+                            "priority": priority,
+                            "campaign": campaign
+                        }
+                        for msg in new_messages
+                    ], status='pending' if use_daemon else 'scheduled')
+                    # Messages already scheduled by an earlier click or rerun are not queued again
+                    added_ids = {job["job_id"] for job in added}
+                    duplicates = len(new_messages) - len(added_ids)
+                    new_messages = [msg for msg in new_messages if msg["job_id"] in added_ids]
+                    
+                    batches = {}
+                    for msg in new_messages:
+                        st.session_state.scheduled_messages.append(msg)
+                        st.session_state.message_index[msg["job_id"]] = msg
+                        batches.setdefault(msg["scheduled_time"], []).append(
+                            (msg["job_id"], msg["recipient"], msg["message_body"])
+                        )
+                    
+                    # Queue each send time once with the in-process dispatcher, however many recipients share it
+                    if not use_daemon:
+                        for send_time, batch in batches.items():
+                            schedule_batch(send_time, batch, st.session_state.results_queue, priority, campaign)
+                    
+                    if new_messages:
+                        when = scheduled_datetime.strftime('%Y-%m-%d %H:%M')
+                        if local_delivery:
+                            st.success(f"✅ Messages scheduled for {when} local time ({len(batches)} time-zone group(s))")
                         else:
-                            st.markdown(f'<span class="status-pending">⏳ Sending...</span>', unsafe_allow_html=True)
-                    elif msg['status'] == 'sent':
-                        st.markdown('<span class="status-success">✅ Sent</span>', unsafe_allow_html=True)
-                        st.caption(f"SID: {msg['result']}")
-                        # Show success popup
+                            st.success(f"✅ Messages scheduled for {when}")
                         st.balloons()
-                        st.success(f"🎉 Message sent successfully to {msg['recipient']['name']}!")
-                    elif msg['status'] == 'failed':
-                        st.markdown('<span class="status-error">❌ Failed</span>', unsafe_allow_html=True)
-                        st.caption(f"Error: {msg['result']}")
-                        st.error(f"❌ Failed to send message to {msg['recipient']['name']}")
-                
-                st.divider()
-        
-        # Clear completed messages
-        if st.button("🗑️ Clear Completed Messages"):
-            st.session_state.scheduled_messages = [
-                msg for msg in st.session_state.scheduled_messages 
-                if msg['status'] == 'pending'
-            ]
+                        st.info(f"📱 {len(new_messages)} message(s) will be sent automatically at the scheduled time!")
+                    if duplicates:
+                        st.warning(config.ERROR_MESSAGES['duplicate_schedule'].format(count=duplicates))
+    
+    # Display scheduled messages status
+    status_panel()
+    series_panel()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Structured logging for WhatsApp Message Scheduler
+Log calls only build a record and put it on an unbounded SimpleQueue; one
+listener thread formats records as JSON lines and writes them, so sending
+threads never wait on the output stream. Info and debug records can be
+sampled, and phone numbers and message bodies are redacted before they
+reach a record.
+
+    logger = get_logger('send')
+    logger.info('message_sent', extra={'job_id': job_id, 'sid': sid, 'to': redact_phone(number)})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+import config
+
+LOGGER_PREFIX = 'whatsapp'
+# Fields redacted by the formatter if a caller passes them unredacted
+PHONE_FIELDS = frozenset({'to', 'phone', 'phone_number', 'number', 'from_number'})
+BODY_FIELDS = frozenset({'body', 'message', 'message_body'})
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_lock = threading.Lock()
+
+
+def redact_phone(number):
+    """Keep the country code and last 4 digits: +91******7890"""
+    if not number:
+        return number
+    number = str(number)
+    if len(number) <= 7:
+        return '*' * len(number)
+    return number[:3] + '*' * (len(number) - 7) + number[-4:]
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record and its extra fields as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key in RESERVED_ATTRS or key.startswith('_'):
+                continue
+            if key in PHONE_FIELDS:
+                value = redact_phone(value)
+            elif key in BODY_FIELDS:
+                key, value = f"{key}_length", len(value or '')
+            entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of info/debug records; warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(level=None, sample_rate=None, stream=None):
+    """Install the queue handler and start the writer thread (idempotent)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        if config.LOG_FILE and stream is None:
+            output = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
+        else:
+            output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+
+        records = queue.SimpleQueue()
+        handler = _EnqueueHandler(records)
+        handler.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+
+        root = logging.getLogger(LOGGER_PREFIX)
+        root.setLevel((level or config.LOG_LEVEL).upper())
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger(LOGGER_PREFIX)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+
+def get_logger(name):
+    """Logger under the app's namespace; configures logging on first use"""
+    configure_logging()
+    return logging.getLogger(f"{LOGGER_PREFIX}.{name}")
@@ -71,6 +71,1174 @@ def test_config():
         else:
             print(f"❌ {config_name}: MISSING")
 
+def test_dispatcher():
+    """Test heap-based dispatcher ordering and thread usage"""
+    import threading
+    import time
+    from scheduler import Dispatcher
+    
+    print("\nTesting dispatcher...")
+    dispatcher = Dispatcher(max_workers=2)
+    fired = []
+    done = threading.Event()
+    
+    def record(label):
+        fired.append(label)
+        if len(fired) == 3:
+            done.set()
+    
+    now = datetime.now()
+    threads_before = threading.active_count()
+    dispatcher.schedule(now + timedelta(seconds=0.3), record, "third")
+    dispatcher.schedule(now - timedelta(minutes=5), record, "first")  # Past-due fires immediately
+    dispatcher.schedule(now + timedelta(seconds=0.1), record, "second")
+    for i in range(1000):
+        dispatcher.schedule(now + timedelta(hours=1), record, f"later-{i}")
+    threads_after = threading.active_count()
+    
+    done.wait(timeout=5)
+    status = "✅ PASS" if fired == ["first", "second", "third"] else "❌ FAIL"
+    print(f"{status}: fire order -> {fired}")
+    
+    status = "✅ PASS" if threads_after - threads_before <= 2 else "❌ FAIL"
+    print(f"{status}: 1003 pending jobs -> {threads_after - threads_before} extra threads")
+    
+    status = "✅ PASS" if dispatcher.pending_count() == 1000 else "❌ FAIL"
+    print(f"{status}: pending jobs -> {dispatcher.pending_count()} (expected: 1000)")
+    dispatcher.shutdown(wait=False)
+
+def test_job_store():
+    """Test job store batching and change tracking"""
+    import tempfile
+    from job_store import JobStore
+    
+    print("\nTesting job store...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        scheduled_time = datetime.now() + timedelta(hours=1)
+        store.add_jobs([
+            {
+                "job_id": f"job-{i}",
+                "recipient_name": f"Recipient {i}",
+                "phone_number": "+911234567890",
+                "message_body": "Hello",
+                "scheduled_time": scheduled_time
+            }
+            for i in range(100)
+        ])
+        _, version = store.changes_since(0)
+        
+        store.record_result("job-1", "sent", sid="SM123")
+        store.record_result("job-2", "failed", error="Twilio error")
+        store.flush(timeout=5)
+        rows, new_version = store.changes_since(version)
+        
+        changed = sorted((row['job_id'], row['status'], row['attempts']) for row in rows)
+        expected = [("job-1", "sent", 1), ("job-2", "failed", 1)]
+        status = "✅ PASS" if changed == expected else "❌ FAIL"
+        print(f"{status}: changed rows -> {changed}")
+        
+        rows, _ = store.changes_since(new_version)
+        status = "✅ PASS" if not rows else "❌ FAIL"
+        print(f"{status}: no changes after latest version -> {len(rows)} row(s)")
+        
+        status = "✅ PASS" if len(store.unfinished_jobs()) == 98 else "❌ FAIL"
+        print(f"{status}: unfinished jobs -> {len(store.unfinished_jobs())} (expected: 98)")
+        
+        counts = store.status_counts()
+        status = "✅ PASS" if counts == {"pending": 98, "sent": 1, "failed": 1} else "❌ FAIL"
+        print(f"{status}: status counts -> {counts}")
+        
+        page = store.page_jobs(("pending",), "Recipient 1", limit=5, offset=5)
+        matching = store.count_jobs(("pending",), "Recipient 1")
+        status = "✅ PASS" if matching == 10 and len(page) == 5 else "❌ FAIL"
+        print(f"{status}: filtered page -> {len(page)} of {matching} (expected: 5 of 10)")
+        
+        removed = store.clear_finished()
+        status = "✅ PASS" if removed == 2 and store.count_jobs() == 98 else "❌ FAIL"
+        print(f"{status}: cleared finished jobs -> {removed}")
+        
+        # A row the database refuses mustn't take the rest of its batch with it
+        with store._connect() as conn:
+            conn.execute("CREATE TRIGGER reject_job BEFORE UPDATE ON jobs WHEN NEW.job_id = 'job-50' "
+                         "BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+        for i in range(40, 60):
+            store.record_result(f"job-{i}", "sent", sid=f"SM{i}")
+        store.flush(timeout=5)
+        sent = store.status_counts().get("sent", 0)
+        status = "✅ PASS" if sent == 19 else "❌ FAIL"
+        print(f"{status}: batch with one rejected update -> {sent} of 20 written (expected: 19)")
+
+def test_status_view():
+    """Test incremental status refresh from job store change versions"""
+    import tempfile
+    from job_store import JobStore
+    from status_view import StatusView
+    
+    print("\nTesting status view...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        jobs = [
+            {"job_id": f"job-{i:03d}", "recipient_name": f"Recipient {i}", "phone_number": "+911234567890",
+             "message_body": "Hello", "scheduled_time": datetime.now() + timedelta(minutes=i)}
+            for i in range(120)
+        ]
+        store.add_jobs(jobs)
+        view = StatusView(store, page_size=50)
+        
+        page_queries = []
+        page_jobs = store.page_jobs
+        store.page_jobs = lambda *args, **kwargs: page_queries.append(args) or page_jobs(*args, **kwargs)
+        
+        view.refresh()
+        status = "✅ PASS" if not view.refresh() and len(page_queries) == 1 else "❌ FAIL"
+        print(f"{status}: unchanged version skips the page query")
+        
+        first = view.rows[0]["job_id"]
+        store.record_result(first, "sent", sid="SM1")
+        store.flush(timeout=5)
+        changed = view.refresh()
+        status = "✅ PASS" if changed and view.rows[0]["status"] == "sent" and len(page_queries) == 1 else "❌ FAIL"
+        print(f"{status}: status update patched in place -> {view.rows[0]['status']}")
+        
+        store.add_jobs([dict(jobs[0], job_id="job-new", scheduled_time=datetime.now() + timedelta(days=1))])
+        view.refresh()
+        status = "✅ PASS" if view.rows[0]["job_id"] == "job-new" and view.counts.get("pending") == 120 else "❌ FAIL"
+        print(f"{status}: new job re-queries the page -> {view.rows[0]['job_id']}")
+
+def test_result_reconciliation():
+    """Test that worker results reach the right message through the job-ID index"""
+    import queue
+    import tempfile
+    from job_store import JobStore
+    from status_view import apply_results, apply_store_changes, drain_results
+    
+    print("\nTesting result reconciliation...")
+    # Two recipients share a name; only the job ID tells their messages apart
+    messages = [
+        {"job_id": f"job-{i}", "recipient": {"name": "Alex", "number": f"+9112345678{i:02d}"},
+         "status": "pending", "result": None}
+        for i in range(3)
+    ]
+    message_index = {msg["job_id"]: msg for msg in messages}
+    
+    results_queue = queue.Queue()
+    results_queue.put(("job-1", "sent", "SM1"))
+    results_queue.put(("job-from-another-session", "sent", "SM9"))
+    results_queue.put(("job-2", "failed", "Twilio error"))
+    applied = apply_results(message_index, drain_results(results_queue))
+    
+    actual = [(msg["status"], msg["result"]) for msg in messages]
+    expected = [("pending", None), ("sent", "SM1"), ("failed", "Twilio error")]
+    status = "✅ PASS" if actual == expected and applied == 2 else "❌ FAIL"
+    print(f"{status}: queued results -> {actual}, unknown job ignored")
+    assert actual == expected, actual
+    assert applied == 2, applied
+    assert results_queue.empty()
+    assert apply_results(message_index, drain_results(results_queue)) == 0
+    
+    # Daemon mode: finished job store rows update the session's messages; pending ones don't
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        store.add_jobs([
+            {"job_id": job_id, "recipient_name": "Alex", "phone_number": "+911234567800",
+             "message_body": "Hello", "scheduled_time": datetime.now()}
+            for job_id in ("job-0", "job-1", "job-elsewhere")
+        ])
+        store.record_result("job-0", "failed", error="Invalid number")
+        store.record_result("job-elsewhere", "sent", sid="SM7")
+        store.flush(timeout=5)
+        rows, _ = store.changes_since(0)
+        applied = apply_store_changes(message_index, rows)
+    
+    actual = [(msg["status"], msg["result"]) for msg in messages]
+    expected = [("failed", "Invalid number"), ("sent", "SM1"), ("failed", "Twilio error")]
+    status = "✅ PASS" if actual == expected and applied == 1 else "❌ FAIL"
+    print(f"{status}: job store changes -> {actual}")
+    assert actual == expected, actual
+    assert applied == 1, applied
+
+def test_idempotency():
+    """Test that repeated scheduling and repeated sends are collapsed"""
+    import sqlite3
+    import tempfile
+    import uuid
+    from job_store import JobStore, idempotency_key
+    
+    print("\nTesting idempotent scheduling...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        scheduled_time = datetime.now() + timedelta(hours=1)
+        
+        def campaign():
+            return [
+                {
+                    "job_id": uuid.uuid4().hex,
+                    "recipient_name": f"Recipient {i}",
+                    "phone_number": f"+9112345678{i:02d}",
+                    "message_body": "Hello",
+                    "scheduled_time": scheduled_time,
+                    "idempotency_key": idempotency_key("Hi {name}", f"+9112345678{i:02d}", "Hello", scheduled_time)
+                }
+                for i in range(50)
+            ]
+        
+        first = store.add_jobs(campaign())
+        second = store.add_jobs(campaign())  # double click / rerun
+        status = "✅ PASS" if len(first) == 50 and not second and store.count_jobs() == 50 else "❌ FAIL"
+        print(f"{status}: scheduled twice -> {len(first)} then {len(second)} added, {store.count_jobs()} stored")
+        
+        key = first[0]["idempotency_key"]
+        job_id = first[0]["job_id"]
+        sends = [job_id in store.begin_send([job_id]) for _ in range(3)]
+        status = "✅ PASS" if sends == [True, False, False] else "❌ FAIL"
+        print(f"{status}: send-time check -> {sends}")
+        
+        # The claim is in the database: another process, or this one after a restart, can't send it again
+        reopened = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        second_ids = [job["job_id"] for job in first[1:4]]
+        claimed = reopened.begin_send(second_ids + [job_id])
+        again = store.begin_send(second_ids)
+        status = "✅ PASS" if claimed == set(second_ids) and not again else "❌ FAIL"
+        print(f"{status}: claims shared across stores -> {len(claimed)} claimed, {len(again)} claimed twice")
+        
+        # A restart after a crash mid-send: the claimed jobs end failed, and still aren't sent
+        interrupted = reopened.fail_interrupted_sends()
+        counts = reopened.status_counts()
+        resent = reopened.begin_send(second_ids + [job_id])
+        status = "✅ PASS" if interrupted == 4 and counts.get("failed") == 4 and not resent else "❌ FAIL"
+        print(f"{status}: jobs left sending -> {interrupted} marked failed, {len(resent)} sent again")
+        assert interrupted == 4 and counts.get("failed") == 4 and "sending" not in counts, counts
+        assert not resent, resent
+        
+        other_time = idempotency_key("Hi {name}", "+911234567800", "Hello", scheduled_time + timedelta(minutes=1))
+        status = "✅ PASS" if other_time != key else "❌ FAIL"
+        print(f"{status}: a different fire time gets a different key")
+        
+        # A store created before idempotency keys existed is upgraded in place
+        old_path = os.path.join(tmp_dir, "old.db")
+        with sqlite3.connect(old_path) as conn:
+            conn.execute("CREATE TABLE jobs (job_id TEXT PRIMARY KEY, recipient_name TEXT NOT NULL, "
+                         "phone_number TEXT NOT NULL, message_body TEXT NOT NULL, scheduled_time TEXT NOT NULL, "
+                         "status TEXT NOT NULL DEFAULT 'pending', sid TEXT, error TEXT, "
+                         "attempts INTEGER NOT NULL DEFAULT 0, created_at TEXT NOT NULL, "
+                         "updated_at TEXT NOT NULL, version INTEGER NOT NULL)")
+        upgraded = JobStore(old_path)
+        added = upgraded.add_jobs(campaign()[:2]) + upgraded.add_jobs(campaign()[:2])
+        status = "✅ PASS" if len(added) == 2 else "❌ FAIL"
+        print(f"{status}: upgraded old store deduplicates -> {len(added)} added")
+
+def test_recurrence():
+    """Test cron/interval next-fire computation and lazy series materialization"""
+    import tempfile
+    import time
+    from job_store import JobStore
+    from recurrence import RecurrenceError, parse_rule
+    
+    print("\nTesting recurring schedules...")
+    start = datetime(2026, 1, 30, 18, 30)  # a Friday
+    cases = [
+        ("30 9 * * *", datetime(2026, 1, 31, 9, 30)),
+        ("0 9 * * 1-5", datetime(2026, 2, 2, 9, 0)),
+        ("*/15 * * * *", datetime(2026, 1, 30, 18, 45)),
+        ("0 0 29 2 *", datetime(2028, 2, 29, 0, 0)),
+        ("@monthly", datetime(2026, 2, 1, 0, 0)),
+        ("every 2h", datetime(2026, 1, 30, 20, 30)),
+    ]
+    for rule, expected in cases:
+        actual = parse_rule(rule, start).next_after(start)
+        status = "✅ PASS" if actual == expected else "❌ FAIL"
+        print(f"{status}: {rule} -> {actual} (expected: {expected})")
+    
+    for rule in ["61 * * * *", "every 10s", "0 0 30 2 *"]:
+        try:
+            parse_rule(rule, start).next_after(start)
+            print(f"❌ FAIL: {rule} should be rejected")
+        except RecurrenceError as e:
+            print(f"✅ PASS: {rule} rejected ({e})")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        now = datetime.now()
+        soon, later = now + timedelta(seconds=30), now + timedelta(days=2)
+        # 10,000 daily series but only 100 due inside the lookahead window
+        store.add_series([
+            {
+                "series_id": f"series-{i}",
+                "recipient_name": f"Recipient {i}",
+                "phone_number": "+911234567890",
+                "message_body": "Daily reminder",
+                "rule": "every 1d",
+                "start_time": soon if i < 100 else later
+            }
+            for i in range(10000)
+        ])
+        claim_start = time.perf_counter()
+        jobs = store.claim_due_series()
+        claim_ms = (time.perf_counter() - claim_start) * 1000
+        status = "✅ PASS" if len(jobs) == 100 and store.count_jobs() == 100 else "❌ FAIL"
+        print(f"{status}: claimed {len(jobs)} due occurrence(s) of 10000 series in {claim_ms:.1f} ms")
+        
+        next_fires = {item['next_fire'] for item in store.page_series(limit=100)}
+        expected = (soon + timedelta(days=1)).isoformat()
+        status = "✅ PASS" if next_fires == {expected} and not store.claim_due_series() else "❌ FAIL"
+        print(f"{status}: claimed series advanced to {sorted(next_fires)[:1]}")
+        
+        stopped = store.cancel_series(["series-100", "series-101"])
+        status = "✅ PASS" if stopped == 2 and store.count_series() == 9998 else "❌ FAIL"
+        print(f"{status}: stopped {stopped} series, {store.count_series()} active")
+        
+        # A local-time series keeps 09:00 New York time when daylight saving time ends (2030-11-03)
+        from timezones import get_zone, to_zone_time
+        new_york = get_zone("America/New_York")
+        store = JobStore(os.path.join(tmp_dir, "local.db"))
+        store.add_series([{
+            "series_id": "local-9am", "recipient_name": "Lee", "phone_number": "+15551234567",
+            "message_body": "Good morning", "rule": "0 9 * * *",
+            "start_time": datetime(2030, 11, 2, 9, 0), "timezone": "America/New_York"
+        }])
+        claimed = store.claim_due_series(until=datetime(2030, 11, 2, 23, 0))
+        local_times = [to_zone_time(datetime.fromisoformat(value), new_york)
+                       for value in [claimed[0]['scheduled_time'], store.page_series()[0]['next_fire']]]
+        status = "✅ PASS" if local_times == [datetime(2030, 11, 2, 9, 0), datetime(2030, 11, 3, 9, 0)] else "❌ FAIL"
+        print(f"{status}: local-time series across the DST change -> {[str(t) for t in local_times]}")
+
+def test_timezones():
+    """Test time-zone inference and one dispatcher entry per time-zone bucket"""
+    import io
+    import tempfile
+    from bulk_import import import_recipients
+    from job_store import JobStore
+    from scheduler import Dispatcher
+    from scheduler_daemon import SchedulerService
+    from timezones import bucket_send_times, describe_offset, recipient_zone
+    
+    print("\nTesting time-zone delivery...")
+    cases = [
+        ({"number": "+911234567890"}, "Asia/Kolkata"),
+        ({"number": "+18085550100"}, "Pacific/Honolulu"),
+        ({"number": "+12125550100"}, "America/New_York"),
+        ({"number": "+12125550100", "timezone": "America/Los_Angeles"}, "America/Los_Angeles"),
+    ]
+    for recipient, expected in cases:
+        zone = recipient_zone(recipient)
+        status = "✅ PASS" if str(zone) == expected else "❌ FAIL"
+        print(f"{status}: {recipient} -> {zone} (expected: {expected})")
+    
+    # 9:00 local in January: London and Lisbon share UTC+0, Berlin and Paris share UTC+1
+    local_time = datetime(2030, 1, 15, 9, 0)
+    prefixes = ["+91", "+44", "+351", "+49", "+33", "+1212", "+1808"]
+    recipients = [{"name": f"R{i}", "number": f"{prefixes[i % len(prefixes)]}55{i:06d}"} for i in range(7000)]
+    recipients.append({"name": "West", "number": "+12125559999", "timezone": "America/Los_Angeles"})
+    buckets = bucket_send_times(recipients, local_time)
+    offsets = [describe_offset(fire_time, local_time) for fire_time in buckets]
+    expected = ["UTC+05:30", "UTC+01:00", "UTC+00:00", "UTC-05:00", "UTC-08:00", "UTC-10:00"]
+    status = "✅ PASS" if offsets == expected and sum(map(len, buckets.values())) == 7001 else "❌ FAIL"
+    print(f"{status}: 7001 recipients -> {len(buckets)} bucket(s) {offsets}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        service = SchedulerService(store, sender=object(), dispatcher=Dispatcher())
+        jobs = [
+            {"job_id": f"job-{position}", "recipient_name": recipients[position]["name"],
+             "phone_number": recipients[position]["number"], "message_body": "Hello",
+             "scheduled_time": fire_time}
+            for fire_time, positions in buckets.items() for position in positions
+        ]
+        try:
+            service._schedule(jobs)
+            status = "✅ PASS" if service.dispatcher.pending_count() == len(buckets) else "❌ FAIL"
+            print(f"{status}: {len(jobs)} jobs queued as {service.dispatcher.pending_count()} dispatcher entries")
+        finally:
+            service.dispatcher.shutdown()
+    
+    source = io.StringIO("name,number,custom_message,tz\nA,+911234567890,Hi,\nB,+441234567890,Hi,Mars/Base\n")
+    imported, rejects = import_recipients(source, filename="people.csv")
+    status = "✅ PASS" if len(imported) == 1 and list(rejects["name"]) == ["B"] else "❌ FAIL"
+    print(f"{status}: unknown time zone rejected on import -> {list(rejects['reason'])}")
+
+def test_rate_limiter():
+    """Test token bucket pacing and 429 backoff"""
+    import asyncio
+    import time
+    from rate_limiter import RateLimiter
+    
+    print("\nTesting rate limiter...")
+    limiter = RateLimiter(limits={"+14155238886": (50, 5)})
+    bucket = limiter.bucket("+14155238886")
+    
+    async def acquire_all():
+        # Concurrent senders share the bucket, as they do in the send engine
+        await asyncio.gather(*(bucket.acquire() for _ in range(15)))
+    
+    start = time.monotonic()
+    asyncio.run(acquire_all())
+    elapsed = time.monotonic() - start
+    # 5 burst tokens, then 10 more at 50/s => about 0.2s
+    status = "✅ PASS" if 0.15 <= elapsed <= 0.5 else "❌ FAIL"
+    print(f"{status}: 15 sends at 50/s with burst 5 -> {elapsed:.2f}s")
+    
+    bucket.on_throttled(retry_after=0.1)
+    bucket.on_throttled()
+    status = "✅ PASS" if bucket.rate == 25 else "❌ FAIL"
+    print(f"{status}: rate after a burst of 429s -> {bucket.rate} (expected: 25)")
+    
+    status = "✅ PASS" if limiter.bucket("+14155238886") is bucket else "❌ FAIL"
+    print(f"{status}: bucket reused per sender")
+
+def test_bulk_import():
+    """Test chunked CSV import and column-wise validation"""
+    import io
+    import tempfile
+    from openpyxl import Workbook
+    from bulk_import import import_recipients, read_chunks
+    from bulk_import import main as bulk_import_main
+    
+    print("\nTesting bulk import...")
+    csv_data = io.StringIO(
+        "Name,Phone,Message\n"
+        "Asha,+91 98765 43210,Hello\n"
+        "Ben,9876543210,Hi\n"
+        ",+919876543211,Hey\n"
+        "Chen,+1 (415) 555-0100,Welcome\n"
+    )
+    recipients, rejects = import_recipients(csv_data, filename="contacts.csv", chunksize=2)
+    
+    numbers = [r['number'] for r in recipients]
+    status = "✅ PASS" if numbers == ["+919876543210", "+14155550100"] else "❌ FAIL"
+    print(f"{status}: valid numbers -> {numbers}")
+    
+    status = "✅ PASS" if len(rejects) == 2 and rejects['reason'].ne('').all() else "❌ FAIL"
+    print(f"{status}: rejected rows -> {len(rejects)} (expected: 2)")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Row numbers keep counting across the chunks of a workbook, as they do for CSV and JSONL
+        workbook_path = os.path.join(tmp_dir, "contacts.xlsx")
+        workbook = Workbook()
+        workbook.active.append(["Name", "Phone", "Message"])
+        for i in range(7):
+            workbook.active.append([f"Contact {i}", f"+91987654{i:04d}", "Hello"])
+        workbook.save(workbook_path)
+        rows = [index for chunk in read_chunks(workbook_path, chunksize=3) for index in chunk.index]
+        status = "✅ PASS" if rows == list(range(7)) else "❌ FAIL"
+        print(f"{status}: xlsx row numbers over 3 chunks -> {rows}")
+        assert rows == list(range(7)), rows
+        
+        # Nothing rejected: the report is just its header, and an empty input touches no existing file
+        header_only = os.path.join(tmp_dir, "header_only.csv")
+        empty = os.path.join(tmp_dir, "empty.jsonl")
+        kept = os.path.join(tmp_dir, "kept.csv")
+        with open(header_only, "w", encoding="utf-8") as f:
+            f.write("Name,Phone,Message\n")
+        with open(empty, "w", encoding="utf-8"):
+            pass
+        with open(kept, "w", encoding="utf-8") as f:
+            f.write("not from this run\n")
+        valid_path = os.path.join(tmp_dir, "valid.csv")
+        bulk_import_main([header_only, "--output", valid_path, "--rejects", os.path.join(tmp_dir, "rejects.csv")])
+        bulk_import_main([empty, "--output", valid_path, "--rejects", kept])
+        with open(os.path.join(tmp_dir, "rejects.csv"), encoding="utf-8") as f:
+            report = f.read().splitlines()
+        with open(kept, encoding="utf-8") as f:
+            untouched = f.read() == "not from this run\n"
+        status = "✅ PASS" if len(report) == 1 and untouched else "❌ FAIL"
+        print(f"{status}: no rejects -> header-only report {report}, existing file kept: {untouched}")
+        assert len(report) == 1 and untouched, report
+
+def test_phone_normalization():
+    """Test batch E.164 normalization and duplicate detection"""
+    from phone_utils import normalize_phone_numbers
+    
+    print("\nTesting batch phone normalization...")
+    numbers = ["+91 98765-43210", "0091 9876543210", "+1 (415) 555-0100", "+0123456789", "12345", "+14155550199"]
+    result = normalize_phone_numbers(numbers, seen={"+14155550199"})
+    
+    expected_e164 = ["+919876543210", "+919876543210", "+14155550100", None, None, "+14155550199"]
+    status = "✅ PASS" if result['e164'].tolist() == expected_e164 else "❌ FAIL"
+    print(f"{status}: canonical numbers -> {result['e164'].tolist()}")
+    
+    expected_duplicates = [False, True, False, False, False, True]
+    status = "✅ PASS" if result['duplicate'].tolist() == expected_duplicates else "❌ FAIL"
+    print(f"{status}: duplicates -> {result['duplicate'].tolist()}")
+    
+    status = "✅ PASS" if (result['reason'][~result['valid']] != '').all() else "❌ FAIL"
+    print(f"{status}: every invalid number has a reason")
+
+def test_message_templates():
+    """Test template defaults, conditionals and missing-field checks"""
+    from message_templates import compile_template, find_missing_fields, render_batch
+    
+    print("\nTesting message templates...")
+    template = "Hi {name|there}, {custom_message}{#if city} See you in {city}!{/if}"
+    recipients = [
+        {"name": "Asha", "custom_message": "welcome aboard.", "city": "Pune"},
+        {"name": "", "custom_message": "welcome aboard."},
+    ]
+    bodies = render_batch(template, recipients)
+    expected = ["Hi Asha, welcome aboard. See you in Pune!", "Hi there, welcome aboard."]
+    status = "✅ PASS" if bodies == expected else "❌ FAIL"
+    print(f"{status}: rendered batch -> {bodies}")
+    
+    missing = find_missing_fields(template, [{"name": "Ben"}])
+    status = "✅ PASS" if missing == {0: ["custom_message"]} else "❌ FAIL"
+    print(f"{status}: missing fields -> {missing}")
+    
+    status = "✅ PASS" if compile_template(template) is compile_template(template) else "❌ FAIL"
+    print(f"{status}: template parsed once and cached")
+
+def test_send_engine():
+    """Test concurrent sends against the local fake Twilio API"""
+    from fake_twilio_server import start_in_thread
+    from send_engine import send_messages
+    
+    print("\nTesting send engine against fake Twilio API...")
+    base_url, stop = start_in_thread(latency=0.05, auth_token="test-token")
+    try:
+        messages = [(f"+1555000{i:04d}", "Hello") for i in range(200)]
+        start = datetime.now()
+        results = send_messages(messages, account_sid="AC" + "0" * 32, auth_token="test-token",
+                                base_url=base_url, concurrency=50)
+        elapsed = (datetime.now() - start).total_seconds()
+        
+        sent = sum(1 for success, _ in results if success)
+        status = "✅ PASS" if sent == 200 else "❌ FAIL"
+        print(f"{status}: 200 messages -> {sent} sent in {elapsed:.2f}s")
+        
+        results = send_messages(messages[:1], account_sid="AC" + "0" * 32, auth_token="wrong-token",
+                                base_url=base_url)
+        success, error = results[0]
+        status = "✅ PASS" if not success and "authentication failed" in error else "❌ FAIL"
+        print(f"{status}: bad credentials -> {error}")
+    finally:
+        stop()
+
+def test_circuit_breaker():
+    """Test error classification and the account/sender circuit breakers"""
+    import asyncio
+    import json
+    import time
+    import urllib.request
+    from twilio.base.exceptions import TwilioRestException
+    from circuit_breaker import CircuitBreakers
+    from fake_twilio_server import start_in_thread
+    from send_engine import send_messages
+    from twilio_errors import error_class
+    
+    print("\nTesting circuit breaker...")
+    cases = [
+        (TwilioRestException(401, "uri", code=20003), "auth"),
+        (TwilioRestException(400, "uri", code=63007), "sender"),
+        (TwilioRestException(400, "uri", code=21211), "recipient"),
+        (TwilioRestException(503, "uri"), "server_error"),
+        (TwilioRestException(400, "uri", code=99999), "rejected"),
+        (asyncio.TimeoutError(), "timeout"),
+    ]
+    for error, expected in cases:
+        actual = error_class(error)
+        status = "✅ PASS" if actual == expected else "❌ FAIL"
+        print(f"{status}: HTTP {getattr(error, 'status', '-')} code {getattr(error, 'code', '-')} -> {actual}")
+    
+    breakers = CircuitBreakers(threshold=3, cooldown=0.05)
+    for _ in range(2):
+        breakers.record("AC1", "+1555", "server_error", "Twilio error: Service Unavailable")
+    closed_after_two = breakers.admit("AC1", "+1555") is None
+    breakers.record("AC1", "+1555", "server_error", "Twilio error: Service Unavailable")
+    opened = breakers.admit("AC1", "+1555") is not None
+    time.sleep(0.06)
+    probe = breakers.admit("AC1", "+1555") is None
+    second_probe = breakers.admit("AC1", "+1555") is None
+    breakers.record("AC1", "+1555")
+    status = "✅ PASS" if closed_after_two and opened and probe and not second_probe and \
+        breakers.admit("AC1", "+1555") is None else "❌ FAIL"
+    print(f"{status}: opens after 3 server errors, lets one probe through, closes on success")
+    
+    # Bad credentials: the first wave of requests fails, the rest never reach Twilio
+    base_url, stop = start_in_thread(latency=0.01, auth_token="test-token")
+    try:
+        messages = [(f"+1555000{i:04d}", "Hello") for i in range(1000)]
+        start = time.monotonic()
+        results = send_messages(messages, account_sid="AC" + "0" * 32, auth_token="wrong-token",
+                                base_url=base_url, concurrency=20)
+        elapsed = time.monotonic() - start
+        with urllib.request.urlopen(f"{base_url}/stats") as response:
+            requests_made = json.load(response)["unauthorized"]
+        fast_failed = sum(1 for success, error in results if not success and "circuit open" in error)
+        status = "✅ PASS" if requests_made <= 20 and fast_failed + requests_made == 1000 else "❌ FAIL"
+        print(f"{status}: auth failure -> {requests_made} request(s) made, {fast_failed} failed fast")
+        # Held-back messages don't take rate-limit tokens, so they aren't paced at SENDER_RATE_LIMIT
+        paced = 1000 / config.SENDER_RATE_LIMIT
+        status = "✅ PASS" if elapsed < paced / 4 else "❌ FAIL"
+        print(f"{status}: 1000 messages failed in {elapsed:.2f}s (paced through the rate limit: {paced:.1f}s)")
+        assert requests_made <= 20 and fast_failed + requests_made == 1000, (requests_made, fast_failed)
+        assert elapsed < paced / 4, elapsed
+    finally:
+        stop()
+    
+    # Outage: messages wait while the circuit is open and go out once a probe gets through
+    base_url, stop = start_in_thread(latency=0.01, outage=0.5)
+    try:
+        start = datetime.now()
+        results = send_messages(messages[:300], account_sid="AC" + "1" * 32, auth_token="test-token",
+                                base_url=base_url, concurrency=20,
+                                breakers=CircuitBreakers(threshold=5, cooldown=0.2))
+        elapsed = (datetime.now() - start).total_seconds()
+        with urllib.request.urlopen(f"{base_url}/stats") as response:
+            counts = json.load(response)
+        sent = sum(1 for success, _ in results if success)
+        # Only messages whose own request got a 503 fail; none time out waiting for the circuit
+        status = "✅ PASS" if counts["unavailable"] <= 30 and sent + counts["unavailable"] == 300 else "❌ FAIL"
+        print(f"{status}: 0.5s outage -> {counts['unavailable']} request(s) got 503, "
+              f"{sent} sent after recovery in {elapsed:.2f}s")
+    finally:
+        stop()
+
+def test_priority_lanes():
+    """Test weighted priority lanes and round-robin turns between campaigns"""
+    import asyncio
+    from fair_queue import FairQueue
+    from metrics import REGISTRY, histogram_quantile
+    
+    print("\nTesting priority lanes...")
+    
+    async def run():
+        async def acquire():
+            await asyncio.sleep(0)
+        
+        lanes = FairQueue(acquire, lambda: None, weights={"high": 6, "normal": 3, "low": 1})
+        order = []
+        
+        async def message(priority, campaign):
+            await lanes.wait_turn(priority, campaign)
+            order.append(campaign)
+        
+        # A 1000-message blast is queued first, then a small campaign and some codes
+        tasks = [asyncio.ensure_future(message("normal", "blast")) for _ in range(1000)]
+        tasks += [asyncio.ensure_future(message("normal", "reminders")) for _ in range(10)]
+        tasks += [asyncio.ensure_future(message("high", "otp")) for _ in range(10)]
+        await asyncio.sleep(0)
+        lanes.start()
+        await asyncio.gather(*tasks)
+        await lanes.stop()
+        return order
+    
+    order = asyncio.run(run())
+    last_otp = max(i for i, campaign in enumerate(order) if campaign == "otp")
+    last_reminder = max(i for i, campaign in enumerate(order) if campaign == "reminders")
+    status = "✅ PASS" if last_otp < 16 else "❌ FAIL"
+    print(f"{status}: 10 high-priority messages behind a 1000-message blast sent by turn {last_otp + 1}")
+    status = "✅ PASS" if last_reminder < 35 else "❌ FAIL"
+    print(f"{status}: small campaign interleaved with the blast, finished by turn {last_reminder + 1}")
+    
+    samples = REGISTRY.samples()
+    depth = sum(value for name, labels, value in samples if name == "whatsapp_lane_depth")
+    waited = histogram_quantile(samples, "whatsapp_lane_wait_seconds", 0.99, lane="high")
+    status = "✅ PASS" if depth == 0 and waited is not None else "❌ FAIL"
+    print(f"{status}: lane metrics -> depth {depth:.0f}, high lane wait p99 <= {waited}s")
+    
+    async def run_blocked():
+        acquired = []
+        
+        async def acquire():
+            acquired.append(1)
+        
+        # A blocked sender hands out turns without taking any capacity
+        lanes = FairQueue(acquire, lambda: None, blocked=lambda: True)
+        lanes.start()
+        turns = await asyncio.gather(*(lanes.wait_turn() for _ in range(100)))
+        await lanes.stop()
+        return turns, len(acquired)
+    
+    turns, acquired = asyncio.run(run_blocked())
+    status = "✅ PASS" if not any(turns) and acquired == 0 else "❌ FAIL"
+    print(f"{status}: blocked sender -> {len(turns)} turns granted without capacity, {acquired} acquired")
+    assert not any(turns) and acquired == 0, (turns[:5], acquired)
+
+def test_sender_pool():
+    """Test sender stickiness, load spreading and routing around a failing sender"""
+    import asyncio
+    from collections import Counter
+    from fake_twilio_server import start_in_thread
+    from sender_pool import SenderPool
+    
+    print("\nTesting sender pool...")
+    account_sid = "AC" + "0" * 32
+    numbers = ["+15005550001", "+15005550002", "+15005550003"]
+    senders = [(account_sid, "test-token", number) for number in numbers]
+    
+    pool = SenderPool(senders)
+    recipients = [f"+1555000{i:04d}" for i in range(300)]
+    first = {to: pool.choose(to) for to in recipients}
+    spread = Counter(first.values())
+    status = "✅ PASS" if all(60 <= spread[number] <= 140 for number in numbers) else "❌ FAIL"
+    print(f"{status}: 300 new recipients spread over 3 senders {sorted(spread.values())}")
+    # Another process (or this one after a restart) picks the same numbers without shared state
+    other_process = SenderPool(list(reversed(senders)))
+    status = "✅ PASS" if all(other_process.choose(to) == first[to] for to in recipients) else "❌ FAIL"
+    print(f"{status}: every recipient kept their sender in a second pool")
+    
+    # A sender with a large backlog spills its recipients to the next number in their ranking
+    busy = SenderPool(senders, overload_seconds=1)
+    busy._outstanding[numbers[2]] = 10000
+    spilled = [to for to in recipients if first[to] == numbers[2]]
+    status = "✅ PASS" if all(busy.choose(to) != numbers[2] for to in spilled) else "❌ FAIL"
+    print(f"{status}: {len(spilled)} recipients of an overloaded sender spilled over")
+    
+    # A sender configuration error opens its circuit: nobody is routed to it any more
+    pool.breakers.record(account_sid, numbers[0], "sender", "Twilio WhatsApp number not found.")
+    moved = [to for to in recipients if first[to] == numbers[0]]
+    status = "✅ PASS" if all(pool.choose(to) != numbers[0] for to in recipients) else "❌ FAIL"
+    print(f"{status}: {len(moved)} recipients moved off the failing sender")
+    
+    left = pool.choose(recipients[0], exclude=numbers)
+    status = "✅ PASS" if left is None else "❌ FAIL"
+    print(f"{status}: every sender excluded -> {left}")
+    assert left is None, left
+    
+    # End to end: one sender can't send, the others take its messages
+    base_url, stop = start_in_thread(latency=0.01, broken_senders=[numbers[1]])
+    try:
+        async def run():
+            async with SenderPool(senders, base_url=base_url, concurrency=10) as pool:
+                results = await pool.send_many([(to, "Hello") for to in recipients])
+                return results, {pool.choose(to) for to in recipients}
+        
+        results, next_senders = asyncio.run(run())
+        failed = sum(1 for success, _ in results if not success)
+        status = "✅ PASS" if failed <= 10 and numbers[1] not in next_senders else "❌ FAIL"
+        print(f"{status}: broken sender -> {len(results) - failed} sent, {failed} failed before its circuit opened")
+    finally:
+        stop()
+
+def test_scheduler_daemon():
+    """Test that the scheduler daemon claims submitted jobs and records results"""
+    import tempfile
+    import time
+    from fake_twilio_server import start_in_thread
+    from job_store import JobStore
+    from scheduler import Dispatcher
+    from scheduler_daemon import SchedulerService, daemon_is_alive
+    from send_engine import BackgroundSender
+    
+    print("\nTesting scheduler daemon...")
+    base_url, stop = start_in_thread(latency=0.01)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        sender = BackgroundSender(account_sid="AC" + "0" * 32, auth_token="test-token", base_url=base_url)
+        service = SchedulerService(store, sender, Dispatcher())
+        try:
+            store.add_jobs([
+                {"job_id": f"job-{i}", "recipient_name": f"R{i}", "phone_number": f"+1555000{i:04d}",
+                 "message_body": "Hello", "scheduled_time": datetime.now()}
+                for i in range(20)
+            ])
+            claimed = service.poll_once()
+            status = "✅ PASS" if claimed == 20 and service.poll_once() == 0 else "❌ FAIL"
+            print(f"{status}: claimed {claimed} pending jobs once")
+            
+            deadline = time.monotonic() + 10
+            while store.unfinished_jobs() and time.monotonic() < deadline:
+                store.flush(timeout=1)
+                time.sleep(0.05)
+            rows, _ = store.changes_since(0)
+            sent = sum(1 for row in rows if row["status"] == "sent")
+            status = "✅ PASS" if sent == 20 else "❌ FAIL"
+            print(f"{status}: daemon sent {sent}/20 jobs")
+            
+            status = "✅ PASS" if daemon_is_alive(store) else "❌ FAIL"
+            print(f"{status}: heartbeat recorded")
+        finally:
+            service.stop()
+            sender.close()
+            stop()
+
+def test_crash_recovery():
+    """Test reloading unfinished jobs after a restart and the catch-up policies"""
+    import tempfile
+    import time
+    from fake_twilio_server import start_in_thread
+    from job_store import JobStore
+    from scheduler import Dispatcher, plan_catch_up
+    from scheduler_daemon import SchedulerService
+    from send_engine import BackgroundSender
+    
+    print("\nTesting crash recovery...")
+    now = datetime.now()
+    jobs = (
+        [{"job_id": f"future-{i}", "scheduled_time": now + timedelta(hours=1)} for i in range(3)]
+        + [{"job_id": f"recent-{i}", "scheduled_time": now - timedelta(minutes=5)} for i in range(4)]
+        + [{"job_id": f"old-{i}", "scheduled_time": now - timedelta(hours=2)} for i in range(5)]
+    )
+    for policy, expected_sent, expected_expired in [("send", 12, 0), ("window", 7, 5), ("expire", 3, 9)]:
+        planned, expired = plan_catch_up(jobs, now=now, policy=policy, window=900)
+        status = "✅ PASS" if (len(planned), len(expired)) == (expected_sent, expected_expired) else "❌ FAIL"
+        print(f"{status}: policy {policy} -> {len(planned)} to send, {len(expired)} expired")
+    
+    planned, _ = plan_catch_up(jobs, now=now, policy="send", rate=10)
+    catch_up_times = sorted(fire_time for fire_time, job in planned if not job["job_id"].startswith("future"))
+    spread = (catch_up_times[-1] - catch_up_times[0]).total_seconds()
+    status = "✅ PASS" if catch_up_times[0] == now and abs(spread - 0.8) < 1e-6 else "❌ FAIL"
+    print(f"{status}: 9 missed jobs released at 10/s over {spread:.1f}s")
+    
+    base_url, stop = start_in_thread(latency=0.01)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "jobs.db")
+        store = JobStore(path)
+        store.add_jobs([
+            {"job_id": job["job_id"], "recipient_name": job["job_id"], "phone_number": f"+1555000{i:04d}",
+             "message_body": "Hello", "scheduled_time": job["scheduled_time"]}
+            for i, job in enumerate(jobs)
+        ], status='scheduled')  # claimed by a scheduler that then crashed
+        store.add_jobs([
+            {"job_id": f"sending-{i}", "recipient_name": "Interrupted", "phone_number": f"+1555100{i:04d}",
+             "message_body": "Hello", "scheduled_time": now - timedelta(seconds=10)}
+            for i in range(2)
+        ], status='scheduled')
+        # ...two of them mid-send when it crashed
+        store.begin_send(["sending-0", "sending-1"])
+        store = JobStore(path)
+        
+        original_policy, config.CATCH_UP_POLICY = config.CATCH_UP_POLICY, "window"
+        sender = BackgroundSender(account_sid="AC" + "0" * 32, auth_token="test-token", base_url=base_url)
+        service = SchedulerService(store, sender, Dispatcher())
+        try:
+            recovered = service.recover()
+            deadline = time.monotonic() + 10
+            while len(store.unfinished_jobs()) > 3 and time.monotonic() < deadline:
+                store.flush(timeout=1)
+                time.sleep(0.05)
+            counts = store.status_counts()
+            expected = {"scheduled": 3, "sent": 4, "expired": 5, "failed": 2}
+            status = "✅ PASS" if recovered == 12 and counts == expected else "❌ FAIL"
+            print(f"{status}: recovered {recovered} jobs after restart -> {counts}")
+            assert counts == expected, counts
+            
+            interrupted = [job for job in store.page_jobs(("failed",)) if job["job_id"].startswith("sending-")]
+            status = "✅ PASS" if len(interrupted) == 2 and all(
+                "interrupted while sending" in job["error"] for job in interrupted) else "❌ FAIL"
+            print(f"{status}: jobs cut off mid-send -> {[job['error'] for job in interrupted][:1]}")
+            assert len(interrupted) == 2 and all("interrupted while sending" in job["error"] for job in interrupted)
+            assert not [job for job in store.unfinished_jobs() if job["status"] == "sending"]
+            # The three future jobs share a send time, so they wait as one batch
+            status = "✅ PASS" if service.dispatcher.pending_count() == 1 else "❌ FAIL"
+            print(f"{status}: future jobs re-queued as one batch -> {service.dispatcher.pending_count()}")
+        finally:
+            config.CATCH_UP_POLICY = original_policy
+            service.stop()
+            sender.close()
+            stop()
+
+def test_cli_campaign():
+    """Test the main.py batch CLI streaming JSONL in and results out"""
+    import io
+    import json
+    from fake_twilio_server import start_in_thread
+    import tempfile
+    import time
+    from main import ResultWriter, main, open_campaign, parse_delay, run_campaign
+    from send_engine import BackgroundSender
+    
+    print("\nTesting CLI campaign...")
+    lines = [json.dumps({"name": f"R{i}", "number": f"+1555000{i:04d}", "custom_message": "Hello"})
+             for i in range(300)]
+    lines += [json.dumps({"name": "Bad", "number": "12", "custom_message": "Hello"}),
+              json.dumps({"name": "Dup", "number": "+15550000001", "custom_message": "Hello"})]
+    source = io.StringIO("\n".join(lines) + "\n")
+    output = io.StringIO()
+    
+    base_url, stop = start_in_thread(latency=0.01)
+    sender = BackgroundSender(account_sid="AC" + "0" * 32, auth_token="test-token", base_url=base_url)
+    try:
+        chunks = open_campaign(source, file_format="jsonl", chunksize=50)
+        counts = run_campaign(chunks, ResultWriter(output), "Hi {name}, {custom_message}", sender, max_in_flight=20)
+    finally:
+        sender.close()
+        stop()
+    
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    rows = sorted(result["row"] for result in results)
+    status = "✅ PASS" if counts == {"sent": 300, "failed": 0, "rejected": 2} and rows == list(range(1, 303)) else "❌ FAIL"
+    print(f"{status}: streamed 302 rows in chunks of 50 -> {counts}")
+    
+    status = "✅ PASS" if parse_delay("90s").total_seconds() == 90 and parse_delay("2h").total_seconds() == 7200 else "❌ FAIL"
+    print(f"{status}: --in delays parsed")
+    
+    # A bad input file is reported before waiting for the send time
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        no_column = os.path.join(tmp_dir, "no_column.csv")
+        with open(no_column, "w") as f:
+            f.write("name,phone\nAsha,+911234567890\n")
+        started = time.monotonic()
+        exit_codes = [main([path, "--in", "1h"]) for path in (os.path.join(tmp_dir, "missing.csv"), no_column)]
+    elapsed = time.monotonic() - started
+    status = "✅ PASS" if exit_codes == [2, 2] and elapsed < 5 else "❌ FAIL"
+    print(f"{status}: missing file and missing column exit {exit_codes} in {elapsed:.2f}s without waiting")
+
+def test_status_webhook():
+    """Test that delivery callbacks reach the job store in batches"""
+    import asyncio
+    import tempfile
+    import time
+    import aiohttp
+    from twilio.request_validator import RequestValidator
+    from fake_twilio_server import start_in_thread as start_fake_twilio
+    from job_store import JobStore
+    from scheduler import Dispatcher
+    from scheduler_daemon import SchedulerService
+    from send_engine import BackgroundSender
+    from webhook_server import start_in_thread
+    
+    async def post_all(url, forms, headers=None):
+        async with aiohttp.ClientSession() as session:
+            async def post(form):
+                async with session.post(url, data=form, headers=headers) as response:
+                    return response.status
+            return await asyncio.gather(*(post(form) for form in forms))
+    
+    print("\nTesting status webhook...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        webhook_url, stop_webhook = start_in_thread(store, host="127.0.0.1", port=0, validate=False)
+        callback_url = webhook_url + config.WEBHOOK_PATH
+        twilio_url, stop_twilio = start_fake_twilio(latency=0.01)
+        sender = BackgroundSender(account_sid="AC" + "0" * 32, auth_token="test-token",
+                                  base_url=twilio_url, status_callback=callback_url)
+        service = SchedulerService(store, sender, Dispatcher())
+        try:
+            store.add_jobs([
+                {"job_id": f"job-{i}", "recipient_name": f"R{i}", "phone_number": f"+1555000{i:04d}",
+                 "message_body": "Hello", "scheduled_time": datetime.now()}
+                for i in range(20)
+            ])
+            service.poll_once()
+            deadline = time.monotonic() + 10
+            while store.count_jobs(("read",)) < 20 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            read = store.count_jobs(("read",))
+            status = "✅ PASS" if read == 20 else "❌ FAIL"
+            print(f"{status}: sent -> delivered -> read via callbacks for {read}/20 messages")
+            
+            # A callback that beats the send result is held until the SID is stored
+            store.add_jobs([{"job_id": "early", "recipient_name": "E", "phone_number": "+15550009999",
+                             "message_body": "Hello", "scheduled_time": datetime.now()}])
+            asyncio.run(post_all(callback_url, [
+                {"MessageSid": "SMearly", "MessageStatus": "read"},
+                {"MessageSid": "SMearly", "MessageStatus": "delivered"}
+            ]))
+            store.flush(timeout=5)
+            store.record_result("early", "sent", sid="SMearly")
+            store.flush(timeout=5)
+            early = store.page_jobs(search="+15550009999")[0]["status"]
+            status = "✅ PASS" if early == "read" else "❌ FAIL"
+            print(f"{status}: early, out-of-order callbacks -> {early}")
+            
+            forms = [{"MessageSid": f"SMburst{i}", "MessageStatus": "delivered"} for i in range(3000)]
+            start = time.monotonic()
+            codes = asyncio.run(post_all(callback_url, forms))
+            store.flush(timeout=30)
+            rate = len(forms) / (time.monotonic() - start)
+            status = "✅ PASS" if codes.count(204) == len(forms) else "❌ FAIL"
+            print(f"{status}: burst of {len(forms)} callbacks ingested at {rate:.0f}/s")
+        finally:
+            service.stop()
+            sender.close()
+            stop_twilio()
+            stop_webhook()
+        
+        webhook_url, stop_webhook = start_in_thread(store, host="127.0.0.1", port=0, validate=True,
+                                                    auth_token="test-token", public_url="https://example.com/status")
+        try:
+            form = {"MessageSid": "SM1", "MessageStatus": "delivered"}
+            signature = RequestValidator("test-token").compute_signature("https://example.com/status", form)
+            codes = asyncio.run(post_all(webhook_url + config.WEBHOOK_PATH, [form]))
+            codes += asyncio.run(post_all(webhook_url + config.WEBHOOK_PATH, [form], {"X-Twilio-Signature": signature}))
+            status = "✅ PASS" if codes == [403, 204] else "❌ FAIL"
+            print(f"{status}: signature check -> unsigned {codes[0]}, signed {codes[1]}")
+        finally:
+            stop_webhook()
+        
+        # Without the public URL no genuine callback could pass the signature check, so it won't start
+        try:
+            start_in_thread(store, host="127.0.0.1", port=0, validate=True, public_url="")
+            refused = False
+        except ValueError:
+            refused = True
+        status = "✅ PASS" if refused else "❌ FAIL"
+        print(f"{status}: signature validation without STATUS_CALLBACK_URL refused to start")
+        assert refused
+
+def test_reconcile():
+    """Test paged, resumable status reconciliation against the fake Twilio API"""
+    import tempfile
+    import time
+    from twilio.rest import Client
+    from fake_twilio_server import start_in_thread
+    from job_store import JobStore
+    from reconcile import CURSOR_NAME, Reconciler
+    from scheduler import Dispatcher
+    from scheduler_daemon import SchedulerService
+    from send_engine import BackgroundSender
+    
+    print("\nTesting status reconciliation...")
+    account_sid, sender_number = "AC" + "0" * 32, "+15005550006"
+    base_url, stop = start_in_thread(latency=0.01, callback_delay=0.01, undelivered_rate=0.2, seed=1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        sender = BackgroundSender(account_sid=account_sid, auth_token="test-token",
+                                  from_number=sender_number, base_url=base_url)
+        service = SchedulerService(store, sender, Dispatcher())
+        try:
+            # No status callback is requested, as if the webhook had been down
+            store.add_jobs([
+                {"job_id": f"job-{i}", "recipient_name": f"R{i}", "phone_number": f"+1555000{i:04d}",
+                 "message_body": "Hello", "scheduled_time": datetime.now()}
+                for i in range(150)
+            ])
+            service.poll_once()
+            deadline = time.monotonic() + 10
+            while store.unfinished_jobs() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            store.flush(timeout=5)
+            
+            client = Client(account_sid, "test-token")
+            client.api.base_url = base_url
+            reconciler = Reconciler(client, store, from_number=sender_number, page_size=50)
+            first = reconciler.run(max_pages=2)
+            cursor = store.load_cursor(CURSOR_NAME)
+            status = "✅ PASS" if first["pages"] == 2 and cursor else "❌ FAIL"
+            print(f"{status}: stopped after {first['pages']} pages with a saved cursor")
+            
+            second = reconciler.run()
+            settled = store.count_jobs(("read", "undelivered"))
+            status = "✅ PASS" if settled == 150 and not store.load_cursor(CURSOR_NAME) else "❌ FAIL"
+            print(f"{status}: resumed run settled {settled}/150 "
+                  f"({first['updated'] + second['updated']} updates, {first['pages'] + second['pages']} pages)")
+        finally:
+            service.stop()
+            sender.close()
+            stop()
+
+def test_metrics():
+    """Test metric recording, the Prometheus endpoint and send-path instrumentation"""
+    import time
+    import urllib.request
+    from fake_twilio_server import start_in_thread
+    import tempfile
+    from job_store import JobStore
+    from metrics import REGISTRY, histogram_quantile, parse_prometheus, start_metrics_server
+    from scheduler import Dispatcher
+    from scheduler_daemon import SchedulerService
+    from send_engine import send_messages
+    
+    print("\nTesting metrics...")
+    def total(samples, name):
+        return sum(value for sample_name, _, value in samples if sample_name == name)
+    
+    before = REGISTRY.samples()
+    base_url, stop = start_in_thread(latency=0.01, error_rate=0.2, seed=3)
+    try:
+        send_messages([(f"+1555000{i:04d}", "Hello") for i in range(50)],
+                      account_sid="AC" + "0" * 32, auth_token="test-token", base_url=base_url)
+    finally:
+        stop()
+    
+    server = start_metrics_server(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            after = parse_prometheus(response.read().decode())
+    finally:
+        server.shutdown()
+    
+    sent = total(after, "whatsapp_messages_sent_total") - total(before, "whatsapp_messages_sent_total")
+    failed = total(after, "whatsapp_messages_failed_total") - total(before, "whatsapp_messages_failed_total")
+    p50 = histogram_quantile(after, "whatsapp_twilio_request_seconds", 0.5)
+    status = "✅ PASS" if sent + failed == 50 and failed > 0 and p50 else "❌ FAIL"
+    print(f"{status}: scraped {int(sent)} sent, {int(failed)} failed, Twilio p50 <= {p50}s")
+    
+    counter = REGISTRY.counter("test_overhead_total", "Overhead check")
+    start = time.perf_counter()
+    for _ in range(100000):
+        counter.inc()
+    per_call_us = (time.perf_counter() - start) * 10
+    status = "✅ PASS" if per_call_us < 5 else "❌ FAIL"
+    print(f"{status}: counter increment costs {per_call_us:.2f} µs")
+    
+    # 100 jobs due together are one dispatcher entry but still count as 100 messages
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = JobStore(os.path.join(tmp_dir, "jobs.db"))
+        dispatcher = Dispatcher()
+        service = SchedulerService(store, sender=object(), dispatcher=dispatcher)
+        scheduled_time = datetime.now() + timedelta(hours=1)
+        store.add_jobs([
+            {"job_id": f"job-{i}", "recipient_name": f"R{i}", "phone_number": f"+1555000{i:04d}",
+             "message_body": "Hello", "scheduled_time": scheduled_time}
+            for i in range(100)
+        ])
+        before = REGISTRY.samples()
+        service.poll_once()
+        after = REGISTRY.samples()
+        service.stop()
+        released = REGISTRY.samples()
+    scheduled = total(after, "whatsapp_messages_scheduled_total") - total(before, "whatsapp_messages_scheduled_total")
+    pending = total(after, "whatsapp_scheduler_pending_jobs") - total(before, "whatsapp_scheduler_pending_jobs")
+    left = total(released, "whatsapp_scheduler_pending_jobs") - total(before, "whatsapp_scheduler_pending_jobs")
+    status = "✅ PASS" if dispatcher.pending_count() == 1 and scheduled == 100 and pending == 100 and left == 0 else "❌ FAIL"
+    print(f"{status}: one batch entry counted {int(scheduled)} scheduled, {int(pending)} pending ({int(left)} after shutdown)")
+
+def test_logging():
+    """Test JSON log lines, redaction, sampling and the non-blocking writer"""
+    import io
+    import json
+    import logging
+    import logging.handlers
+    import queue
+    import time
+    from structured_logging import JsonFormatter, SamplingFilter, _EnqueueHandler, redact_phone
+    
+    print("\nTesting structured logging...")
+    record = logging.LogRecord("whatsapp.test", logging.INFO, __file__, 0, "message_sent", None, None)
+    record.job_id, record.sid = "job-1", "SM123"
+    record.to, record.body = "+919876543210", "Secret offer"
+    entry = json.loads(JsonFormatter().format(record))
+    redacted = entry['to'] == "+91******3210" and 'body' not in entry and entry['body_length'] == 12
+    status = "✅ PASS" if entry['event'] == "message_sent" and entry['sid'] == "SM123" and redacted else "❌ FAIL"
+    print(f"{status}: JSON line {entry['event']} job_id={entry['job_id']} to={entry['to']}")
+    status = "✅ PASS" if redact_phone("+14155551234") == "+14*****1234" else "❌ FAIL"
+    print(f"{status}: phone redaction {redact_phone('+14155551234')}")
+    
+    sampler = SamplingFilter(0.1)
+    kept = sum(sampler.filter(record) for _ in range(10000))
+    record.levelno = logging.ERROR
+    errors_kept = all(sampler.filter(record) for _ in range(100))
+    status = "✅ PASS" if 700 < kept < 1300 and errors_kept else "❌ FAIL"
+    print(f"{status}: sampling at 10% kept {kept}/10000 info events and every error")
+    
+    class SlowStream(io.StringIO):
+        def write(self, text):
+            time.sleep(0.001)
+            return super().write(text)
+    
+    stream = SlowStream()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, output)
+    logger = logging.getLogger("whatsapp.test_writer")
+    logger.propagate = False
+    logger.addHandler(_EnqueueHandler(records))
+    listener.start()
+    try:
+        start = time.perf_counter()
+        for i in range(500):
+            logger.warning("send_throttled", extra={'job_id': i})
+        per_call_us = (time.perf_counter() - start) * 2000
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+    lines = stream.getvalue().splitlines()
+    status = "✅ PASS" if per_call_us < 500 and len(lines) == 500 else "❌ FAIL"
+    print(f"{status}: log call costs {per_call_us:.1f} µs with a 1 ms writer, {len(lines)} lines written")
+
 def test_dependencies():
     """Test if all required dependencies are available"""
     print("\nTesting dependencies...")
@@ -79,7 +1247,7 @@ def test_dependencies():
         'streamlit',
         'pandas', 
         'twilio',
-        'dateutil'
+        'aiohttp'
     ]
     
     for dep in dependencies:
@@ -97,6 +1265,28 @@ if __name__ == "__main__":
     test_config()
     test_phone_validation()
     test_datetime_validation()
+    test_dispatcher()
+    test_job_store()
+    test_status_view()
+    test_result_reconciliation()
+    test_idempotency()
+    test_recurrence()
+    test_timezones()
+    test_rate_limiter()
+    test_bulk_import()
+    test_phone_normalization()
+    test_message_templates()
+    test_send_engine()
+    test_circuit_breaker()
+    test_priority_lanes()
+    test_sender_pool()
+    test_scheduler_daemon()
+    test_crash_recovery()
+    test_cli_campaign()
+    test_status_webhook()
+    test_reconcile()
+    test_metrics()
+    test_logging()
     
     print("\n" + "=" * 50)
     print("✅ All tests completed!")
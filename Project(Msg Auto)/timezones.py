@@ -0,0 +1,94 @@
+"""
+Recipient time zones for WhatsApp Message Scheduler
+Works out each recipient's time zone (given explicitly, or from the
+country calling code of their number) and turns a campaign's local send
+time into server-time buckets: recipients who share a UTC offset at that
+moment fire together as one batch.
+"""
+
+from collections import defaultdict
+from datetime import timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import config
+
+# Calling codes have 1-3 digits; a 4-digit key can pick out a +1 area code (e.g. 1808 Hawaii)
+MAX_CALLING_CODE_LENGTH = 4
+
+
+class TimezoneError(ValueError):
+    """Raised for a time zone name that isn't in the tz database"""
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """ZoneInfo for an IANA name such as 'Asia/Kolkata' (cached)"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise TimezoneError(f"Unknown time zone: {name!r}") from None
+
+
+def zone_for_number(e164):
+    """Time zone inferred from the number's country calling code, or None"""
+    digits = e164.lstrip('+')
+    for length in range(MAX_CALLING_CODE_LENGTH, 0, -1):
+        name = config.COUNTRY_TIMEZONES.get(digits[:length])
+        if name:
+            return get_zone(name)
+    return None
+
+
+def recipient_zone(recipient):
+    """Recipient's time zone: their 'timezone' field, else from their number, else DEFAULT_TIMEZONE
+
+    Returns None when nothing applies, meaning the server's local time.
+    """
+    explicit = recipient.get('timezone')
+    # Imported lists leave the column blank (or NaN) for recipients without one
+    if isinstance(explicit, str) and explicit.strip():
+        return get_zone(explicit.strip())
+    zone = zone_for_number(recipient['number'])
+    if zone is None and config.DEFAULT_TIMEZONE:
+        zone = get_zone(config.DEFAULT_TIMEZONE)
+    return zone
+
+
+def to_server_time(local_time, zone):
+    """Server-local naive datetime at which it is local_time (naive) in zone"""
+    if zone is None:
+        return local_time
+    return local_time.replace(tzinfo=zone).astimezone().replace(tzinfo=None)
+
+
+def to_zone_time(server_time, zone):
+    """Naive wall-clock time in zone at server-local naive server_time (inverse of to_server_time)"""
+    if zone is None:
+        return server_time
+    return server_time.astimezone(zone).replace(tzinfo=None)
+
+
+def bucket_send_times(recipients, local_time):
+    """Group recipients by when local_time happens for them
+
+    Returns {server fire time: [recipient positions]}. Every zone with the
+    same UTC offset at that moment lands in the same bucket, so the number
+    of buckets is the number of distinct offsets, not of recipients.
+    """
+    buckets = defaultdict(list)
+    fire_times = {}
+    for position, recipient in enumerate(recipients):
+        zone = recipient_zone(recipient)
+        if zone not in fire_times:
+            fire_times[zone] = to_server_time(local_time, zone)
+        buckets[fire_times[zone]].append(position)
+    return dict(sorted(buckets.items()))
+
+
+def describe_offset(fire_time, local_time):
+    """Label a bucket by its UTC offset, e.g. 'UTC+05:30'"""
+    offset = local_time - fire_time.astimezone(timezone.utc).replace(tzinfo=None)
+    sign = '-' if offset < timedelta(0) else '+'
+    minutes = int(abs(offset.total_seconds())) // 60
+    return f"UTC{sign}{minutes // 60:02d}:{minutes % 60:02d}"
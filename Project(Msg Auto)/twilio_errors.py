@@ -0,0 +1,78 @@
+"""
+Twilio error classification for WhatsApp Message Scheduler
+Failures are classified from the Twilio error code, falling back to the
+HTTP status, rather than by matching words in the error text. The class
+also says whether a failure is about one message or about the account or
+sender as a whole, which is what the circuit breakers act on.
+"""
+
+import asyncio
+
+import aiohttp
+from twilio.base.exceptions import TwilioRestException
+
+# Twilio error code -> failure class (https://www.twilio.com/docs/api/errors)
+ERROR_CODES = {
+    20003: 'auth',          # Authentication failed
+    20005: 'auth',          # Account not active
+    20404: 'not_found',     # Resource not found (e.g. wrong Account SID)
+    20429: 'rate_limited',  # Too many requests
+    20500: 'server_error',  # Internal server error
+    20503: 'server_error',  # Service unavailable
+    21211: 'recipient',     # Invalid 'To' number
+    21408: 'permission',    # Sending to this region is not enabled
+    21606: 'sender',        # 'From' number can't send from this account
+    21610: 'recipient',     # Recipient has opted out
+    21614: 'recipient',     # 'To' is not a mobile number
+    21659: 'sender',        # 'From' is not a Twilio number
+    63007: 'sender',        # No WhatsApp channel for the 'From' address
+}
+
+# What a failure class says beyond the one message: (circuit scope, fatal).
+# Fatal errors need a configuration fix and open the circuit at once;
+# the others open it after BREAKER_FAILURE_THRESHOLD in a row.
+CIRCUIT_EFFECTS = {
+    'auth': ('account', True),
+    'not_found': ('account', True),
+    'sender': ('sender', True),
+    'server_error': ('account', False),
+    'timeout': ('account', False),
+    'network': ('account', False),
+}
+
+DESCRIPTIONS = {
+    'auth': "Twilio authentication failed. Please check your Account SID and Auth Token.",
+    'not_found': "Twilio account not found. Please verify your Account SID.",
+    'sender': "Twilio WhatsApp number not found. Please verify your WhatsApp number configuration.",
+    'permission': "Not authorized to send WhatsApp messages. Check your Twilio account permissions.",
+}
+
+
+def error_class(error):
+    """Failure class of an exception from a send, used for metrics and circuit breakers"""
+    if isinstance(error, TwilioRestException):
+        if error.code in ERROR_CODES:
+            return ERROR_CODES[error.code]
+        if error.status in (401, 403):
+            return 'auth'
+        if error.status == 404:
+            return 'not_found'
+        if error.status == 429:
+            return 'rate_limited'
+        if error.status >= 500:
+            return 'server_error'
+        return 'rejected'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, (aiohttp.ClientError, OSError)):
+        return 'network'
+    return 'other'
+
+
+def describe_twilio_error(error):
+    """Turn an exception from Twilio into a user-facing explanation"""
+    description = DESCRIPTIONS.get(error_class(error))
+    if description:
+        return description
+    message = error.msg if isinstance(error, TwilioRestException) else str(error) or type(error).__name__
+    return f"Twilio error: {message}"
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Delivery-status webhook for WhatsApp Message Scheduler
+Receives Twilio status callbacks (sent, delivered, read, undelivered,
+failed) and queues them on the job store, whose writer thread commits them
+in batches. No per-message polling of the Messages API is needed.
+
+Twilio must be able to reach this endpoint: set STATUS_CALLBACK_URL to its
+public address (e.g. a tunnel to WEBHOOK_PORT) so sends ask for callbacks.
+
+Usage:
+    python webhook_server.py
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+
+from aiohttp import web
+from twilio.request_validator import RequestValidator
+
+import config
+from job_store import DELIVERY_RANK, JobStore
+from metrics import STATUS_CALLBACKS
+
+
+def create_app(store, validate=None, auth_token=None, public_url=None):
+    """Build the webhook app that feeds `store`
+
+    With validate on, requests must carry a valid X-Twilio-Signature for
+    public_url (the exact STATUS_CALLBACK_URL Twilio posts to); without a
+    public URL no signature could match, so ValueError is raised instead.
+    """
+    if validate is None:
+        validate = config.WEBHOOK_VALIDATE_SIGNATURE
+    public_url = public_url or config.STATUS_CALLBACK_URL
+    if validate and not public_url:
+        raise ValueError("Signature validation needs STATUS_CALLBACK_URL, the public URL Twilio posts "
+                         "callbacks to; set it, or turn off WEBHOOK_VALIDATE_SIGNATURE")
+    validator = RequestValidator(auth_token or config.TWILIO_AUTH_TOKEN) if validate else None
+    counts = {'received': 0, 'ignored': 0, 'rejected': 0}
+
+    async def status_callback(request):
+        form = await request.post()
+        if validator is not None:
+            signature = request.headers.get('X-Twilio-Signature', '')
+            if not validator.validate(public_url, dict(form), signature):
+                counts['rejected'] += 1
+                return web.Response(status=403)
+
+        sid, status = form.get('MessageSid'), form.get('MessageStatus')
+        # queued/sending/accepted say nothing the send result didn't already
+        if not sid or status not in DELIVERY_RANK:
+            counts['ignored'] += 1
+            return web.Response(status=204)
+
+        error_code = form.get('ErrorCode')
+        store.record_delivery(sid, status, error=f"Twilio error: {error_code}" if error_code else None)
+        STATUS_CALLBACKS.inc(status=status)
+        counts['received'] += 1
+        return web.Response(status=204)
+
+    async def stats(request):
+        return web.json_response(counts)
+
+    app = web.Application()
+    app.router.add_post(config.WEBHOOK_PATH, status_callback)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def start_in_thread(store, host=None, port=None, **options):
+    """Serve the webhook from a background thread; returns (base_url, stop)"""
+    host = host or config.WEBHOOK_HOST
+    port = config.WEBHOOK_PORT if port is None else port
+    app = create_app(store, **options)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    bound_port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, name="status-webhook", daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return f"http://{host}:{bound_port}", stop
+
+
+def main(argv=None):
+    """Run the webhook in the foreground"""
+    parser = argparse.ArgumentParser(description="Receive Twilio delivery status callbacks")
+    parser.add_argument("--host", default=config.WEBHOOK_HOST)
+    parser.add_argument("--port", type=int, default=config.WEBHOOK_PORT)
+    parser.add_argument("--no-validate", action="store_true", help="Accept callbacks without a Twilio signature")
+    args = parser.parse_args(argv)
+
+    store = JobStore()
+    try:
+        app = create_app(store, validate=False if args.no_validate else None)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    if not config.STATUS_CALLBACK_URL:
+        print("⚠️  STATUS_CALLBACK_URL is not set, so sends won't request status callbacks")
+    print(f"📬 Status webhook on http://{args.host}:{args.port}{config.WEBHOOK_PATH}")
+    web.run_app(
+        app,
+        host=args.host,
+        port=args.port,
+        print=None,
+        access_log=None
+    )
+    store.flush(timeout=10)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())